@@ -6,33 +6,29 @@ import uuid
 import re
 import requests
 import json
-import torch
-from transformers import BlipProcessor, BlipForConditionalGeneration
+import models
 from APIKEY import openrouter_api_key
+from memeCatalog import record_output
+from renderSettings import save_image, save_derivatives, image_extension
+from workspace import OUTPUTS_DIR
 
 # --------------------------
 # Directories
 # --------------------------
-PHOTO_OUTPUT_DIR = os.path.join(os.getcwd(), "outputs", "photo_memes")
+PHOTO_OUTPUT_DIR = os.path.join(OUTPUTS_DIR, "photo_memes")
 os.makedirs(PHOTO_OUTPUT_DIR, exist_ok=True)
 
 # --------------------------
 # API Config for OpenRouter
 # --------------------------
 OPENROUTER_API_KEY = openrouter_api_key
-BASE_URL = "https://openrouter.ai/api/v1/chat/completions"
+# OPENROUTER_BASE_URL lets benchmarks point at a local stand-in (bench/fakeOpenRouter.py)
+BASE_URL = os.environ.get("OPENROUTER_BASE_URL", "https://openrouter.ai/api/v1") + "/chat/completions"
 HEADERS = {
     "Content-Type": "application/json",
     "Authorization": f"Bearer {OPENROUTER_API_KEY}"
 }
 
-# --------------------------
-# Device + BLIP Model
-# --------------------------
-device = "cuda" if torch.cuda.is_available() else "cpu"
-blip_processor = BlipProcessor.from_pretrained("Salesforce/blip-image-captioning-base")
-blip_model = BlipForConditionalGeneration.from_pretrained("Salesforce/blip-image-captioning-base").to(device)
-
 # --------------------------
 # Helpers
 # --------------------------
@@ -52,11 +48,8 @@ def generate_blip_caption(image_path: str) -> str:
     """Generate a BLIP caption from the image."""
     try:
         image = Image.open(image_path).convert("RGB")
-        inputs = blip_processor(images=image, return_tensors="pt").to(device)
-        with torch.no_grad():
-            output_ids = blip_model.generate(**inputs)
-        caption = blip_processor.decode(output_ids[0], skip_special_tokens=True)
-        return caption
+        # BLIP is loaded on the first photo (or served by modelServer.py), not at import
+        return models.caption_images([image])[0]
     except Exception as e:
         print("BLIP captioning error:", e)
         return "A funny scene"
@@ -163,11 +156,11 @@ def draw_caption_with_canvas(img, caption):
 # --------------------------
 # Meme Generation
 # --------------------------
-def generate_photo_memes(input_path, output_dir=PHOTO_OUTPUT_DIR, custom_text=None):
+def generate_photo_memes(input_path, output_dir=PHOTO_OUTPUT_DIR, custom_text=None, task_id=None):
     try:
         img = Image.open(input_path).convert("RGB")
         base_filename = str(uuid.uuid4())
-        output_filename = f"{base_filename}.png"
+        output_filename = f"{base_filename}{image_extension()}"
         output_path = os.path.join(output_dir, output_filename)
 
         if custom_text:
@@ -177,7 +170,10 @@ def generate_photo_memes(input_path, output_dir=PHOTO_OUTPUT_DIR, custom_text=No
             caption = generate_funny_caption(prompt_text)
 
         img_with_caption = draw_caption_with_canvas(img, caption)
-        img_with_caption.save(output_path)
+        save_image(img_with_caption, output_path)
+        derivatives = save_derivatives(img_with_caption, output_path)
+        record_output(output_path, task_id, width=img_with_caption.width, height=img_with_caption.height,
+                      thumbnail=derivatives["thumbnail"])
         return output_path
 
     except Exception as e:
@@ -1,28 +1,135 @@
 import subprocess
 import argparse
+import time
 import sys
+import os
+import json
+import progress
+import stageManifest
+from jobProfiler import PROFILE_DIR_ENV, FOLDED_EXT
+from workspace import WORKDIR_ENV, DOWNLOADS_DIR
+
+STEPS = ["Process Pipeline", "Meme Detection", "Frame Extractor + Meme Output"]
+DOWNLOAD_FOLDER = DOWNLOADS_DIR
+RENDERED_FILE = "rendered.json"  # memeOutput.py lists its final memes here
+
+
+class StepFailed(Exception):
+    def __init__(self, step, returncode):
+        super().__init__(f"{step} failed with exit code {returncode}")
+        self.step = step
+        self.returncode = returncode
+
+
+def _wait_with_usage(proc):
+    """Exit code plus (cpu_seconds, peak_rss_bytes) of the whole step process tree."""
+    if not hasattr(os, "wait4"):
+        return proc.wait(), None, None
+    _, status, ru = os.wait4(proc.pid, 0)
+    proc.returncode = os.waitstatus_to_exitcode(status)
+    rss_unit = 1 if sys.platform == "darwin" else 1024
+    return proc.returncode, round(ru.ru_utime + ru.ru_stime, 3), ru.ru_maxrss * rss_unit
 def run_step(command, description):
     print(f"\n🚀 Running: {description} ...")
-    result = subprocess.run(command, shell=True)
-    if result.returncode != 0:
+    start, t0 = time.time(), time.perf_counter()
+    returncode, cpu, peak_rss = _wait_with_usage(subprocess.Popen(command, shell=True))
+    progress.emit("step", step=description, start=start, duration=round(time.perf_counter() - t0, 3),
+                  cpu=cpu, peak_rss=peak_rss, ok=returncode == 0)
+    if returncode != 0:
         print(f"❌ {description} failed! Stopping pipeline.")
-        sys.exit(1)
+        raise StepFailed(description, returncode)
     print(f"✅ {description} completed successfully.")
+
+
+def _rendered_outputs(workdir):
+    try:
+        with open(os.path.join(workdir, RENDERED_FILE), "r", encoding="utf-8") as f:
+            paths = json.load(f).get("outputs", [])
+    except (OSError, ValueError):
+        return {}
+    return {p: stageManifest.file_fingerprint(p) for p in paths if os.path.exists(p)}
+
+
+def run_stage(workdir, script, args, description, inputs):
+    """
+    run_step with a completion manifest: skipped when the manifest in workdir
+    matches `inputs` and its outputs are untouched, recorded after success.
+    Without a workdir (plain CLI run in outputs/) every step just runs.
+    Returns the digest of the step's outputs (the next step's upstream input).
+    """
+    inputs = dict(inputs, command=f"{script}{args}")
+    if workdir is None:
+        run_step(python_step(script, args), description)
+        return None
+
+    manifest = stageManifest.load(workdir, description)
+    if stageManifest.is_valid(manifest, inputs):
+        print(f"\n⏭️ Skipping: {description} (outputs from a previous attempt are still valid)")
+        progress.emit("step", step=description, start=time.time(), duration=0, ok=True, skipped=True)
+        return stageManifest.digest(manifest["outputs"])
+
+    # Outputs = files this step creates or rewrites in the workspace (and top-level downloads)
+    before = {**stageManifest.snapshot(workdir), **stageManifest.snapshot(DOWNLOAD_FOLDER, recursive=False)}
+    t0 = time.perf_counter()
+    run_step(python_step(script, args), description)
+    after = {**stageManifest.snapshot(workdir), **stageManifest.snapshot(DOWNLOAD_FOLDER, recursive=False)}
+    outputs = stageManifest.changed(before, after)
+    if description == STEPS[-1]:
+        outputs.update(_rendered_outputs(workdir))
+    stageManifest.write(workdir, description, inputs, outputs, round(time.perf_counter() - t0, 3))
+    return stageManifest.digest(outputs)
+def python_step(script, args=""):
+    """Command line for a pipeline script, run under the sampling profiler when the job is profiled."""
+    profile_dir = os.environ.get(PROFILE_DIR_ENV)
+    if profile_dir:
+        out = os.path.join(profile_dir, os.path.splitext(script)[0] + FOLDED_EXT)
+        return f'python jobProfiler.py --out "{out}" {script}{args}'
+    return f"python {script}{args}"
 def main():
     parser = argparse.ArgumentParser(description="Run full meme generator pipeline")
     parser.add_argument("--input", required=True, help="YouTube link or video file path")
+    parser.add_argument("--debug-frames", action="store_true", help="Keep intermediate frames in outputs/frames")
+    parser.add_argument("--task-id", default=None, help="Task id to tag the rendered memes with")
+    parser.add_argument("--profile", default=None, help="Render profile: preview, social or archive")
+    parser.add_argument("--animated", default=None, help="Also render looping formats from each clip, e.g. gif,webp")
+    parser.add_argument("--workdir", default=None,
+                        help="Job workspace; steps with a valid completion manifest there are skipped "
+                             "(default: MEMEGEN_WORKDIR, set by app.py)")
+    parser.add_argument("--from-step", choices=STEPS, default=None,
+                        help="Re-run this step and everything after it even if their manifests are valid")
     args = parser.parse_args()
+
+    workdir = args.workdir or os.environ.get(WORKDIR_ENV)
+    if workdir:
+        workdir = os.path.abspath(workdir)
+        os.environ[WORKDIR_ENV] = workdir  # steps write their intermediates there
+        if args.from_step:
+            stageManifest.invalidate_from(workdir, STEPS, args.from_step)
+
+    try:
+        run_steps(args, workdir)
+    except StepFailed:
+        sys.exit(1)
+
+
+def run_steps(args, workdir):
     # Step 1: Run processPipeline with input
-    run_step(f'python processPipeline.py --input "{args.input}"', "Process Pipeline")
+    upstream = run_stage(workdir, "processPipeline.py", f' --input "{args.input}"', STEPS[0],
+                         {"source": stageManifest.source_fingerprint(args.input)})
 
     # Step 2: Run memeDetection
-    run_step("python memeDetection.py", "Meme Detection")
-
-    # Step 3: Run frameExtractor
-    run_step("python frameExtractor.py", "Frame Extractor")
+    upstream = run_stage(workdir, "memeDetection.py", "", STEPS[1], {"upstream": upstream})
 
-    # Step 4: Run memeOutput
-    run_step("python memeOutput.py", "Meme Output")
+    # Step 3+4: Extract frames/clips and render memes in one process so
+    # still frames go straight from ffmpeg to the renderer without a JPEG round trip
+    render_flags = " --debug-frames" if args.debug_frames else ""
+    if args.task_id:
+        render_flags += f' --task-id "{args.task_id}"'
+    if args.profile:
+        render_flags += f' --profile "{args.profile}"'
+    if args.animated is not None:
+        render_flags += f' --animated "{args.animated}"'
+    run_stage(workdir, "memeOutput.py", f" --in-process{render_flags}", STEPS[2], {"upstream": upstream})
 
     print("\n🎉 All steps completed successfully!")
 
@@ -0,0 +1,183 @@
+# animatedMeme.py
+import io
+import os
+import json
+import hashlib
+import logging
+from PIL import Image
+from contentHash import file_sha256
+import progress
+from retention import touch
+from workspace import OUTPUTS_DIR
+from renderSettings import (ANIM_MAX_FPS, ANIM_MAX_SIDE, ANIM_MIN_SIDE, ANIM_MAX_SECONDS,
+                            ANIM_MAX_BYTES, ANIM_WEBP_QUALITY)
+
+# -----------------------------
+# Logging
+# -----------------------------
+logging.basicConfig(level=logging.INFO, format="%(levelname)s: %(message)s")
+
+# -----------------------------
+# Paths
+# -----------------------------
+PALETTE_CACHE_DIR = os.path.join(OUTPUTS_DIR, "cache", "palettes")
+CLIP_SOURCE_SUFFIX = ".source.json"  # written next to extracted clips: what they were cut from
+
+PALETTE_SAMPLE_FRAMES = 16   # frames tiled together to build the shared GIF palette
+PALETTE_TILE_SIDE = 96
+MAX_ENCODE_ATTEMPTS = 4      # size-budget retries before giving up and keeping the smallest
+
+# -----------------------------
+# Frame collection (fed by the MP4 render loop)
+# -----------------------------
+class AnimationFrames:
+    """
+    Collects already decoded+captioned frames for the animated outputs while
+    memeOutput renders the MP4, so the clip is decoded only once. Frames are
+    sampled down to ANIM_MAX_FPS, cut at ANIM_MAX_SECONDS and downscaled to
+    ANIM_MAX_SIDE as they arrive.
+    """
+
+    def __init__(self, source_fps):
+        self.fps = min(source_fps, ANIM_MAX_FPS)
+        self._step = source_fps / self.fps
+        self._next = 0.0
+        self._limit = int(source_fps * ANIM_MAX_SECONDS)
+        self.frames = []
+
+    def wants(self, index):
+        """Whether source frame `index` is kept (check before converting it)."""
+        return self._next <= index < self._limit
+
+    def add(self, index, rgb_array):
+        """`index` is the 0-based source frame number, `rgb_array` an HxWx3 uint8 array."""
+        if not self.wants(index):
+            return
+        self._next += self._step
+        img = Image.fromarray(rgb_array)
+        img.thumbnail((ANIM_MAX_SIDE, ANIM_MAX_SIDE), Image.Resampling.BILINEAR)
+        self.frames.append(img)
+
+# -----------------------------
+# GIF palette (cached per source moment)
+# -----------------------------
+def write_clip_source(clip_path, video_file, start, duration):
+    """Record the source video content and window an extracted clip was cut from."""
+    try:
+        with open(clip_path + CLIP_SOURCE_SUFFIX, "w", encoding="utf-8") as f:
+            json.dump({"sha256": file_sha256(video_file), "start": round(float(start), 3),
+                       "duration": round(float(duration), 3)}, f)
+    except OSError as e:
+        logging.warning(f"Could not record the source of {clip_path}: {e}")
+
+
+def palette_key(clip_path, size, fps):
+    """
+    Source content + clip window + animation size/fps of a clip, or None when
+    its source is unknown. Unlike the clip's own bytes this is the same for
+    every job (and render profile) that cuts the same moment.
+    """
+    try:
+        with open(clip_path + CLIP_SOURCE_SUFFIX, "r", encoding="utf-8") as f:
+            source = json.load(f)
+        raw = f"{source['sha256']}|{source['start']}|{source['duration']}|{size[0]}x{size[1]}|{fps:.3f}"
+    except (OSError, ValueError, KeyError, TypeError):
+        return None
+    return hashlib.sha256(raw.encode()).hexdigest()
+
+
+def clip_palette(key, frames):
+    """
+    256-colour palette shared by every GIF frame. Building it is the slow
+    part of GIF encoding, so it is cached under palette_key() and reused
+    whenever the same moment is captioned again or re-encoded smaller.
+    """
+    path = os.path.join(PALETTE_CACHE_DIR, f"{key}.png") if key else None
+    progress.cache("palette", path and os.path.exists(path))
+    if path and os.path.exists(path):
+        touch(path)
+        palette = Image.open(path)
+        palette.load()
+        return palette
+
+    step = max(1, len(frames) // PALETTE_SAMPLE_FRAMES)
+    samples = [f.copy() for f in frames[::step][:PALETTE_SAMPLE_FRAMES]]
+    for s in samples:
+        s.thumbnail((PALETTE_TILE_SIDE, PALETTE_TILE_SIDE))
+    strip = Image.new("RGB", (sum(s.width for s in samples), max(s.height for s in samples)))
+    x = 0
+    for s in samples:
+        strip.paste(s, (x, 0))
+        x += s.width
+    palette = strip.quantize(colors=256, method=Image.Quantize.MEDIANCUT)
+
+    if path:
+        os.makedirs(PALETTE_CACHE_DIR, exist_ok=True)
+        palette.save(path)
+    return palette
+
+# -----------------------------
+# Encoders
+# -----------------------------
+def _encode_gif(frames, fps, palette):
+    quantized = [f.quantize(palette=palette, dither=Image.Dither.FLOYDSTEINBERG) for f in frames]
+    buf = io.BytesIO()
+    quantized[0].save(buf, "GIF", save_all=True, append_images=quantized[1:],
+                      duration=round(1000 / fps), loop=0, disposal=1)
+    return buf.getvalue()
+
+
+def _encode_webp(frames, fps, palette=None):
+    buf = io.BytesIO()
+    frames[0].save(buf, "WEBP", save_all=True, append_images=frames[1:],
+                   duration=round(1000 / fps), loop=0, quality=ANIM_WEBP_QUALITY, method=4)
+    return buf.getvalue()
+
+
+ENCODERS = {"gif": _encode_gif, "webp": _encode_webp}
+
+
+def _fit_budget(frames, fps, encode, palette, max_bytes):
+    """Encode, shrinking the frames until the result fits max_bytes (or hits ANIM_MIN_SIDE)."""
+    best = None
+    for _ in range(MAX_ENCODE_ATTEMPTS):
+        data = encode(frames, fps, palette)
+        if best is None or len(data) < len(best[0]):
+            best = (data, frames[0].size)
+        side = min(frames[0].size)
+        if len(data) <= max_bytes or side <= ANIM_MIN_SIDE:
+            break
+        # Encoded size scales roughly with pixel count
+        scale = max((max_bytes / len(data)) ** 0.5 * 0.95, ANIM_MIN_SIDE / side, 0.5)
+        size = (max(1, int(frames[0].width * scale)), max(1, int(frames[0].height * scale)))
+        frames = [f.resize(size, Image.Resampling.LANCZOS) for f in frames]
+    return best
+
+
+def write_animations(collected, output_path, formats, clip_path=None, max_bytes=ANIM_MAX_BYTES):
+    """
+    Write <output stem>.gif / .webp from collected frames.
+    Returns {format: (path, (width, height))} for the files written.
+    """
+    if not collected.frames:
+        return {}
+    stem = os.path.splitext(output_path)[0]
+    palette = None
+    if "gif" in formats:
+        key = palette_key(clip_path, collected.frames[0].size, collected.fps) if clip_path else None
+        palette = clip_palette(key, collected.frames)
+
+    written = {}
+    for fmt in formats:
+        encode = ENCODERS.get(fmt)
+        if encode is None:
+            logging.warning(f"Unknown animated format '{fmt}', skipping")
+            continue
+        data, size = _fit_budget(collected.frames, collected.fps, encode, palette, max_bytes)
+        if len(data) > max_bytes:
+            logging.warning(f"{fmt} for {output_path} is {len(data)} bytes, over the {max_bytes} byte budget")
+        path = f"{stem}.{fmt}"
+        with open(path, "wb") as f:
+            f.write(data)
+        written[fmt] = (path, size)
+    return written
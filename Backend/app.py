@@ -1,111 +1,405 @@
-from flask import Flask, request, jsonify, send_from_directory
+from flask import Flask, Request, Response, request, jsonify, redirect, send_from_directory, stream_with_context
 from flask_cors import CORS
 import subprocess
 import os
 import sys
+import json
+import time
 import uuid
-from threading import Thread
+import glob
+import random
+from threading import Thread, Event, get_ident
 from Photomeme import generate_photo_memes
+import customCaption
+import mediaStore
+import resumableUpload
+import memeCatalog
+import progress
+import metrics
+from rangeFetch import is_remote_source
+from mediaDelivery import media_path, send_media, URL_HASH_LENGTH
+from taskEvents import TaskEvents, TERMINAL_EVENTS
+from renderSettings import RENDER_PROFILES, get_profile
+import jobProfiler
+import retention
+import cpuGovernor
+from workspace import WORKDIR_ENV, JOBS_DIR, OUTPUTS_DIR, DOWNLOADS_DIR, job_dir
+from allfour import STEPS as PIPELINE_STEPS
+import taskControl
+from taskControl import TaskCancelled
+import costModel
+import jobScheduler
+from jobScheduler import JobTooLarge
+import singleFlight
+
+
+class IngestRequest(Request):
+    """Multipart file parts are streamed into a hashing spool inside the media store."""
+
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        spool = mediaStore.HashingSpool()
+        self.spools = getattr(self, "spools", []) + [spool]
+        return spool
+
 
 app = Flask(__name__)
-CORS(app)
+app.request_class = IngestRequest
+CORS(app, expose_headers=["Upload-Offset"])
+
+
+@app.teardown_request
+def discard_spools(exc=None):
+    """Spools that weren't committed to the store (unused fields, aborted or failed uploads)."""
+    for spool in getattr(request, "spools", ()):
+        spool.discard()
 
-OUTPUT_DIR = os.path.join(os.getcwd(), "outputs")
+
+OUTPUT_DIR = OUTPUTS_DIR
 PHOTO_OUTPUT_DIR = os.path.join(OUTPUT_DIR, "photo_memes")
-DOWNLOADS_DIR = os.path.join(os.getcwd(), "downloads")
 
 os.makedirs(OUTPUT_DIR, exist_ok=True)
 os.makedirs(PHOTO_OUTPUT_DIR, exist_ok=True)
 os.makedirs(DOWNLOADS_DIR, exist_ok=True)
 
+PORT = int(os.environ.get("MEMEGEN_PORT", "5000"))
+BASE_URL = f"http://127.0.0.1:{PORT}"
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+
 # Store task states
 tasks = {}  # { task_id: None | [urls] | {"error": "..."} }
 
-def process_input(task_id, input_path, input_type="video"):
+# In-memory view of the SQLite meme catalog (renderers write, we read)
+meme_index = memeCatalog.MemeIndex()
+
+# Stage transitions / per-meme completions / results, streamed by /events
+task_events = TaskEvents()
+SSE_KEEPALIVE = 15  # seconds between comment pings on idle streams
+
+# Per-task stage/step spans (duration, CPU, peak RSS, bytes), returned by /status
+task_spans = {}
+
+# Wall-clock profiles of profiled jobs (one .folded file per pipeline step)
+PROFILES_DIR = os.path.join(OUTPUT_DIR, "profiles")
+
+# Input file of every task; running tasks' inputs and workspaces are never evicted
+task_inputs = {}
+task_types = {}  # { task_id: "youtube" | "video" | "photo" | "custom" }
+
+
+def _in_use():
+    running = [task_id for task_id, result in list(tasks.items()) if result is None]
+    return [task_inputs.get(task_id) for task_id in running] + [job_dir(task_id) for task_id in running]
+
+
+# Cancellation: the pipeline process of each running job, cancel reasons, last client poll
+task_procs = {}
+cancel_requested = {}  # { task_id: "requested" | "abandoned" }
+task_last_seen = {}
+shutting_down = Event()  # jobs killed by a server shutdown stay "running" and resume on the next start
+
+# Jobs wait here and run MEMEGEN_WORKERS at a time, cheapest estimate first (with aging)
+scheduler = jobScheduler.Scheduler()
+cost_model = costModel.CostModel()
+task_estimates = {}  # { task_id: {"media": {...}, "estimate": {"wall", "cpu", "stages"}} }
+
+# Same video + same profile while a job for it runs: later submissions follow that job
+single_flight = singleFlight.SingleFlight()
+task_overrides = {}  # { task_id: result } for task ids that let go of a job others still follow
+
+# Splits the CPU cores between running jobs (torch threads, ffmpeg -threads)
+governor = cpuGovernor.Governor()
+
+# Finished tasks' in-memory state (result, events, spans, ...) is dropped this long
+# after their last activity, like coalesced tasks' aliases; their memes stay in the catalog
+TASK_STATE_TTL = singleFlight.ALIAS_TTL
+
+# Quota/TTL cleanup of downloads/ and outputs/ on a background thread
+storage = retention.RetentionManager(protected=_in_use, on_report=metrics.record_reclaimed,
+                                     on_sweep=lambda: expire_task_state())
+
+def meme_url(rel_path, digest=None):
+    """Immutable content-hashed URL when the digest is known, legacy /outputs URL otherwise."""
+    return f"{BASE_URL}{media_path(rel_path, digest)}"
+
+
+def task_meme_urls(task_id):
+    """Images first, then videos, newest first within each type (same order as before)."""
+    rows, _, _ = meme_index.query(task_id=task_id)
+    images = [meme_url(r["path"], r["sha256"]) for r in rows if r["type"] == "image"]
+    videos = [meme_url(r["path"], r["sha256"]) for r in rows if r["type"] == "video"]
+    return images + videos
+
+
+# ==============================
+# Task records
+# ==============================
+# outputs/jobs/<task_id>/task.json outlives the server process: jobs that were
+# running when it stopped are resumed at startup, failed ones can be retried
+# with POST /tasks/<id>/retry. Both skip the pipeline steps whose completion
+# manifests are still valid (see allfour.py / stageManifest.py).
+TASK_FILE = "task.json"
+
+
+def load_task_record(task_id):
+    try:
+        with open(os.path.join(job_dir(task_id), TASK_FILE), "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def save_task_record(task_id, **fields):
+    record = load_task_record(task_id) or {"task_id": task_id}
+    record.update(fields, updated=time.time())
+    path = os.path.join(job_dir(task_id), TASK_FILE)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path + ".tmp", "w", encoding="utf-8") as f:
+        json.dump(record, f, indent=2)
+    os.replace(path + ".tmp", path)
+    return record
+
+
+def resume_interrupted_tasks():
+    """Restart jobs cut off by a server restart; remember failed ones so they can be retried."""
+    if not os.path.isdir(JOBS_DIR):
+        return
+    for task_id in sorted(os.listdir(JOBS_DIR)):
+        record = load_task_record(task_id)
+        if not record or task_id in tasks:
+            continue
+        if record.get("status") == "running":
+            print(f"🔁 Resuming interrupted task {task_id}")
+            start_task(record["input_path"], record["input_type"], record.get("profile"), task_id=task_id)
+        elif record.get("status") == "error":
+            tasks[task_id] = {"error": record.get("error", "failed")}
+            task_inputs[task_id] = record.get("input_path")
+            task_types[task_id] = record.get("input_type")
+
+
+# ==============================
+# Cancellation
+# ==============================
+def seen(task_id):
+    """A client asked about this task; it is not abandoned."""
+    task_last_seen[task_id] = time.time()
+
+
+def task_view(task_id):
+    """(job id, result) for a task id; followers of a coalesced job see the leader's job."""
+    job_id = single_flight.leader(task_id)
+    if job_id not in tasks:
+        return None, None
+    return job_id, task_overrides[task_id] if task_id in task_overrides else tasks[job_id]
+
+
+def _subscribers(job_id):
+    return [t for t in [job_id] + single_flight.followers(job_id) if t not in task_overrides]
+
+
+def cancel_task(task_id, reason="requested"):
+    """
+    Stop a queued or running job. Its whole process tree gets SIGTERM (then
+    SIGKILL); process_input notices and cleans up. False if already finished.
+    A job other submitters still follow keeps running; only this task id lets go.
+    """
+    job_id, result = task_view(task_id)
+    if job_id is None or result is not None:
+        return False
+    if reason == "requested" and any(t != task_id for t in _subscribers(job_id)):
+        task_overrides[task_id] = {"error": "Task was cancelled", "cancelled": reason}
+        single_flight.detach(task_id)
+        return True
+    task_id = job_id
+    cancel_requested[task_id] = reason
+    queued = scheduler.remove(task_id)
+    if queued:
+        Thread(target=queued).start()  # never started: process_input just cleans up
+    proc = task_procs.get(task_id)
+    if proc:
+        taskControl.kill_tree(proc)
+    return True
+
+
+def expire_task_state(now=None):
+    """Forget finished tasks nobody has looked at for TASK_STATE_TTL (runs on the retention thread)."""
+    now = now or time.time()
+    for task_id, result in list(tasks.items()):
+        if result is None:
+            continue
+        last = max(task_events.last_time(task_id) or 0, task_last_seen.get(task_id, 0))
+        if not last:
+            task_last_seen[task_id] = now  # e.g. a failed job loaded at startup: expires from now on
+            continue
+        if now - last < TASK_STATE_TTL:
+            continue
+        for state in (tasks, task_spans, task_estimates, task_inputs, task_types, task_last_seen):
+            state.pop(task_id, None)
+        task_events.forget(task_id)
+    # Followers (and task ids that let go) of jobs that are gone
+    for task_id in list(task_last_seen) + list(task_overrides):
+        if single_flight.leader(task_id) not in tasks:
+            task_last_seen.pop(task_id, None)
+            task_overrides.pop(task_id, None)
+
+
+def _check_cancelled(task_id):
+    if task_id in cancel_requested:
+        raise TaskCancelled(cancel_requested[task_id])
+
+
+def _discard_cancelled(task_id):
+    """Drop everything a cancelled job produced: partial memes, intermediates, its task record."""
+    for path in memeCatalog.task_outputs(task_id):
+        storage.record("outputs", retention.discard_output(path))
+    storage.record("jobs", retention.discard_workspace(task_id))
+
+
+def _running_tasks():
+    """(job id, last time any of its submitters polled) for every unfinished job."""
+    return [(task_id, max([task_last_seen.get(t, 0) for t in _subscribers(task_id)] or [0]))
+            for task_id, result in list(tasks.items()) if result is None and task_id not in cancel_requested]
+
+
+# Cancels jobs no client has polled for MEMEGEN_ABANDON_TIMEOUT seconds
+watchdog = taskControl.AbandonWatchdog(_running_tasks, cancel_task)
+
+
+def process_input(task_id, input_path, input_type="video", profile=None, profiling=False, from_step=None):
     """
     Background processing for youtube/video/photo
     """
+    started = time.perf_counter()
+    profile_dir = os.path.join(PROFILES_DIR, task_id) if profiling else None
     try:
         meme_files = []
+        _check_cancelled(task_id)  # cancelled while queued
 
         if input_type in ["youtube", "video"]:
             # Run video pipeline
             script_dir = os.path.dirname(os.path.abspath(__file__))  # Get the directory containing app.py
             allfour_path = os.path.join(script_dir, "allfour.py")
             try:
-                subprocess.run([sys.executable, allfour_path, "--input", input_path], 
-                            check=True,
-                            cwd=script_dir)  # Set working directory to Backend folder
+                cmd = [sys.executable, allfour_path, "--input", input_path, "--task-id", task_id]
+                if profile:
+                    cmd += ["--profile", profile]
+                if from_step:
+                    cmd += ["--from-step", from_step]
+                # Intermediates go to outputs/jobs/<task_id>, so concurrent jobs don't share files
+                extra_env = {WORKDIR_ENV: job_dir(task_id)}
+                extra_env.update(governor.start(task_id, job_dir(task_id)))
+                if profile_dir:
+                    extra_env[jobProfiler.PROFILE_DIR_ENV] = profile_dir
+                run_pipeline(cmd, task_id, script_dir, extra_env)  # Set working directory to Backend folder
             except subprocess.CalledProcessError as e:
                 print(f"Error running allfour.py: {str(e)}")
                 raise
+            _check_cancelled(task_id)
 
-            # Check for final_outputs directory and find the latest run folder
-            final_outputs_dir = os.path.join(OUTPUT_DIR, "final_outputs")
-            if os.path.exists(final_outputs_dir) and os.path.isdir(final_outputs_dir):
-                # Get all run folders in final_outputs
-                run_folders = [f for f in os.listdir(final_outputs_dir) 
-                              if os.path.isdir(os.path.join(final_outputs_dir, f)) and f.startswith("run_")]
-                
-                if run_folders:
-                    # Sort by creation time (newest first)
-                    run_folders.sort(key=lambda x: os.path.getctime(os.path.join(final_outputs_dir, x)), reverse=True)
-                    latest_run_folder = run_folders[0]
-                    latest_run_path = os.path.join(final_outputs_dir, latest_run_folder)
-                    
-                    # Get both image and video files from the latest run folder
-                    if os.path.exists(latest_run_path):
-                        all_files = [f for f in os.listdir(latest_run_path) 
-                                 if os.path.isfile(os.path.join(latest_run_path, f))]
-                        
-                        # Separate images and videos
-                        image_files = [f for f in all_files if f.lower().endswith(('.png', '.jpg', '.jpeg', '.gif'))]
-                        video_files = [f for f in all_files if f.lower().endswith(('.mp4', '.webm'))]
-                        
-                        # Sort each type by modification time
-                        image_files.sort(key=lambda x: os.path.getmtime(os.path.join(latest_run_path, x)), reverse=True)
-                        video_files.sort(key=lambda x: os.path.getmtime(os.path.join(latest_run_path, x)), reverse=True)
-                        
-                        # Take top 3 of each type
-                        top_images = image_files  # Changed from image_files[:3]
-                        top_videos = video_files  # Changed from video_files[:3]
-                        
-                        # Combine the results
-                        meme_files = [f"http://127.0.0.1:5000/outputs/final_outputs/{latest_run_folder}/{f}" 
-                                    for f in (top_images + top_videos)]
-
-            # If no files found in the final_outputs, fall back to the main output directory
-            if not meme_files:
-                all_files = [f for f in os.listdir(OUTPUT_DIR) 
-                         if os.path.isfile(os.path.join(OUTPUT_DIR, f))]
-                
-                # Separate images and videos
-                image_files = [f for f in all_files if f.lower().endswith(('.png', '.jpg', '.jpeg', '.gif'))]
-                video_files = [f for f in all_files if f.lower().endswith(('.mp4', '.webm'))]
-                
-                # Sort each type by modification time
-                image_files.sort(key=lambda x: os.path.getmtime(os.path.join(OUTPUT_DIR, x)), reverse=True)
-                video_files.sort(key=lambda x: os.path.getmtime(os.path.join(OUTPUT_DIR, x)), reverse=True)
-                
-                # Take top 3 of each type
-                top_images = image_files  # Changed from image_files[:3]
-                top_videos = video_files  # Changed from video_files[:3]
-                
-                # Combine the results
-                meme_files = [f"http://127.0.0.1:5000/outputs/{f}" for f in (top_images + top_videos)]
+            # Renderers record their outputs in the catalog, tagged with this task id
+            meme_files = task_meme_urls(task_id)
 
         elif input_type == "photo":
-            output_path = generate_photo_memes(input_path)
+            task_events.publish(task_id, "stage", stage="rendering")
+            span_start, t0 = time.time(), time.perf_counter()
+            sampler = None
+            if profile_dir:
+                sampler = jobProfiler.WallSampler("Photomeme", thread_ids={get_ident()}).start()
+            try:
+                output_path = generate_photo_memes(input_path, task_id=task_id)
+            finally:
+                if sampler:
+                    sampler.stop().write(os.path.join(profile_dir, "Photomeme" + jobProfiler.FOLDED_EXT))
+            span = {"stage": "rendering", "start": span_start, "duration": round(time.perf_counter() - t0, 3)}
+            task_spans.setdefault(task_id, []).append(span)
+            metrics.record_span(span)
+            _check_cancelled(task_id)  # Photomeme runs in this thread; its outputs are dropped below
             if output_path:
-                filename = os.path.basename(output_path)
-                meme_files = [f"http://127.0.0.1:5000/outputs/photo_memes/{filename}"]
+                meme_files = task_meme_urls(task_id)
             else:
                 meme_files = []
 
         tasks[task_id] = meme_files
+        task_events.publish(task_id, "done", memes=meme_files)
+        metrics.TASKS.inc(type=input_type, outcome="done")
+
+        # Every follower got these memes without running the pipeline again
+        followers = single_flight.followers(task_id)
+        if followers:
+            spans = task_spans.get(task_id, [])
+            job_cpu = (sum(s.get("cpu") or 0 for s in spans if "step" in s)
+                       or sum(s.get("cpu") or s.get("duration") or 0 for s in spans if "stage" in s))
+            metrics.WORK_AVOIDED.inc(len(followers) * job_cpu, type=input_type)
+
+        # Calibrate the cost model with what each stage really took
+        if task_id in task_estimates:
+            stage_spans = [s for s in task_spans.get(task_id, []) if "stage" in s]
+            cost_model.observe(task_estimates[task_id]["media"], input_type, stage_spans)
+
+        # Final memes are in final_outputs/ now; a failed job's workspace is kept for retries
+        storage.record("jobs", retention.discard_workspace(task_id))
+
+    except TaskCancelled as e:
+        _discard_cancelled(task_id)
+        tasks[task_id] = {"error": "Task was cancelled", "cancelled": str(e)}
+        metrics.TASKS.inc(type=input_type, outcome="cancelled")
+        task_events.publish(task_id, "error", error="Task was cancelled", cancelled=str(e))
+        print(f"🛑 Task {task_id} cancelled ({e})")
 
     except Exception as e:
         tasks[task_id] = {"error": str(e)}
+        if not shutting_down.is_set():
+            save_task_record(task_id, status="error", error=str(e), stage=task_events.current_stage(task_id))
+        metrics.TASKS.inc(type=input_type, outcome="error")
+        metrics.FAILURES.inc(stage=task_events.current_stage(task_id) or "unknown")
+        task_events.publish(task_id, "error", error=str(e))
+    governor.finish(task_id)
+    single_flight.done(task_id)
+    cancel_requested.pop(task_id, None)
+    metrics.TASK_SECONDS.observe(time.perf_counter() - started, type=input_type)
+
+
+def run_pipeline(cmd, task_id, cwd, extra_env=None):
+    """
+    Run the video pipeline, turning the progress lines its steps print into
+    task events and passing every other line through to our own stdout.
+    """
+    env = dict(os.environ, **{progress.PROGRESS_ENV: "1", "PYTHONUNBUFFERED": "1"}, **(extra_env or {}))
+    _check_cancelled(task_id)
+    proc = subprocess.Popen(cmd, cwd=cwd, env=env, stdout=subprocess.PIPE,
+                            text=True, encoding="utf-8", errors="replace", bufsize=1,
+                            **taskControl.popen_kwargs())
+    task_procs[task_id] = proc
+    if task_id in cancel_requested:  # cancelled while we were starting it
+        taskControl.kill_tree(proc)
+    for line in proc.stdout:
+        parsed = progress.parse(line)
+        if parsed is None:
+            sys.stdout.write(line)
+            continue
+        event, data = parsed
+        # Telemetry goes to /status and /metrics, not to the SSE stream
+        if event in ("span", "step"):
+            task_spans.setdefault(task_id, []).append(data)
+            if event == "span":
+                metrics.record_span(data)
+            else:
+                metrics.STEP_SECONDS.observe(data.get("duration") or 0, step=data.get("step"))
+            continue
+        if event == "cache":
+            metrics.record_cache(data.get("cache"), data.get("hit"))
+            continue
+        if event == "stage":
+            governor.stage(task_id, data.get("stage"))
+        if event == "meme":
+            data = {"url": meme_url(data["path"], data.get("sha256")), "type": data.get("type")}
+        task_events.publish(task_id, event, **data)
+    proc.stdout.close()
+    returncode = proc.wait()
+    task_procs.pop(task_id, None)
+    _check_cancelled(task_id)
+    if returncode != 0:
+        raise subprocess.CalledProcessError(returncode, cmd)
 
 
 @app.route('/upload', methods=['POST'])
@@ -113,69 +407,348 @@ def upload():
     try:
         input_path = None
         input_type = None
+        # Render profile (preview/social/archive): JSON key, form field, ?profile= or X-Render-Profile
+        profile = request.args.get('profile') or request.headers.get('X-Render-Profile')
+        # Opt-in wall-clock profiling of this job: ?profiling=1, X-Profile-Job: 1, or JSON/form "profiling"
+        profiling = request.args.get('profiling') or request.headers.get('X-Profile-Job')
 
         # Handle YouTube JSON input
         if request.is_json:
             data = request.get_json()
+            profile = data.get('profile') or profile
+            profiling = data.get('profiling') or profiling
             youtube_link = data.get('youtubeLink')
             if not youtube_link:
                 return jsonify({"success": False, "error": "No YouTube link provided."})
+            if not is_remote_source(youtube_link.strip()):
+                return jsonify({"success": False, "error": "Not a YouTube link."}), 400
+            youtube_link = youtube_link.strip()
             input_path = youtube_link
             input_type = "youtube"
 
-        # Handle file uploads
+        # Client already knows the content hash and we have it: skip the body entirely
+        elif request.headers.get('X-Content-SHA256') and request.headers.get('X-Upload-Type') in ("video", "photo") \
+                and mediaStore.find_stored(request.headers['X-Content-SHA256'].lower()):
+            input_path = mediaStore.find_stored(request.headers['X-Content-SHA256'].lower())
+            input_type = request.headers['X-Upload-Type']
+            metrics.record_cache("upload_dedup", True)
+
+        # Handle file uploads (streamed + hashed into the content-addressed store)
         else:
             video_file = request.files.get('videoFile')
             photo_file = request.files.get('photoFile')
+            profile = request.form.get('profile') or profile
+            profiling = request.form.get('profiling') or profiling
 
             if video_file:
-                input_path = os.path.join(DOWNLOADS_DIR, f"{uuid.uuid4()}_{video_file.filename}")
-                video_file.save(input_path)
+                input_path, _, duplicate = mediaStore.ingest_upload(video_file)
                 input_type = "video"
 
             elif photo_file:
-                input_path = os.path.join(DOWNLOADS_DIR, f"{uuid.uuid4()}_{photo_file.filename}")
-                photo_file.save(input_path)
+                input_path, _, duplicate = mediaStore.ingest_upload(photo_file)
                 input_type = "photo"
 
             else:
                 return jsonify({"success": False, "error": "No input provided."})
 
-        # Create task ID
-        task_id = str(uuid.uuid4())
-        tasks[task_id] = None  # mark pending
-
-        # Process in background
-        thread = Thread(target=process_input, args=(task_id, input_path, input_type))
-        thread.start()
+            metrics.record_cache("upload_dedup", duplicate)
 
-        return jsonify({"success": True, "task_id": task_id})
+        if profile and profile not in RENDER_PROFILES:
+            return jsonify({"success": False, "error": f"Unknown profile '{profile}'",
+                            "profiles": list(RENDER_PROFILES)}), 400
+        return _task_response(input_path, input_type, profile, _truthy(profiling))
 
     except Exception as e:
         return jsonify({"success": False, "error": str(e)})
 
 
+def _task_response(input_path, input_type, profile, profiling):
+    """Start a job and answer with its id, cost estimate and ETA (413 if it's too big to accept)."""
+    try:
+        task_id = start_task(input_path, input_type, profile, profiling)
+    except JobTooLarge as e:
+        return jsonify({"success": False, "error": str(e), "estimate": e.estimate,
+                        "max_cpu_seconds": e.limit}), 413
+    job_id = single_flight.leader(task_id)
+    position, eta = scheduler.eta(job_id)
+    return jsonify({"success": True, "task_id": task_id, "estimate": task_estimates.get(job_id, {}).get("estimate"),
+                    "queue_position": position, "eta_seconds": eta, "shared": job_id != task_id})
+
+
+def _truthy(value):
+    return value is True or str(value).lower() in ("1", "true", "yes", "on")
+
+
+def start_task(input_path, input_type, profile=None, profiling=False, task_id=None, from_step=None):
+    """
+    `profiling` forces a profile; otherwise MEMEGEN_PROFILE_RATE decides at random.
+    Passing an existing `task_id` resumes/retries that task in its workspace.
+    New jobs estimated above MEMEGEN_MAX_JOB_CPU raise JobTooLarge.
+    A new task for a video that is already being processed with the same
+    profile doesn't start a job; it follows the running one. A resumed task
+    leads its key again; it only runs unshared if another job for the same
+    video and profile is already running.
+    """
+    resumed = task_id is not None
+    # Create task ID
+    task_id = task_id or str(uuid.uuid4())
+    key = singleFlight.job_key(input_path, input_type, profile)
+    if resumed:
+        # New submissions of the same video follow the retry like any running job
+        single_flight.lead(key, task_id)
+    else:
+        leader = single_flight.join(key, task_id)
+        if leader is not None:
+            seen(task_id)
+            metrics.COALESCED.inc(type=input_type)
+            print(f"🔗 Task {task_id} follows running task {leader}")
+            return task_id
+    tasks[task_id] = None  # followers can look the job up while it's probed
+
+    media = costModel.probe(input_path, input_type)
+    estimate = cost_model.estimate(media, input_type)
+    if not resumed and jobScheduler.MAX_JOB_CPU and estimate["cpu"] > jobScheduler.MAX_JOB_CPU:
+        tasks[task_id] = {"error": str(JobTooLarge(estimate))}
+        single_flight.done(task_id)
+        raise JobTooLarge(estimate)
+
+    task_estimates[task_id] = {"media": media, "estimate": estimate}
+    tasks[task_id] = None  # mark pending
+    task_inputs[task_id] = input_path
+    task_types[task_id] = input_type
+    seen(task_id)
+    attempts = (load_task_record(task_id) or {}).get("attempts", 0) + 1
+    save_task_record(task_id, input_path=input_path, input_type=input_type, profile=profile,
+                     status="running", error=None, attempts=attempts)
+    if resumed:  # /events and /status only show this attempt; the cost model only learns from it
+        task_events.new_attempt(task_id)
+        task_spans.pop(task_id, None)
+    task_events.publish(task_id, "stage", stage="queued")
+
+    # Process in background
+    profiling = profiling or random.random() < jobProfiler.PROFILE_RATE
+    scheduler.submit(task_id, estimate["wall"],
+                     lambda: process_input(task_id, input_path, input_type, profile, profiling, from_step))
+    return task_id
+
+
+# ==============================
+# Resumable chunked uploads
+# ==============================
+# POST   /uploads                  {filename, size, type, sha256?} -> upload_id
+# HEAD   /uploads/<id>             current offset in the Upload-Offset header
+# GET    /uploads/<id>             current offset as JSON
+# PATCH  /uploads/<id>             raw chunk body, Upload-Offset + optional X-Chunk-SHA256 headers
+# POST   /uploads/<id>/finalize    verify, store, start the job -> task_id ({profile?})
+# DELETE /uploads/<id>             abort
+def _upload_error(e):
+    body = {"success": False, "error": str(e)}
+    if e.offset is not None:
+        body["offset"] = e.offset
+    response = jsonify(body)
+    response.status_code = e.status
+    if e.offset is not None:
+        response.headers["Upload-Offset"] = str(e.offset)
+    return response
+
+
+@app.route('/uploads', methods=['POST'])
+def create_resumable_upload():
+    data = request.get_json(silent=True) or {}
+    try:
+        state = resumableUpload.create_upload(data.get("filename"), data.get("size"),
+                                              data.get("type", "video"), data.get("sha256"))
+    except resumableUpload.UploadError as e:
+        return _upload_error(e)
+    return jsonify({"success": True, "upload_id": state["id"], "offset": 0,
+                    "chunk_size": resumableUpload.RECOMMENDED_CHUNK_SIZE}), 201
+
+
+@app.route('/uploads/<upload_id>', methods=['GET', 'HEAD'])
+def resumable_upload_status(upload_id):
+    try:
+        state = resumableUpload.get_upload(upload_id)
+    except resumableUpload.UploadError as e:
+        return _upload_error(e)
+    response = jsonify({"success": True, "offset": state["offset"], "size": state["size"]})
+    response.headers["Upload-Offset"] = str(state["offset"])
+    return response
+
+
+@app.route('/uploads/<upload_id>', methods=['PATCH', 'PUT'])
+def append_resumable_upload(upload_id):
+    try:
+        offset = int(request.headers.get("Upload-Offset", request.args.get("offset", -1)))
+        new_offset = resumableUpload.append_chunk(upload_id, offset, request.stream,
+                                                  request.headers.get("X-Chunk-SHA256"))
+    except ValueError:
+        return _upload_error(resumableUpload.UploadError("Upload-Offset header required"))
+    except resumableUpload.UploadError as e:
+        return _upload_error(e)
+    response = jsonify({"success": True, "offset": new_offset})
+    response.headers["Upload-Offset"] = str(new_offset)
+    return response
+
+
+@app.route('/uploads/<upload_id>/finalize', methods=['POST'])
+def finalize_resumable_upload(upload_id):
+    data = request.get_json(silent=True) or {}
+    profile = data.get("profile") or request.args.get("profile")
+    profiling = _truthy(data.get("profiling") or request.args.get("profiling"))
+    if profile and profile not in RENDER_PROFILES:
+        return jsonify({"success": False, "error": f"Unknown profile '{profile}'",
+                        "profiles": list(RENDER_PROFILES)}), 400
+    try:
+        input_path, input_type = resumableUpload.finalize_upload(upload_id)
+    except resumableUpload.UploadError as e:
+        return _upload_error(e)
+    return _task_response(input_path, input_type, profile, profiling)
+
+
+@app.route('/uploads/<upload_id>', methods=['DELETE'])
+def abort_resumable_upload(upload_id):
+    try:
+        resumableUpload.abort_upload(upload_id)
+    except resumableUpload.UploadError as e:
+        return _upload_error(e)
+    return jsonify({"success": True})
+
+
+@app.route('/events/<task_id>')
+def events(task_id):
+    """
+    Server-Sent Events stream for one task: `stage`, `extracted`, `meme`, then
+    `done` (memes) or `error`. Resumes after Last-Event-ID on reconnect and
+    closes after the terminal event. /status polling keeps working alongside.
+    """
+    job_id, _ = task_view(task_id)
+    if job_id is None:
+        return jsonify({"success": False, "error": "Invalid task ID"}), 404
+
+    try:
+        after = int(request.headers.get("Last-Event-ID") or request.args.get("last_event_id", 0))
+    except ValueError:
+        after = 0
+
+    def stream():
+        nonlocal after
+        yield "retry: 3000\n\n"
+        while True:
+            seen(task_id)  # an open stream counts as a client
+            new_events = task_events.wait(job_id, after, timeout=SSE_KEEPALIVE)
+            if not new_events:
+                yield ": keep-alive\n\n"
+                continue
+            for e in new_events:
+                yield f"id: {e['id']}\nevent: {e['event']}\ndata: {json.dumps(e['data'])}\n\n"
+                after = e["id"]
+                if e["event"] in TERMINAL_EVENTS:
+                    return
+
+    return Response(stream_with_context(stream()), mimetype="text/event-stream",
+                    headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+
 @app.route('/status/<task_id>')
 def status(task_id):
-    if task_id not in tasks:
+    job_id, result = task_view(task_id)
+    if job_id is None:
         return jsonify({"success": False, "error": "Invalid task ID"})
 
-    result = tasks[task_id]
+    seen(task_id)
+    spans = task_spans.get(job_id, [])
 
     if result is None:
-        return jsonify({"ready": False})
+        position, eta = scheduler.eta(job_id)
+        return jsonify({"ready": False, "stage": task_events.current_stage(job_id), "spans": spans,
+                        "queue_position": position, "eta_seconds": eta})
     elif isinstance(result, dict) and "error" in result:
-        return jsonify({"ready": True, "success": False, "error": result["error"]})
+        return jsonify({"ready": True, "success": False, "error": result["error"],
+                        "cancelled": "cancelled" in result, "spans": spans})
     else:
-        return jsonify({"ready": True, "success": True, "memes": result})
-        
+        return jsonify({"ready": True, "success": True, "memes": result, "spans": spans})
+
+
+@app.route('/tasks/<task_id>', methods=['DELETE'])
+def delete_task(task_id):
+    """Cancel a queued or running task; its partial outputs and workspace are deleted."""
+    if task_view(task_id)[0] is None:
+        return jsonify({"success": False, "error": "Invalid task ID"}), 404
+    if not cancel_task(task_id):
+        return jsonify({"success": False, "error": "Task already finished"}), 409
+    return jsonify({"success": True, "task_id": task_id, "cancelling": True}), 202
+
+
+@app.route('/tasks/<task_id>/retry', methods=['POST'])
+def retry_task(task_id):
+    """
+    Re-run a failed task under the same id. Pipeline steps that completed in
+    an earlier attempt are skipped, so it restarts at the step that failed;
+    {"from_step": "<step>"} forces that step and the ones after it to run again.
+    """
+    task_id = single_flight.leader(task_id)
+    if task_id in tasks and tasks[task_id] is None:
+        return jsonify({"success": False, "error": "Task is still running"}), 409
+    record = load_task_record(task_id)
+    if not record or record.get("status") != "error":
+        return jsonify({"success": False, "error": "No failed task with this ID"}), 404
+
+    from_step = (request.get_json(silent=True) or {}).get("from_step")
+    if from_step and from_step not in PIPELINE_STEPS:
+        return jsonify({"success": False, "error": f"Unknown step, use one of: {', '.join(PIPELINE_STEPS)}"}), 400
+    input_path = record["input_path"]
+    if record["input_type"] != "youtube" and not os.path.exists(input_path):
+        return jsonify({"success": False, "error": "The task's input file is no longer available"}), 410
+
+    start_task(input_path, record["input_type"], record.get("profile"), task_id=task_id, from_step=from_step)
+    return jsonify({"success": True, "task_id": task_id, "failed_stage": record.get("stage"),
+                    "attempt": record.get("attempts", 1) + 1})
+
+
+@app.route('/profile/<task_id>')
+def job_profile(task_id):
+    """
+    Wall-clock profile of a profiled job as folded stacks (flamegraph.pl,
+    speedscope, inferno). Stacks are rooted at step;stage;thread.
+    """
+    task_id, _ = task_view(task_id)
+    if task_id is None:
+        return jsonify({"success": False, "error": "Invalid task ID"}), 404
+    files = sorted(glob.glob(os.path.join(PROFILES_DIR, task_id, "*" + jobProfiler.FOLDED_EXT)))
+    if not files:
+        return jsonify({"success": False, "error": "No profile for this task (upload with profiling=1)",
+                        "ready": tasks[task_id] is not None}), 404
+    response = Response(jobProfiler.merge_folded(files), mimetype="text/plain")
+    response.headers["Content-Disposition"] = f'attachment; filename="{task_id}{jobProfiler.FOLDED_EXT}"'
+    return response
+
+
+@app.route('/metrics')
+def prometheus_metrics():
+    """Prometheus scrape endpoint: stage latency histograms, cache hits, failures, queue depth."""
+    in_flight = metrics.Gauge("memegen_queue_depth", "Tasks accepted but not finished yet",
+                              lambda: sum(1 for r in list(tasks.values()) if r is None))
+    return Response(metrics.render(in_flight), mimetype="text/plain; version=0.0.4")
+
+
+@app.route('/storage')
+def storage_report():
+    """Disk usage per retention class as of the last sweep, plus bytes reclaimed since startup."""
+    return jsonify({
+        "last_sweep": storage.last_sweep,
+        "interval": storage.interval,
+        "reclaimed_total": storage.reclaimed_total,
+        "classes": storage.last_report,
+    })
+
+
 @app.route('/results/<task_id>')
 def get_results(task_id):
     """Get results for a specific task"""
-    if task_id not in tasks:
+    job_id, result = task_view(task_id)
+    if job_id is None:
         return jsonify({"success": False, "error": "Invalid task ID"})
-
-    result = tasks[task_id]
+    seen(task_id)
 
     if result is None:
         return jsonify({"success": False, "ready": False})
@@ -185,9 +758,24 @@ def get_results(task_id):
         return jsonify({"success": True, "ready": True, "memes": result})
 
 
+@app.route('/media/<content_hash>/<path:filename>')
+def serve_media(content_hash, filename):
+    """
+    Immutable, content-hashed media URLs (cached for a year by browsers/CDNs).
+    A stale hash (file re-rendered since) redirects to the current URL.
+    Thumbnails/posters are addressed with their parent meme's hash.
+    """
+    row = meme_index.get(filename)
+    if row is None or not row["sha256"]:
+        return "File not found", 404
+    if row["sha256"][:URL_HASH_LENGTH] != content_hash:
+        return redirect(media_path(filename, row["sha256"]), code=301)
+    return send_media(OUTPUT_DIR, filename, row["sha256"])
+
+
 @app.route('/outputs/<path:filename>')
 def serve_output(filename):
-    return send_from_directory(OUTPUT_DIR, filename)
+    return send_media(OUTPUT_DIR, filename)
 
 
 @app.route('/outputs/final_outputs/<path:filepath>')
@@ -204,7 +792,7 @@ def serve_final_output(filepath):
         filename = '/'.join(parts[1:])
         final_outputs_dir = os.path.join(OUTPUT_DIR, "final_outputs")
         run_folder_path = os.path.join(final_outputs_dir, run_folder)
-        return send_from_directory(run_folder_path, filename)
+        return send_media(run_folder_path, filename)
     return "File not found", 404
 
 
@@ -216,84 +804,134 @@ def get_memes():
 
 @app.route('/get_all_memes')
 def get_all_memes():
-    # Check all output directories for memes
-    all_memes = []
-    
-    # Check final_outputs directory (for video/YouTube results)
-    final_outputs_dir = os.path.join(OUTPUT_DIR, "final_outputs")
-    if os.path.exists(final_outputs_dir) and os.path.isdir(final_outputs_dir):
-        # Get all run folders in final_outputs
-        run_folders = [f for f in os.listdir(final_outputs_dir) 
-                      if os.path.isdir(os.path.join(final_outputs_dir, f)) and f.startswith("run_")]
-        
-        if run_folders:
-            # Sort by creation time (newest first)
-            run_folders.sort(key=lambda x: os.path.getctime(os.path.join(final_outputs_dir, x)), reverse=True)
-            latest_run_folder = run_folders[0]
-            latest_run_path = os.path.join(final_outputs_dir, latest_run_folder)
-            
-            # Get image files from the latest run folder
-            if os.path.exists(latest_run_path):
-                files = [f for f in os.listdir(latest_run_path) 
-                       if os.path.isfile(os.path.join(latest_run_path, f)) and 
-                       f.lower().endswith(('.png', '.jpg', '.jpeg', '.gif', '.mp4', '.webm'))]
-                
-                for f in files:
-                    file_path = os.path.join(latest_run_path, f)
-                    mtime = os.path.getmtime(file_path)
-                    url = f"http://127.0.0.1:5000/outputs/final_outputs/{latest_run_folder}/{f}"
-                    all_memes.append((url, mtime))
-    
-    # Check main output directory
-    if os.path.exists(OUTPUT_DIR):
-        main_files = [f for f in os.listdir(OUTPUT_DIR) 
-                     if os.path.isfile(os.path.join(OUTPUT_DIR, f)) 
-                     and f.lower().endswith(('.png', '.jpg', '.jpeg', '.gif', '.mp4', '.webm'))]
-        
-        for f in main_files:
-            file_path = os.path.join(OUTPUT_DIR, f)
-            mtime = os.path.getmtime(file_path)
-            url = f"http://127.0.0.1:5000/outputs/{f}"
-            all_memes.append((url, mtime))
-    
-    # Check photo memes directory
-    if os.path.exists(PHOTO_OUTPUT_DIR):
-        photo_files = [f for f in os.listdir(PHOTO_OUTPUT_DIR) 
-                      if os.path.isfile(os.path.join(PHOTO_OUTPUT_DIR, f)) 
-                      and f.lower().endswith(('.png', '.jpg', '.jpeg', '.gif'))]
-        
-        for f in photo_files:
-            file_path = os.path.join(PHOTO_OUTPUT_DIR, f)
-            mtime = os.path.getmtime(file_path)
-            url = f"http://127.0.0.1:5000/outputs/photo_memes/{f}"
-            all_memes.append((url, mtime))
-    
-    # Sort by modification time (newest first)
-    all_memes.sort(key=lambda x: x[1], reverse=True)
-    
-    # Separate images and videos
-    images = [(url, time) for url, time in all_memes if not url.lower().endswith(('.mp4', '.webm'))]
-    videos = [(url, time) for url, time in all_memes if url.lower().endswith(('.mp4', '.webm'))]
-    
-    # Take top 3 of each type
-    top_images = [url for url, _ in images[:]]
-    top_videos = [url for url, _ in videos[:]]
-    
-    # Combine and return both types
-    top_memes = top_images + top_videos
-    
-    return jsonify({'memes': top_memes})
+    """
+    Paginated meme listing from the catalog.
+    Query params: limit (default/max 200), cursor (from next_cursor), type (image|video), task_id.
+    Supports If-None-Match -> 304 while the catalog hasn't changed.
+    """
+    limit = min(max(request.args.get('limit', DEFAULT_PAGE_SIZE, type=int), 1), MAX_PAGE_SIZE)
+    cursor = request.args.get('cursor', type=int)
+    kind = request.args.get('type')
+    if kind not in (None, "image", "video"):
+        return jsonify({"success": False, "error": "type must be 'image' or 'video'"}), 400
+    task_id = request.args.get('task_id')
+
+    rows, next_cursor, version = meme_index.query(limit=limit, cursor=cursor, kind=kind, task_id=task_id)
+    items = [{
+        "url": meme_url(r["path"], r["sha256"]),
+        "thumbnail": meme_url(r["thumbnail"], r["sha256"]) if r.get("thumbnail") else None,
+        "poster": meme_url(r["poster"], r["sha256"]) if r.get("poster") else None,
+        "type": r["type"],
+        "width": r["width"],
+        "height": r["height"],
+        "duration": r["duration"],
+        "size": r["size"],
+        "task_id": r["task_id"],
+        "created": r["created"],
+    } for r in rows]
+
+    # Images first, then videos, like the old response
+    memes = [i["url"] for i in items if i["type"] == "image"] + [i["url"] for i in items if i["type"] == "video"]
+
+    response = jsonify({'memes': memes, 'items': items, 'next_cursor': next_cursor})
+    response.set_etag(f"{version}-{limit}-{cursor}-{kind}-{task_id}")
+    response.headers['Cache-Control'] = 'no-cache'  # always revalidate, 304 is cheap
+    return response.make_conditional(request)
 
 
 @app.route('/outputs/photo_memes/<path:filename>')
 def serve_photo_output(filename):
-    return send_from_directory(PHOTO_OUTPUT_DIR, filename)
+    return send_media(PHOTO_OUTPUT_DIR, filename)
+
+
 
 
+# ==============================
+# Custom captions
+# ==============================
+# POST /tasks/<id>/captions  {"items": [{"timestamp", "caption", "duration"?}], "profile"?}
+# renders a still + clip per item from the video of an existing youtube/video
+# task, as a new task (its own id, /status, /events, /results, DELETE).
+def process_custom_captions(task_id, video_path, items, profile=None):
+    """Background rendering of a custom caption batch (in this process, like photo memes)."""
+    started = time.perf_counter()
+    try:
+        _check_cancelled(task_id)  # cancelled while queued
+        task_events.publish(task_id, "stage", stage="rendering")
+        # Rendered in this process, so the budget file is passed to the encoders instead of the env
+        budget = governor.start(task_id, job_dir(task_id), "rendering").get(cpuGovernor.BUDGET_ENV)
+        span_start, t0 = time.time(), time.perf_counter()
+        customCaption.render_custom_memes(video_path, items, task_id=task_id, profile=get_profile(profile),
+                                          work=job_dir(task_id), cancelled=lambda: task_id in cancel_requested,
+                                          budget=budget)
+        span = {"stage": "rendering", "start": span_start, "duration": round(time.perf_counter() - t0, 3)}
+        task_spans.setdefault(task_id, []).append(span)
+        metrics.record_span(span)
+        _check_cancelled(task_id)
+
+        meme_files = task_meme_urls(task_id)
+        tasks[task_id] = meme_files
+        task_events.publish(task_id, "done", memes=meme_files)
+        metrics.TASKS.inc(type="custom", outcome="done")
+        storage.record("jobs", retention.discard_workspace(task_id))
+
+    except (TaskCancelled, customCaption.CaptionCancelled):
+        reason = cancel_requested.get(task_id, "requested")
+        _discard_cancelled(task_id)
+        tasks[task_id] = {"error": "Task was cancelled", "cancelled": reason}
+        metrics.TASKS.inc(type="custom", outcome="cancelled")
+        task_events.publish(task_id, "error", error="Task was cancelled", cancelled=reason)
+        print(f"🛑 Task {task_id} cancelled ({reason})")
 
+    except Exception as e:
+        tasks[task_id] = {"error": str(e)}
+        metrics.TASKS.inc(type="custom", outcome="error")
+        metrics.FAILURES.inc(stage="rendering")
+        task_events.publish(task_id, "error", error=str(e))
+    governor.finish(task_id)
+    cancel_requested.pop(task_id, None)
+    metrics.TASK_SECONDS.observe(time.perf_counter() - started, type="custom")
 
-## Custom caption functionality disabled intentionally.
-## Endpoint removed to simplify backend while feature is paused.
+
+@app.route('/tasks/<task_id>/captions', methods=['POST'])
+def custom_captions(task_id):
+    """
+    Caption several moments of an existing task's video in one request.
+    All items are cut from a single timestamp-ordered decode of the source
+    and rendered concurrently; the outputs belong to the returned task id.
+    """
+    job_id = single_flight.leader(task_id)
+    input_path, input_type = task_inputs.get(job_id), task_types.get(job_id)
+    if input_path is None:
+        return jsonify({"success": False, "error": "Invalid task ID"}), 404
+    if input_type not in ("youtube", "video"):
+        return jsonify({"success": False, "error": "Custom captions need a video or YouTube task"}), 400
+    if input_type == "video" and not os.path.exists(input_path):
+        return jsonify({"success": False, "error": "The task's video is no longer available"}), 410
+
+    data = request.get_json(silent=True) or {}
+    profile = data.get("profile")
+    if profile and profile not in RENDER_PROFILES:
+        return jsonify({"success": False, "error": f"Unknown profile '{profile}'",
+                        "profiles": list(RENDER_PROFILES)}), 400
+    try:
+        items = customCaption.parse_items(data.get("items"))
+    except ValueError as e:
+        return jsonify({"success": False, "error": str(e)}), 400
+
+    caption_task = str(uuid.uuid4())
+    tasks[caption_task] = None
+    task_inputs[caption_task] = input_path  # kept out of the retention sweeps while rendering
+    task_types[caption_task] = "custom"
+    seen(caption_task)
+    task_events.publish(caption_task, "stage", stage="queued")
+    # Roughly real time per second of clip; short batches overtake full pipeline jobs
+    scheduler.submit(caption_task, sum(item["duration"] for item in items),
+                     lambda: process_custom_captions(caption_task, input_path, items, profile))
+
+    position, eta = scheduler.eta(caption_task)
+    return jsonify({"success": True, "task_id": caption_task, "source_task_id": task_id, "items": len(items),
+                    "queue_position": position, "eta_seconds": eta}), 202
 
 
 # Serve frontend files
@@ -310,5 +948,14 @@ def serve_frontend(path):
     return send_from_directory('../Frontend', path)
 
 if __name__ == "__main__":
-    # Run without auto-reloader to avoid duplicate model loads
-    app.run(debug=False)
+    storage.start()
+    watchdog.start()
+    resume_interrupted_tasks()
+    try:
+        # Run without auto-reloader to avoid duplicate model loads
+        app.run(debug=False, port=PORT)
+    finally:
+        # Pipelines run in their own sessions and don't see our Ctrl+C; stop them here
+        shutting_down.set()
+        for running in list(task_procs.values()):
+            taskControl.kill_tree(running)
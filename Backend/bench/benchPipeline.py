@@ -0,0 +1,341 @@
+# benchPipeline.py
+import os
+import sys
+import glob
+import json
+import time
+import random
+import shutil
+import tempfile
+import argparse
+import platform
+import statistics
+import threading
+import subprocess
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+BACKEND_DIR = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, BACKEND_DIR)
+
+import progress  # noqa: E402
+import cpuGovernor  # noqa: E402
+from workspace import WORKDIR_ENV, DATA_DIR_ENV  # noqa: E402
+from synthMedia import make_video, make_photo, parse_size  # noqa: E402
+from fakeOpenRouter import start_fake_server  # noqa: E402
+
+# -----------------------------
+# Config
+# -----------------------------
+RESULTS_DIR = os.path.join(BENCH_DIR, "results")
+DEFAULT_DURATIONS = "30,120"
+DEFAULT_SIZES = "640x360,1280x720,1920x1080"
+REGRESSION_THRESHOLD = 0.10  # --compare flags stages that got >10% slower
+
+# -----------------------------
+# Running one stage
+# -----------------------------
+def run_stage(cmd, env):
+    """
+    Run one pipeline step as the app does (child process, progress lines on
+    stdout) and return wall/CPU time, peak RSS and the spans/cache events it reported.
+    """
+    start = time.perf_counter()
+    proc = subprocess.Popen(cmd, cwd=BACKEND_DIR, env=env, stdout=subprocess.PIPE,
+                            text=True, encoding="utf-8", errors="replace", bufsize=1)
+    spans, caches = [], []
+    for line in proc.stdout:
+        parsed = progress.parse(line)
+        if parsed is None:
+            continue
+        event, data = parsed
+        if event == "span":
+            spans.append(data)
+        elif event == "cache":
+            caches.append(data)
+    proc.stdout.close()
+
+    cpu = peak_rss = None
+    if hasattr(os, "wait4"):
+        _, status, ru = os.wait4(proc.pid, 0)
+        proc.returncode = os.waitstatus_to_exitcode(status)
+        cpu = round(ru.ru_utime + ru.ru_stime, 3)
+        peak_rss = ru.ru_maxrss * (1 if sys.platform == "darwin" else 1024)
+    else:
+        proc.wait()
+    return {
+        "ok": proc.returncode == 0,
+        "wall": round(time.perf_counter() - start, 3),
+        "cpu": cpu,
+        "peak_rss": peak_rss,
+        "spans": spans,
+        "cache_hits": sum(1 for c in caches if c.get("hit")),
+        "cache_misses": sum(1 for c in caches if not c.get("hit")),
+    }
+
+
+def _outputs_dir(env):
+    """outputs/ of the throwaway data folder the benchmark runs in (see run_benchmarks)."""
+    return os.path.join(env[DATA_DIR_ENV], "outputs")
+
+
+def _latest_combined_summary(work):
+    files = glob.glob(os.path.join(work, "*_combined_summary.json"))
+    return max(files, key=os.path.getmtime) if files else None
+
+
+def ensure_transcript(duration, work):
+    """
+    Whisper may find no words in synthetic audio, and memeDetection refuses
+    an empty transcript. Fill in evenly spaced placeholder segments so the
+    downstream stages still run; the run is flagged in the results.
+    """
+    path = _latest_combined_summary(work)
+    if path is None:
+        return False
+    with open(path, "r", encoding="utf-8") as f:
+        combined = json.load(f)
+    verbal = combined.setdefault("verbal", {})
+    if verbal.get("data"):
+        return False
+    verbal["data"] = [{"id": i + 1, "start_time": float(t), "end_time": float(min(t + 4, duration)),
+                       "text": f"synthetic line {i + 1}"} for i, t in enumerate(range(0, duration, 5))]
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(combined, f, indent=4)
+    return True
+
+# -----------------------------
+# Benchmark configurations
+# -----------------------------
+def bench_video(duration, size, env, args, seed):
+    width, height = parse_size(size)
+    video = make_video(duration, width, height, seed=seed)
+    python = sys.executable
+
+    stages = {}
+    pipeline_cmd = [python, "processPipeline.py", "--input", video]
+    if args.no_visual:
+        pipeline_cmd.append("--no-visual")
+    stages["process_pipeline"] = run_stage(pipeline_cmd, env)
+    work = env.get(WORKDIR_ENV) or _outputs_dir(env)
+    synthetic_transcript = stages["process_pipeline"]["ok"] and ensure_transcript(duration, work)
+
+    stages["meme_detection"] = run_stage([python, "memeDetection.py"], env)
+    stages["frame_extractor"] = run_stage([python, "frameExtractor.py"], env)
+    render_cmd = [python, "memeOutput.py", "--task-id", f"bench-{duration}s-{size}"]
+    if args.profile:
+        render_cmd += ["--profile", args.profile]
+    stages["meme_output"] = run_stage(render_cmd, env)
+
+    return {"kind": "video", "duration": duration, "size": size, "seed": seed,
+            "synthetic_transcript": synthetic_transcript, "stages": stages}
+
+
+def bench_concurrent(duration, size, env, args, seed):
+    """
+    --concurrency N: N copies of the video pipeline at once, each in its own
+    workspace, like N jobs on one server. With the governor each job gets
+    cores/N threads for torch and ffmpeg; with --no-governor the libraries use
+    their defaults (every job sizes its pools to all cores). The "batch" stage
+    is the wall time until the last job finished.
+    """
+    jobs = args.concurrency
+    budget = max(1, cpuGovernor.total_cores() // jobs)
+    runs = [None] * jobs
+
+    def one(i):
+        job_env = dict(env, **{WORKDIR_ENV: os.path.join(_outputs_dir(env), "jobs", f"bench-{i}")})
+        if args.no_governor:
+            job_env[cpuGovernor.GOVERNOR_ENV] = "0"
+        else:
+            job_env[cpuGovernor.GOVERNOR_ENV] = "1"  # off by default in the app
+            job_env[cpuGovernor.BUDGET_ENV] = str(budget)
+        runs[i] = bench_video(duration, size, job_env, args, seed + i if args.cold else seed)
+
+    start = time.perf_counter()
+    threads = [threading.Thread(target=one, args=(i,)) for i in range(jobs)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    batch_wall = round(time.perf_counter() - start, 3)
+
+    stages = {}
+    for stage in runs[0]["stages"]:
+        per_job = [r["stages"][stage] for r in runs]
+        stages[stage] = {
+            "ok": all(s["ok"] for s in per_job),
+            "wall": max(s["wall"] for s in per_job),
+            "cpu": round(sum(s["cpu"] for s in per_job), 3) if per_job[0]["cpu"] is not None else None,
+            "peak_rss": max((s["peak_rss"] or 0) for s in per_job),
+        }
+    stages["batch"] = {"ok": all(s["ok"] for s in stages.values()), "wall": batch_wall,
+                       "cpu": sum(s["cpu"] or 0 for s in stages.values()), "peak_rss": None}
+    return {"kind": "video", "duration": duration, "size": size, "seed": seed, "jobs": jobs,
+            "threads_per_job": None if args.no_governor else budget,
+            "jobs_per_minute": round(jobs * 60 / batch_wall, 2) if batch_wall else None,
+            "stages": stages, "runs": runs}
+
+
+def bench_photo(size, env, seed):
+    width, height = parse_size(size)
+    photo = make_photo(width, height, seed=seed)
+    return {"kind": "photo", "size": size, "seed": seed,
+            "stages": {"generate_photo_memes": run_stage([sys.executable, "Photomeme.py", "--input", photo], env)}}
+
+
+def _summarize(repeats):
+    """Median wall/CPU per stage over repeated runs of one configuration."""
+    summary = {}
+    for stage in repeats[0]["stages"]:
+        runs = [r["stages"][stage] for r in repeats]
+        summary[stage] = {
+            "wall_median": round(statistics.median(r["wall"] for r in runs), 3),
+            "wall_min": min(r["wall"] for r in runs),
+            "cpu_median": round(statistics.median(r["cpu"] for r in runs), 3) if runs[0]["cpu"] is not None else None,
+            "peak_rss_max": max((r["peak_rss"] or 0) for r in runs),
+            "ok": all(r["ok"] for r in runs),
+        }
+    return summary
+
+
+def _git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=BACKEND_DIR,
+                              capture_output=True, text=True).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def _ffmpeg_version():
+    try:
+        return subprocess.run(["ffmpeg", "-version"], capture_output=True, text=True).stdout.splitlines()[0]
+    except (OSError, IndexError):
+        return None
+
+
+def run_benchmarks(args):
+    server, base_url = start_fake_server(latency=args.llm_latency)
+    # Memes, catalog rows, the media store and caches go to a throwaway folder,
+    # never into the real outputs/ and downloads/
+    data_dir = tempfile.mkdtemp(prefix="memegen-bench-")
+    env = dict(os.environ, **{progress.PROGRESS_ENV: "1", "PYTHONUNBUFFERED": "1",
+                              "OPENROUTER_BASE_URL": base_url, DATA_DIR_ENV: data_dir})
+    if args.profile:
+        env["MEME_RENDER_PROFILE"] = args.profile
+
+    configs = []
+    durations = [int(d) for d in args.durations.split(",") if d]
+    sizes = [s for s in args.sizes.split(",") if s]
+    try:
+        for size in sizes:
+            for duration in durations:
+                repeats = []
+                for _ in range(args.repeat):
+                    # --cold: new content every run so no content-hash cache can hit
+                    seed = random.randrange(1, 1_000_000) if args.cold else 0
+                    print(f"▶ video {duration}s {size} (seed {seed})")
+                    if args.concurrency > 1:
+                        repeats.append(bench_concurrent(duration, size, env, args, seed))
+                    else:
+                        repeats.append(bench_video(duration, size, env, args, seed))
+                configs.append({"kind": "video", "duration": duration, "size": size,
+                                "summary": _summarize(repeats), "runs": repeats})
+            if not args.no_photo:
+                repeats = []
+                for _ in range(args.repeat):
+                    seed = random.randrange(1, 1_000_000) if args.cold else 0
+                    print(f"▶ photo {size} (seed {seed})")
+                    repeats.append(bench_photo(size, env, seed))
+                configs.append({"kind": "photo", "size": size, "summary": _summarize(repeats), "runs": repeats})
+    finally:
+        server.shutdown()
+        shutil.rmtree(data_dir, ignore_errors=True)
+
+    return {
+        "meta": {
+            "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "commit": _git_commit(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "ffmpeg": _ffmpeg_version(),
+            "profile": args.profile,
+            "repeat": args.repeat,
+            "cold": args.cold,
+            "llm_latency": args.llm_latency,
+            "concurrency": args.concurrency,
+            "governor": not args.no_governor,
+            "cores": cpuGovernor.total_cores(),
+        },
+        "configs": configs,
+    }
+
+# -----------------------------
+# Comparing two result files
+# -----------------------------
+def _config_key(config):
+    return (config["kind"], config.get("duration"), config["size"])
+
+
+def compare(base_file, new_file, threshold=REGRESSION_THRESHOLD):
+    """Print per-stage median wall time changes; returns True if anything regressed."""
+    with open(base_file, "r", encoding="utf-8") as f:
+        base = {_config_key(c): c for c in json.load(f)["configs"]}
+    with open(new_file, "r", encoding="utf-8") as f:
+        new = {_config_key(c): c for c in json.load(f)["configs"]}
+
+    regressed = False
+    for key in sorted(set(base) & set(new), key=str):
+        for stage, after in new[key]["summary"].items():
+            before = base[key]["summary"].get(stage)
+            if not before or not before["wall_median"]:
+                continue
+            change = after["wall_median"] / before["wall_median"] - 1
+            flag = ""
+            if change > threshold:
+                flag, regressed = "  ⚠ slower", True
+            elif change < -threshold:
+                flag = "  ✅ faster"
+            kind, duration, size = key
+            label = f"{kind} {f'{duration}s ' if duration else ''}{size}"
+            print(f"{label:<22} {stage:<22} {before['wall_median']:>9.2f}s -> {after['wall_median']:>9.2f}s "
+                  f"({change:+.1%}){flag}")
+    return regressed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline pipeline benchmark on synthetic media with a stubbed LLM")
+    parser.add_argument("--durations", default=DEFAULT_DURATIONS, help="Comma separated video lengths in seconds")
+    parser.add_argument("--sizes", default=DEFAULT_SIZES, help="Comma separated WIDTHxHEIGHT list")
+    parser.add_argument("--repeat", type=int, default=1, help="Runs per configuration (medians are reported)")
+    parser.add_argument("--cold", action="store_true", help="Fresh synthetic content per run (no cache hits)")
+    parser.add_argument("--profile", default=None, help="Render profile passed to memeOutput.py")
+    parser.add_argument("--no-visual", action="store_true", help="Skip scene detection + BLIP captions")
+    parser.add_argument("--no-photo", action="store_true", help="Skip the photo meme benchmark")
+    parser.add_argument("--llm-latency", type=float, default=0.0, help="Simulated LLM response time in seconds")
+    parser.add_argument("--concurrency", type=int, default=1, help="Run N video jobs at once (throughput test)")
+    parser.add_argument("--no-governor", action="store_true",
+                        help="Leave torch/ffmpeg thread pools at their defaults (the app's default)")
+    parser.add_argument("--out", default=None, help="Result JSON path (default: bench/results/<time>_<commit>.json)")
+    parser.add_argument("--compare", nargs=2, metavar=("BASE", "NEW"), help="Compare two result files and exit")
+    args = parser.parse_args()
+
+    if args.compare:
+        sys.exit(1 if compare(*args.compare) else 0)
+
+    results = run_benchmarks(args)
+    out = args.out or os.path.join(
+        RESULTS_DIR, f"{time.strftime('%Y%m%d_%H%M%S')}_{results['meta']['commit'] or 'nogit'}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(out)), exist_ok=True)
+    with open(out, "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=2)
+
+    for config in results["configs"]:
+        label = f"{config['kind']} {config.get('duration', '')}{'s ' if config.get('duration') else ''}{config['size']}"
+        for stage, s in config["summary"].items():
+            print(f"{label:<22} {stage:<22} {s['wall_median']:>9.2f}s  {'' if s['ok'] else '❌ failed'}")
+    print(f"\n📄 Results written to {out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+# fakeOpenRouter.py
+import re
+import json
+import time
+import argparse
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# -----------------------------
+# Config
+# -----------------------------
+MAX_MOMENTS = 3
+PHOTO_CAPTION = "When the benchmark finally finishes"
+TRANSCRIPT_LINE_RE = re.compile(r"^\[([\d.]+) - ([\d.]+)\]\s*(.*)$", re.MULTILINE)
+
+# -----------------------------
+# Canned completions
+# -----------------------------
+def fake_completion(prompt):
+    """
+    Deterministic answer for the two prompts the app sends: meme moments for
+    a transcript (memeDetection) or a one-line caption (Photomeme).
+    """
+    if "Transcript:" not in prompt:
+        return PHOTO_CAPTION
+
+    transcript = prompt.split("Transcript:", 1)[1].split("Visual scenes", 1)[0]
+    lines = TRANSCRIPT_LINE_RE.findall(transcript)
+    step = max(1, len(lines) // MAX_MOMENTS)
+    moments = [{
+        "start": start,
+        "end": end,
+        "reason": "benchmark",
+        "suggested_caption": (text.strip() or "Benchmark moment")[:60],
+    } for start, end, text in lines[::step][:MAX_MOMENTS]]
+    return json.dumps(moments)
+
+
+class _Handler(BaseHTTPRequestHandler):
+    latency = 0.0
+
+    def do_POST(self):
+        if not self.path.rstrip("/").endswith("/chat/completions"):
+            self.send_error(404)
+            return
+        body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+        prompt = next((m["content"] for m in reversed(body.get("messages", [])) if m.get("role") == "user"), "")
+        time.sleep(self.latency)  # stand-in for model latency
+
+        content = fake_completion(prompt)
+        payload = json.dumps({
+            "id": "bench-completion",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": body.get("model", "fake"),
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": content},
+                         "finish_reason": "stop"}],
+            "usage": {"prompt_tokens": len(prompt) // 4, "completion_tokens": len(content) // 4,
+                      "total_tokens": (len(prompt) + len(content)) // 4},
+        }).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, *args):
+        pass  # keep benchmark output readable
+
+
+def start_fake_server(port=0, latency=0.0):
+    """
+    Serve OpenAI-compatible /v1/chat/completions in a background thread.
+    Returns (server, base_url); point OPENROUTER_BASE_URL at base_url.
+    """
+    handler = type("FakeOpenRouterHandler", (_Handler,), {"latency": latency})
+    server = ThreadingHTTPServer(("127.0.0.1", port), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}/v1"
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Local stand-in for the OpenRouter chat completions API")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", type=float, default=0.0, help="Seconds to wait before answering")
+    args = parser.parse_args()
+
+    server, base_url = start_fake_server(args.port, args.latency)
+    print(f"Fake OpenRouter listening: export OPENROUTER_BASE_URL={base_url}")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
@@ -0,0 +1,337 @@
+# loadTest.py
+import os
+import sys
+import json
+import time
+import random
+import shutil
+import tempfile
+import argparse
+import threading
+import functools
+import subprocess
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+
+import requests
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+BACKEND_DIR = os.path.dirname(BENCH_DIR)
+STUBS_DIR = os.path.join(BENCH_DIR, "stubs")
+RESULTS_DIR = os.path.join(BENCH_DIR, "results")
+
+from synthMedia import make_video, make_photo, MEDIA_DIR  # noqa: E402
+from fakeOpenRouter import start_fake_server  # noqa: E402
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+# -----------------------------
+# Config
+# -----------------------------
+DEFAULT_MIX = "video=2,youtube=1,photo=2"
+APP_START_TIMEOUT = 120
+SAMPLE_INTERVAL = 1.0
+
+# -----------------------------
+# Request log
+# -----------------------------
+class RequestLog:
+    def __init__(self):
+        self.started = time.perf_counter()
+        self._lock = threading.Lock()
+        self.entries = []  # (t, label, latency, status, error)
+        self.in_flight = 0
+
+    def call(self, session, label, method, url, **kwargs):
+        with self._lock:
+            self.in_flight += 1
+        t0 = time.perf_counter()
+        response, status, error = None, None, None
+        try:
+            response = session.request(method, url, timeout=60, **kwargs)
+            if kwargs.get("stream"):
+                for _ in response.iter_content(64 * 1024):
+                    pass
+            status = response.status_code
+            if status >= 400:
+                error = f"HTTP {status}"
+        except requests.RequestException as e:
+            error = type(e).__name__
+        latency = time.perf_counter() - t0
+        with self._lock:
+            self.in_flight -= 1
+            self.entries.append((t0 - self.started, label, latency, status, error))
+        return response if error is None else None
+
+
+def percentile(values, pct):
+    """Nearest-rank percentile of an already sorted list."""
+    if not values:
+        return None
+    rank = max(1, int(round(pct / 100 * len(values))))
+    return values[min(rank, len(values)) - 1]
+
+# -----------------------------
+# Local services
+# -----------------------------
+class _QuietHandler(SimpleHTTPRequestHandler):
+    def log_message(self, *args):
+        pass
+
+
+def start_media_server():
+    """Serves bench/media so "YouTube" uploads can be real yt-dlp downloads without the internet."""
+    handler = functools.partial(_QuietHandler, directory=MEDIA_DIR)
+    server = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}"
+
+
+def start_app(port, llm_base_url, data_dir):
+    """
+    app.py with whisper/transformers/torch replaced by bench/stubs and the fake LLM.
+    Its outputs/, downloads/ and catalog live under data_dir, so stub memes never
+    reach the real gallery and real interrupted jobs are not resumed.
+    """
+    env = dict(os.environ, MEMEGEN_PORT=str(port), OPENROUTER_BASE_URL=llm_base_url, PYTHONUNBUFFERED="1",
+               MEMEGEN_ALLOW_ANY_URL="1",  # "YouTube" links point at the local media server
+               MEMEGEN_DATA_DIR=data_dir)
+    env["PYTHONPATH"] = os.pathsep.join(p for p in (STUBS_DIR, env.get("PYTHONPATH")) if p)
+    log = open(os.path.join(RESULTS_DIR, "load_app.log"), "w", encoding="utf-8")
+    proc = subprocess.Popen([sys.executable, "app.py"], cwd=BACKEND_DIR, env=env,
+                            stdout=log, stderr=subprocess.STDOUT)
+    base_url = f"http://127.0.0.1:{port}"
+    deadline = time.monotonic() + APP_START_TIMEOUT
+    while time.monotonic() < deadline:
+        if proc.poll() is not None:
+            raise RuntimeError(f"app.py exited during startup, see {log.name}")
+        try:
+            requests.get(f"{base_url}/metrics", timeout=2)
+            return proc, base_url
+        except requests.RequestException:
+            time.sleep(0.5)
+    proc.terminate()
+    raise RuntimeError("app.py did not start in time")
+
+# -----------------------------
+# Process sampling (thread count over time)
+# -----------------------------
+def _proc_threads(pid):
+    with open(f"/proc/{pid}/status", "r") as f:
+        for line in f:
+            if line.startswith("Threads:"):
+                return int(line.split()[1])
+    return None
+
+
+def sample_process(pid, log, samples, stop):
+    proc = psutil.Process(pid) if psutil and pid else None
+    while not stop.wait(SAMPLE_INTERVAL):
+        sample = {"t": round(time.perf_counter() - log.started, 1), "client_in_flight": log.in_flight}
+        try:
+            if proc is not None:
+                sample["threads"] = proc.num_threads()
+                sample["rss"] = proc.memory_info().rss
+                sample["children"] = len(proc.children(recursive=True))
+            elif pid and os.path.exists(f"/proc/{pid}"):
+                sample["threads"] = _proc_threads(pid)
+        except Exception:
+            pass
+        samples.append(sample)
+
+# -----------------------------
+# Virtual users
+# -----------------------------
+def parse_mix(mix):
+    weights = {}
+    for part in mix.split(","):
+        name, _, weight = part.partition("=")
+        weights[name.strip()] = float(weight or 1)
+    unknown = set(weights) - {"video", "youtube", "photo"}
+    if unknown:
+        raise ValueError(f"Unknown upload kinds in --mix: {', '.join(sorted(unknown))}")
+    return weights
+
+
+def upload(session, log, base_url, kind, media):
+    if kind == "youtube":
+        response = log.call(session, "upload:youtube", "POST", f"{base_url}/upload",
+                            json={"youtubeLink": media["youtube_url"]})
+    else:
+        field, path = ("videoFile", media["video"]) if kind == "video" else ("photoFile", media["photo"])
+        with open(path, "rb") as f:
+            response = log.call(session, f"upload:{kind}", "POST", f"{base_url}/upload",
+                                files={field: (os.path.basename(path), f)})
+    if response is None:
+        return None
+    return response.json().get("task_id")
+
+
+def user_loop(base_url, log, args, media, weights, known_tasks, stop):
+    session = requests.Session()
+    kinds, kind_weights = list(weights), list(weights.values())
+    for _ in range(args.iterations):
+        if stop.is_set():
+            return
+        task_id = upload(session, log, base_url, random.choices(kinds, kind_weights)[0], media)
+        if not task_id:
+            continue
+        known_tasks.append(task_id)
+
+        memes, deadline = [], time.monotonic() + args.task_timeout
+        while time.monotonic() < deadline and not stop.is_set():
+            response = log.call(session, "status", "GET", f"{base_url}/status/{task_id}")
+            data = response.json() if response is not None else {}
+            if data.get("ready"):
+                memes = data.get("memes") or []
+                break
+            time.sleep(args.poll_interval)
+
+        for url in memes:
+            log.call(session, "media", "GET", url, stream=True)
+        log.call(session, "get_all_memes", "GET", f"{base_url}/get_all_memes")
+
+
+def reader_loop(base_url, log, args, known_tasks, stop):
+    """Result pages: poll /status of a random task and the gallery (with ETag revalidation)."""
+    session = requests.Session()
+    etag = None
+    while not stop.is_set():
+        if known_tasks:
+            log.call(session, "status", "GET", f"{base_url}/status/{random.choice(known_tasks)}")
+        headers = {"If-None-Match": etag} if etag else {}
+        response = log.call(session, "get_all_memes", "GET", f"{base_url}/get_all_memes", headers=headers)
+        if response is not None and response.headers.get("ETag"):
+            etag = response.headers["ETag"]
+        stop.wait(args.read_interval)
+
+# -----------------------------
+# Report
+# -----------------------------
+def summarize(log, samples, elapsed):
+    by_label = {}
+    for _, label, latency, _, error in log.entries:
+        by_label.setdefault(label, []).append((latency, error))
+
+    endpoints = {}
+    for label, calls in sorted(by_label.items()) + [("ALL", [(l, e) for _, _, l, _, e in log.entries])]:
+        latencies = sorted(l for l, _ in calls)
+        errors = sum(1 for _, e in calls if e)
+        endpoints[label] = {
+            "count": len(calls),
+            "errors": errors,
+            "error_rate": round(errors / len(calls), 4) if calls else 0,
+            "throughput_rps": round(len(calls) / elapsed, 2) if elapsed else None,
+            "p50_ms": round(percentile(latencies, 50) * 1000, 1) if latencies else None,
+            "p95_ms": round(percentile(latencies, 95) * 1000, 1) if latencies else None,
+            "p99_ms": round(percentile(latencies, 99) * 1000, 1) if latencies else None,
+            "max_ms": round(latencies[-1] * 1000, 1) if latencies else None,
+        }
+
+    per_second = {}
+    for t, _, _, _, error in log.entries:
+        bucket = per_second.setdefault(int(t), {"t": int(t), "requests": 0, "errors": 0})
+        bucket["requests"] += 1
+        bucket["errors"] += 1 if error else 0
+    return {"elapsed": round(elapsed, 2), "endpoints": endpoints,
+            "timeline": [per_second[k] for k in sorted(per_second)], "process_samples": samples}
+
+
+def print_report(report):
+    print(f"\n{'endpoint':<16}{'count':>8}{'err%':>8}{'rps':>8}{'p50ms':>9}{'p95ms':>9}{'p99ms':>9}")
+    for label, s in report["endpoints"].items():
+        print(f"{label:<16}{s['count']:>8}{s['error_rate'] * 100:>7.1f}%{s['throughput_rps'] or 0:>8.1f}"
+              f"{s['p50_ms'] or 0:>9.1f}{s['p95_ms'] or 0:>9.1f}{s['p99_ms'] or 0:>9.1f}")
+    threads = [s["threads"] for s in report["process_samples"] if s.get("threads")]
+    if threads:
+        print(f"\napp threads: start {threads[0]}, peak {max(threads)}, end {threads[-1]}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="HTTP load test of app.py with stubbed models and LLM")
+    parser.add_argument("--users", type=int, default=50, help="Concurrent uploaders")
+    parser.add_argument("--iterations", type=int, default=1, help="Upload cycles per uploader")
+    parser.add_argument("--readers", type=int, default=200, help="Concurrent result-page pollers")
+    parser.add_argument("--mix", default=DEFAULT_MIX, help="Upload mix, e.g. video=2,youtube=1,photo=2")
+    parser.add_argument("--poll-interval", type=float, default=2.0, help="Seconds between /status polls")
+    parser.add_argument("--read-interval", type=float, default=2.0, help="Seconds between reader requests")
+    parser.add_argument("--task-timeout", type=float, default=600, help="Give up polling a task after this")
+    parser.add_argument("--duration", type=float, default=900, help="Hard stop for the whole run (seconds)")
+    parser.add_argument("--video-seconds", type=int, default=20, help="Length of the synthetic upload video")
+    parser.add_argument("--video-size", default="640x360")
+    parser.add_argument("--port", type=int, default=5055, help="Port for the app started by this script")
+    parser.add_argument("--target", default=None,
+                        help="Base URL of an already running app instead of starting one (no thread sampling)")
+    parser.add_argument("--llm-latency", type=float, default=0.5, help="Simulated LLM response time")
+    parser.add_argument("--out", default=None, help="Result JSON path (default: bench/results/load_<time>.json)")
+    args = parser.parse_args()
+
+    os.makedirs(RESULTS_DIR, exist_ok=True)
+    weights = parse_mix(args.mix)
+    width, height = (int(v) for v in args.video_size.split("x"))
+    video = make_video(args.video_seconds, width, height)
+    media = {"video": video, "photo": make_photo(width, height)}
+
+    llm_server, llm_url = start_fake_server(latency=args.llm_latency)
+    media_server, media_url = start_media_server()
+    media["youtube_url"] = f"{media_url}/{os.path.basename(video)}"
+
+    app_proc, data_dir = None, None
+    if args.target:
+        base_url = args.target.rstrip("/")
+    else:
+        data_dir = tempfile.mkdtemp(prefix="memegen-load-")
+        try:
+            app_proc, base_url = start_app(args.port, llm_url, data_dir)
+        except RuntimeError:
+            shutil.rmtree(data_dir, ignore_errors=True)
+            raise
+
+    log, samples, known_tasks = RequestLog(), [], []
+    stop, sampler_stop = threading.Event(), threading.Event()
+    sampler = threading.Thread(target=sample_process, daemon=True,
+                               args=(app_proc.pid if app_proc else None, log, samples, sampler_stop))
+    sampler.start()
+
+    readers = [threading.Thread(target=reader_loop, args=(base_url, log, args, known_tasks, stop), daemon=True)
+               for _ in range(args.readers)]
+    users = [threading.Thread(target=user_loop, args=(base_url, log, args, media, weights, known_tasks, stop),
+                              daemon=True) for _ in range(args.users)]
+    print(f"🚀 {args.users} uploaders + {args.readers} readers against {base_url}")
+    for t in readers + users:
+        t.start()
+
+    deadline = time.monotonic() + args.duration
+    try:
+        for t in users:
+            t.join(max(0, deadline - time.monotonic()))
+    except KeyboardInterrupt:
+        pass
+    stop.set()
+    for t in readers:
+        t.join(5)
+    elapsed = time.perf_counter() - log.started
+    sampler_stop.set()
+    sampler.join()
+
+    if app_proc is not None:
+        app_proc.terminate()
+        app_proc.wait(10)
+    if data_dir:
+        shutil.rmtree(data_dir, ignore_errors=True)
+    llm_server.shutdown()
+    media_server.shutdown()
+
+    report = summarize(log, samples, elapsed)
+    report["config"] = {k: v for k, v in vars(args).items()}
+    out = args.out or os.path.join(RESULTS_DIR, f"load_{time.strftime('%Y%m%d_%H%M%S')}.json")
+    with open(out, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print_report(report)
+    print(f"\n📄 Results written to {out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,23 @@
+# Load-test stand-in for the few torch calls the app makes (device pick, no_grad, threads).
+import contextlib
+
+_threads = 1
+
+
+class cuda:
+    @staticmethod
+    def is_available():
+        return False
+
+
+def no_grad():
+    return contextlib.nullcontext()
+
+
+def set_num_threads(n):
+    global _threads
+    _threads = n
+
+
+def get_num_threads():
+    return _threads
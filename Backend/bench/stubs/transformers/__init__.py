@@ -0,0 +1,43 @@
+# Load-test stand-in for the BLIP classes from transformers: no weights, fixed captions.
+STUB_CAPTION = "a stub caption of a test pattern"
+
+
+class _Tensor:
+    def __init__(self, batch=1):
+        self.batch = batch
+
+    def to(self, *args, **kwargs):
+        return self
+
+
+class _Inputs(dict):
+    def to(self, *args, **kwargs):
+        return self
+
+
+class BlipProcessor:
+    @classmethod
+    def from_pretrained(cls, *args, **kwargs):
+        return cls()
+
+    def __call__(self, images=None, return_tensors=None, **kwargs):
+        count = len(images) if isinstance(images, (list, tuple)) else 1
+        return _Inputs(pixel_values=_Tensor(count))
+
+    def decode(self, ids, skip_special_tokens=True):
+        return STUB_CAPTION
+
+    def batch_decode(self, ids, skip_special_tokens=True):
+        return [STUB_CAPTION for _ in ids]
+
+
+class BlipForConditionalGeneration:
+    @classmethod
+    def from_pretrained(cls, *args, **kwargs):
+        return cls()
+
+    def to(self, *args, **kwargs):
+        return self
+
+    def generate(self, pixel_values=None, **kwargs):
+        return [[0] for _ in range(pixel_values.batch if pixel_values is not None else 1)]
@@ -0,0 +1,30 @@
+# Load-test stand-in for openai-whisper: instant, deterministic "transcripts".
+# Put bench/stubs first on PYTHONPATH (bench/loadTest.py does) to use it.
+import subprocess
+
+SEGMENT_SECONDS = 5.0
+
+
+def _duration(path):
+    try:
+        out = subprocess.run(["ffprobe", "-v", "error", "-show_entries", "format=duration",
+                              "-of", "csv=p=0", path], capture_output=True, text=True).stdout
+        return float(out.strip())
+    except (OSError, ValueError):
+        return 30.0
+
+
+class _Model:
+    def transcribe(self, path, fp16=False, **kwargs):
+        duration = _duration(path)
+        segments, start = [], 0.0
+        while start < duration:
+            end = min(start + SEGMENT_SECONDS - 1, duration)
+            segments.append({"id": len(segments), "start": start, "end": end,
+                             "text": f" stub line {len(segments) + 1}"})
+            start += SEGMENT_SECONDS
+        return {"text": "".join(s["text"] for s in segments), "segments": segments, "language": "en"}
+
+
+def load_model(name="base", *args, **kwargs):
+    return _Model()
@@ -0,0 +1,84 @@
+# synthMedia.py
+import os
+import argparse
+import subprocess
+
+# -----------------------------
+# Paths
+# -----------------------------
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+MEDIA_DIR = os.path.join(BENCH_DIR, "media")
+
+# -----------------------------
+# Config
+# -----------------------------
+SCENE_SECONDS = 6      # hue jump every N seconds so scene detection has cuts to find
+SAMPLE_RATE = 16000
+
+# -----------------------------
+# Generators (ffmpeg lavfi, no network or input files needed)
+# -----------------------------
+def speech_like_audio(seed=0):
+    """
+    aevalsrc expression that is roughly speech shaped: a gliding ~140 Hz voice
+    with a few harmonics, ~4 syllables/s and regular pauses between phrases.
+    `seed` shifts the pitch so cold-cache runs get different content hashes.
+    """
+    f0 = f"(140+{seed % 40}+30*sin(2*PI*0.7*t))"
+    voice = f"(sin(2*PI*{f0}*t)+0.5*sin(4*PI*{f0}*t)+0.25*sin(6*PI*{f0}*t))"
+    syllables = "pow(sin(PI*4*t),2)"
+    phrases = "gt(sin(2*PI*0.23*t)+0.6,0)"
+    return f"0.25*{voice}*{syllables}*{phrases}"
+
+
+def make_video(duration, width, height, fps=30, seed=0, out_dir=MEDIA_DIR):
+    """testsrc2 video with periodic scene cuts and speech-like audio; reused if already generated."""
+    os.makedirs(out_dir, exist_ok=True)
+    path = os.path.join(out_dir, f"synth_{duration}s_{width}x{height}_{fps}fps_s{seed}.mp4")
+    if os.path.exists(path):
+        return path
+
+    cmd = [
+        "ffmpeg", "-y", "-v", "error",
+        "-f", "lavfi", "-i", f"testsrc2=size={width}x{height}:rate={fps}:duration={duration}",
+        "-f", "lavfi", "-i", f"aevalsrc='{speech_like_audio(seed)}':s={SAMPLE_RATE}:d={duration}",
+        "-filter_complex", f"[0:v]hue=h='floor(t/{SCENE_SECONDS})*97+{seed}'[v]",
+        "-map", "[v]", "-map", "1:a",
+        "-c:v", "libx264", "-preset", "veryfast", "-crf", "23", "-pix_fmt", "yuv420p",
+        "-c:a", "aac", "-shortest", "-movflags", "+faststart",
+        path,
+    ]
+    subprocess.run(cmd, check=True)
+    return path
+
+
+def make_photo(width, height, seed=0, out_dir=MEDIA_DIR):
+    os.makedirs(out_dir, exist_ok=True)
+    path = os.path.join(out_dir, f"synth_{width}x{height}_s{seed}.jpg")
+    if os.path.exists(path):
+        return path
+    subprocess.run([
+        "ffmpeg", "-y", "-v", "error",
+        "-f", "lavfi", "-i", f"testsrc2=size={width}x{height}:rate=1,hue=h={seed % 360}",
+        "-frames:v", "1", "-q:v", "3", path,
+    ], check=True)
+    return path
+
+
+def parse_size(size):
+    """'1280x720' -> (1280, 720)"""
+    width, height = size.lower().split("x")
+    return int(width), int(height)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate synthetic benchmark media")
+    parser.add_argument("--duration", type=int, default=30, help="Video length in seconds")
+    parser.add_argument("--size", default="1280x720", help="WIDTHxHEIGHT")
+    parser.add_argument("--fps", type=int, default=30)
+    parser.add_argument("--seed", type=int, default=0, help="Vary content (and content hash)")
+    parser.add_argument("--photo", action="store_true", help="Generate a still photo instead")
+    args = parser.parse_args()
+
+    w, h = parse_size(args.size)
+    print(make_photo(w, h, args.seed) if args.photo else make_video(args.duration, w, h, args.fps, args.seed))
@@ -0,0 +1,60 @@
+# contentHash.py
+import os
+import json
+import hashlib
+
+# -----------------------------
+# Config
+# -----------------------------
+CHUNK_SIZE = 1024 * 1024  # 1 MiB reads keep memory flat for multi-GB files
+HASH_SUFFIX = ".sha256.json"
+
+# -----------------------------
+# Helpers
+# -----------------------------
+def sha256_stream(read, chunk_size=CHUNK_SIZE):
+    """Hash everything returned by read(chunk_size) until it returns b''."""
+    digest = hashlib.sha256()
+    for chunk in iter(lambda: read(chunk_size), b""):
+        digest.update(chunk)
+    return digest.hexdigest()
+
+
+def remember_sha256(path, digest):
+    """Record an already known digest (e.g. computed while streaming) in the sidecar."""
+    st = os.stat(path)
+    try:
+        with open(path + HASH_SUFFIX, "w", encoding="utf-8") as f:
+            json.dump({"source": {"size": st.st_size, "mtime_ns": st.st_mtime_ns}, "sha256": digest}, f)
+    except OSError:
+        pass
+
+
+def file_sha256(path):
+    """
+    SHA-256 of a file's content. The digest is cached in a sidecar next to
+    the file and reused while its size/mtime are unchanged, so large
+    downloads are only hashed once.
+    """
+    st = os.stat(path)
+    signature = {"size": st.st_size, "mtime_ns": st.st_mtime_ns}
+    sidecar = path + HASH_SUFFIX
+
+    if os.path.exists(sidecar):
+        try:
+            with open(sidecar, "r", encoding="utf-8") as f:
+                cached = json.load(f)
+            if cached.get("source") == signature:
+                return cached["sha256"]
+        except (OSError, ValueError, KeyError):
+            pass
+
+    with open(path, "rb") as f:
+        digest = sha256_stream(f.read)
+
+    try:
+        with open(sidecar, "w", encoding="utf-8") as f:
+            json.dump({"source": signature, "sha256": digest}, f)
+    except OSError:
+        pass  # read-only location: just don't cache
+    return digest
@@ -0,0 +1,155 @@
+# costModel.py
+import os
+import json
+import logging
+import threading
+import subprocess
+from rangeFetch import is_remote_source
+from workspace import OUTPUTS_DIR
+
+# -----------------------------
+# Config
+# -----------------------------
+MODEL_FILE = os.path.join(OUTPUTS_DIR, "cache", "cost_model.json")
+SMOOTHING = 0.2                  # weight of each finished job in the running per-stage rates
+DEFAULT_MEDIA = {"duration": 120.0, "width": 1280, "height": 720}  # when probing fails
+
+# Work units per stage: every stage cost is rate x units.
+#   per second of media:             downloading, transcribing (Whisper doesn't care about resolution)
+#   per second x megapixel:          analyzing (scene detection + BLIP over every frame)
+#   per megapixel:                   extracting/rendering (a handful of short clips at source size)
+#   flat:                            detecting (one LLM call), photo memes
+STAGES = {
+    "youtube": ["downloading", "transcribing", "analyzing", "detecting", "extracting", "rendering"],
+    "video": ["transcribing", "analyzing", "detecting", "extracting", "rendering"],
+    "photo": ["rendering"],
+}
+
+# Starting rates (wall seconds, CPU seconds per unit) until real jobs have been measured
+PRIOR_RATES = {
+    "youtube:downloading": (0.05, 0.02),
+    "transcribing": (0.3, 1.0),
+    "analyzing": (0.15, 0.5),
+    "detecting": (10.0, 0.5),
+    "extracting": (5.0, 10.0),
+    "rendering": (15.0, 30.0),
+    "photo:rendering": (8.0, 8.0),
+}
+
+# -----------------------------
+# Probing
+# -----------------------------
+def _ffprobe(path):
+    cmd = ["ffprobe", "-v", "error", "-select_streams", "v:0",
+           "-show_entries", "stream=width,height:format=duration", "-of", "json", path]
+    data = json.loads(subprocess.run(cmd, capture_output=True, text=True, check=True, timeout=30).stdout)
+    stream = (data.get("streams") or [{}])[0]
+    return {"duration": float(data.get("format", {}).get("duration") or 0),
+            "width": int(stream.get("width") or 0), "height": int(stream.get("height") or 0)}
+
+
+def _youtube_info(url):
+    import yt_dlp
+    with yt_dlp.YoutubeDL({"quiet": True, "noplaylist": True, "skip_download": True}) as ydl:
+        info = ydl.extract_info(url, download=False)
+    return {"duration": float(info.get("duration") or 0),
+            "width": int(info.get("width") or 0), "height": int(info.get("height") or 0)}
+
+
+def probe(input_path, input_type):
+    """Duration/resolution of a job's input (metadata only, nothing is decoded or downloaded)."""
+    try:
+        media = _youtube_info(input_path) if is_remote_source(input_path) else _ffprobe(input_path)
+        media["probed"] = True
+    except Exception as e:
+        logging.warning(f"Could not probe {input_path} ({e}), estimating with defaults")
+        media = dict(DEFAULT_MEDIA, probed=False)
+    for key in ("duration", "width", "height"):
+        media[key] = media.get(key) or DEFAULT_MEDIA[key]
+    if input_type == "photo":
+        media["duration"] = 0.0
+    return media
+
+# -----------------------------
+# Model
+# -----------------------------
+def _units(stage, media, input_type):
+    if input_type == "photo":
+        return 1.0
+    seconds = max(float(media["duration"]), 1.0)
+    megapixels = max(media["width"] * media["height"] / 1e6, 0.1)
+    if stage in ("downloading", "transcribing"):
+        return seconds
+    if stage == "analyzing":
+        return seconds * megapixels
+    if stage in ("extracting", "rendering"):
+        return megapixels
+    return 1.0
+
+
+def _key(input_type, stage):
+    return f"{input_type}:{stage}"
+
+
+class CostModel:
+    """
+    Per-stage (wall, cpu) rates per work unit, refined after every finished
+    job from its recorded stage spans and saved so calibration survives
+    restarts. estimate() turns probed media into expected wall and CPU seconds.
+    """
+
+    def __init__(self, path=MODEL_FILE):
+        self.path = path
+        self._lock = threading.Lock()
+        self.rates = {}
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                self.rates = {k: tuple(v) for k, v in json.load(f).get("rates", {}).items()}
+        except (OSError, ValueError):
+            pass
+
+    def _rate(self, input_type, stage):
+        key = _key(input_type, stage)
+        return self.rates.get(key) or PRIOR_RATES.get(key) or PRIOR_RATES.get(stage, (1.0, 1.0))
+
+    def estimate(self, media, input_type):
+        stages = {}
+        with self._lock:
+            for stage in STAGES.get(input_type, STAGES["video"]):
+                wall_rate, cpu_rate = self._rate(input_type, stage)
+                units = _units(stage, media, input_type)
+                stages[stage] = {"wall": round(wall_rate * units, 1), "cpu": round(cpu_rate * units, 1)}
+        return {"wall": round(sum(s["wall"] for s in stages.values()), 1),
+                "cpu": round(sum(s["cpu"] for s in stages.values()), 1),
+                "stages": stages}
+
+    def observe(self, media, input_type, spans):
+        """Fold a finished job's stage spans ({"stage", "duration", "cpu"}) into the rates."""
+        measured = {}
+        for span in spans:
+            stage = span.get("stage")
+            if stage not in STAGES.get(input_type, ()):
+                continue
+            wall, cpu = measured.get(stage, (0.0, 0.0))
+            duration = span.get("duration") or 0
+            measured[stage] = (wall + duration, cpu + (span.get("cpu") or duration))
+        if not measured:
+            return
+        with self._lock:
+            for stage, (wall, cpu) in measured.items():
+                units = _units(stage, media, input_type)
+                old_wall, old_cpu = self._rate(input_type, stage)
+                self.rates[_key(input_type, stage)] = (
+                    round((1 - SMOOTHING) * old_wall + SMOOTHING * wall / units, 6),
+                    round((1 - SMOOTHING) * old_cpu + SMOOTHING * cpu / units, 6),
+                )
+            self._save()
+
+    def _save(self):
+        try:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            with open(self.path + ".tmp", "w", encoding="utf-8") as f:
+                json.dump({"rates": self.rates}, f, indent=2)
+            os.replace(self.path + ".tmp", self.path)
+        except OSError as e:
+            logging.warning(f"Could not save cost model: {e}")
@@ -0,0 +1,160 @@
+# cpuGovernor.py
+import os
+import logging
+import threading
+
+# -----------------------------
+# Config
+# -----------------------------
+# Whisper/BLIP (torch) and every libx264 encode size their thread pools to all
+# cores by default, so N concurrent jobs run N x cores threads and spend their
+# time context switching. app.py splits the machine's cores between running
+# jobs instead, weighted by what each job is doing right now, and writes each
+# job's share to <job workspace>/cpu_budget. The pipeline steps re-read that
+# file whenever they start torch work or an ffmpeg encode, so budgets follow
+# jobs starting, finishing and changing stage.
+#
+# MEMEGEN_CPU_CORES:     cores to hand out (default: the cores this process may run on)
+# MEMEGEN_CPU_GOVERNOR:  1 = on; off by default (library defaults) until the
+#                        bench/benchPipeline.py --concurrency comparison shows it pays off
+# MEMEGEN_CPU_BUDGET:    set by app.py / the benchmark: a budget file, or a fixed thread count
+CORES_ENV = "MEMEGEN_CPU_CORES"
+GOVERNOR_ENV = "MEMEGEN_CPU_GOVERNOR"
+BUDGET_ENV = "MEMEGEN_CPU_BUDGET"
+BUDGET_FILE = "cpu_budget"
+
+
+def total_cores():
+    if os.environ.get(CORES_ENV):
+        return max(1, int(os.environ[CORES_ENV]))
+    if hasattr(os, "sched_getaffinity"):
+        return len(os.sched_getaffinity(0))
+    return os.cpu_count() or 1
+
+
+def enabled():
+    return os.environ.get(GOVERNOR_ENV, "0").lower() in ("1", "true", "yes", "on")
+
+
+# Relative CPU demand of each pipeline stage. Downloading and LLM detection
+# mostly wait on the network, so they keep one core and leave the rest to
+# jobs that are transcribing, captioning or encoding.
+STAGE_WEIGHTS = {
+    "queued": 0.0,
+    "downloading": 0.25,
+    "transcribing": 1.0,
+    "analyzing": 1.0,
+    "detecting": 0.1,
+    "extracting": 1.0,
+    "rendering": 1.0,
+}
+DEFAULT_WEIGHT = 1.0
+
+# -----------------------------
+# Allocation (app.py side)
+# -----------------------------
+def allocate(stages, cores=None):
+    """
+    Split `cores` between jobs. `stages` maps job -> current stage; returns
+    job -> thread count (at least 1 each, proportional to the stage weights).
+    """
+    cores = cores or total_cores()
+    weights = {job: STAGE_WEIGHTS.get(stage, DEFAULT_WEIGHT) for job, stage in stages.items()}
+    total = sum(weights.values())
+    if total <= 0:
+        return {job: cores for job in stages}
+    return {job: max(1, min(cores, int(cores * w / total))) for job, w in weights.items()}
+
+
+class Governor:
+    """
+    Tracks the running jobs of this server and rewrites their budget files
+    whenever one starts, finishes or moves to another stage.
+    """
+
+    def __init__(self, cores=None):
+        self.cores = cores or total_cores()
+        self._lock = threading.Lock()
+        self._jobs = {}  # job -> (budget file, stage)
+        self.budgets = {}
+
+    def start(self, job, workdir, stage="queued"):
+        """Register a job; returns the env entry that points its pipeline at the budget file."""
+        path = os.path.join(workdir, BUDGET_FILE)
+        with self._lock:
+            self._jobs[job] = (path, stage)
+            self._rebalance()
+        return {BUDGET_ENV: path} if enabled() else {}
+
+    def stage(self, job, stage):
+        with self._lock:
+            if job in self._jobs and self._jobs[job][1] != stage:
+                self._jobs[job] = (self._jobs[job][0], stage)
+                self._rebalance()
+
+    def finish(self, job):
+        with self._lock:
+            if self._jobs.pop(job, None):
+                self.budgets.pop(job, None)
+                self._rebalance()
+
+    def _rebalance(self):
+        if not enabled():
+            return
+        budgets = allocate({job: stage for job, (_, stage) in self._jobs.items()}, self.cores)
+        for job, threads in budgets.items():
+            if self.budgets.get(job) == threads:
+                continue
+            path = self._jobs[job][0]
+            try:
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                tmp = f"{path}.tmp"
+                with open(tmp, "w") as f:
+                    f.write(str(threads))
+                os.replace(tmp, path)
+            except OSError as e:
+                logging.warning(f"Could not write CPU budget for {job}: {e}")
+                continue
+            self.budgets[job] = threads
+
+# -----------------------------
+# Applying the budget (pipeline side)
+# -----------------------------
+def threads(budget=None):
+    """
+    Threads this process may use right now, or None to keep library defaults.
+    `budget` (a budget file or a thread count) overrides MEMEGEN_CPU_BUDGET,
+    for work that app.py runs in its own process.
+    """
+    if not enabled():
+        return None
+    value = str(budget) if budget else os.environ.get(BUDGET_ENV)
+    if not value:
+        return None
+    if value.isdigit():
+        return max(1, int(value))
+    try:
+        with open(value, "r") as f:
+            return max(1, int(f.read().strip()))
+    except (OSError, ValueError):
+        return None
+
+
+def ffmpeg_args(budget=None):
+    """`-threads N` for an ffmpeg command (as output/encoder option), [] when ungoverned."""
+    n = threads(budget)
+    return ["-threads", str(n)] if n else []
+
+
+_torch_threads = None
+
+
+def apply_torch():
+    """Resize torch's intra-op pool to the current budget (only when it changed)."""
+    global _torch_threads
+    n = threads()
+    if n is None or n == _torch_threads:
+        return
+    import torch
+    torch.set_num_threads(n)
+    _torch_threads = n
@@ -1,44 +1,297 @@
 #customCaptions
 import os
+import math
+import queue
+import logging
+import threading
 import subprocess
-from memeOutput import add_caption_to_image, add_caption_to_video
+import numpy as np
 import cv2
+from PIL import Image
+from memeOutput import add_caption_to_image, VideoCaptioner, create_run_dir
+from keyframeIndex import load_keyframe_index, seek_point
+from rangeFetch import is_remote_source, fetch_sections, section_for
+from renderSettings import get_profile, image_extension
+from cpuGovernor import ffmpeg_args, threads
+from workspace import OUTPUTS_DIR, DOWNLOADS_DIR
 
 # Paths
-DOWNLOADS_DIR = "downloads"
-OUTPUTS_DIR = "outputs"
-FRAMES_DIR = os.path.join(OUTPUTS_DIR, "custom_frames")
-CLIPS_DIR = os.path.join(OUTPUTS_DIR, "custom_clips")
-FINAL_DIR = os.path.join(OUTPUTS_DIR, "custom_memes")
 
-os.makedirs(FRAMES_DIR, exist_ok=True)
-os.makedirs(CLIPS_DIR, exist_ok=True)
-os.makedirs(FINAL_DIR, exist_ok=True)
+# -----------------------------
+# Config
+# -----------------------------
+# MEMEGEN_CUSTOM_MAX_ITEMS:     captions accepted in one batch request
+# MEMEGEN_CUSTOM_MAX_RENDERERS: items captioned + encoded at the same time (one ffmpeg each)
+DEFAULT_DURATION = 3.0   # seconds of clip per caption unless the item says otherwise
+MAX_DURATION = 30.0
+MAX_ITEMS = int(os.environ.get("MEMEGEN_CUSTOM_MAX_ITEMS", "20"))
+MAX_RENDERERS = max(1, int(os.environ.get("MEMEGEN_CUSTOM_MAX_RENDERERS", "4")))
+QUEUE_FRAMES = 48        # decoded frames buffered per renderer before the decoder waits
 
-# Helper: convert hh:mm:ss → seconds
+
+class CaptionCancelled(Exception):
+    """The batch was cancelled while rendering."""
+
+# -----------------------------
+# Items
+# -----------------------------
+# Helper: convert hh:mm:ss (or mm:ss, or plain seconds) → seconds
 def timestamp_to_seconds(ts):
-    h, m, s = map(int, ts.split(":"))
-    return h * 3600 + m * 60 + s
+    if isinstance(ts, (int, float)):
+        return float(ts)
+    seconds = 0.0
+    for part in str(ts).strip().split(":"):
+        seconds = seconds * 60 + float(part)
+    return seconds
+
+
+def parse_items(items, max_items=MAX_ITEMS):
+    """
+    Validate [{"timestamp", "caption", "duration"?}, ...] from a request.
+    Returns [{"index", "start", "duration", "caption"}] in request order
+    (index is 1-based and names the outputs); raises ValueError.
+    """
+    if not isinstance(items, list) or not items:
+        raise ValueError("items must be a non-empty list of {timestamp, caption, duration?}")
+    if len(items) > max_items:
+        raise ValueError(f"At most {max_items} captions per request")
+
+    parsed = []
+    for i, item in enumerate(items, start=1):
+        if not isinstance(item, dict):
+            raise ValueError(f"Item {i} must be an object")
+        caption = str(item.get("caption") or "").strip()
+        if not caption:
+            raise ValueError(f"Item {i} has no caption")
+        try:
+            start = timestamp_to_seconds(item.get("timestamp", ""))
+            duration = float(item.get("duration") or DEFAULT_DURATION)
+        except (TypeError, ValueError):
+            raise ValueError(f"Item {i}: timestamp must be hh:mm:ss, mm:ss or seconds and duration a number")
+        if not (math.isfinite(start) and math.isfinite(duration)) or start < 0 or not 0 < duration <= MAX_DURATION:
+            raise ValueError(f"Item {i}: timestamp must be >= 0 and duration between 0 and {MAX_DURATION:.0f}s")
+        parsed.append({"index": i, "start": start, "duration": duration, "caption": caption})
+    return parsed
+
+# -----------------------------
+# Planning
+# -----------------------------
+def plan_sources(video_path, items, work, profile):
+    """
+    (video_file, start within that file) per item. Remote jobs (two-phase
+    ingest, no full download) fetch just the sections around the items.
+    """
+    if not is_remote_source(video_path):
+        return [(video_path, item["start"]) for item in items]
+    spans = [(item["start"], item["start"] + item["duration"]) for item in items]
+    manifest = fetch_sections(video_path, spans, os.path.join(work, "custom_sections"),
+                              max_height=profile["max_height"])
+    sources = []
+    for start, end in spans:
+        section = section_for(manifest, start, end)
+        sources.append((section["path"], start - section["start"]) if section else (None, start))
+    return sources
+
+
+def plan_runs(jobs, max_active=MAX_RENDERERS):
+    """
+    Group items into decode runs: one ffmpeg decode per run, starting at the
+    keyframe before its first item. Items are taken in timestamp order and a
+    new run only starts where the next item's keyframe lies past everything
+    decoded so far, i.e. where seeking beats decoding through the gap.
+    Overlapping items share the same decoded frames, at most `max_active` at
+    a time; an item that would overlap more starts another run.
+    `jobs` is [(item, video_file, start)]; returns [{"video", "seek", "end", "jobs"}].
+    """
+    runs = []
+    for item, video_file, start in sorted(jobs, key=lambda j: (j[1], j[2])):
+        try:
+            seek = seek_point(load_keyframe_index(video_file), start)
+        except (OSError, subprocess.CalledProcessError, ValueError):
+            seek = start  # no index: ffmpeg seeks (and trims) by itself
+        end = start + item["duration"]
+        run = runs[-1] if runs else None
+        overlapping = sum(1 for i, s in run["jobs"] if s + i["duration"] > start) if run else 0
+        if run and run["video"] == video_file and seek <= run["end"] and overlapping < max_active:
+            run["end"] = max(run["end"], end)
+            run["jobs"].append((item, start))
+        else:
+            runs.append({"video": video_file, "seek": seek, "end": end, "jobs": [(item, start)]})
+    return runs
+
+
+def _render_size(width, height, max_height):
+    """Source size bounded like renderSettings.scale_args (shorter side <= max_height), even dimensions."""
+    if max_height and min(width, height) > max_height:
+        scale = max_height / min(width, height)
+        width, height = width * scale, height * scale
+    return max(2, int(round(width / 2)) * 2), max(2, int(round(height / 2)) * 2)
+
+
+def _video_format(video_file, profile):
+    cap = cv2.VideoCapture(video_file)
+    if not cap.isOpened():
+        raise RuntimeError(f"Could not open video: {video_file}")
+    src_fps = cap.get(cv2.CAP_PROP_FPS) or 25
+    width, height = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)), int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+    cap.release()
+    fps = min(src_fps, profile["max_fps"]) if profile.get("max_fps") else src_fps
+    return _render_size(width, height, profile.get("max_height")), fps
+
+# -----------------------------
+# Rendering
+# -----------------------------
+class _ItemRenderer(threading.Thread):
+    """Captions one item's frames and encodes them on its own thread (and ffmpeg process)."""
+
+    def __init__(self, item, video_file, start, size, fps, run_dir, profile, task_id, budget=None):
+        super().__init__(name=f"custom-caption-{item['index']}", daemon=True)
+        self.frames = queue.Queue(maxsize=QUEUE_FRAMES)
+        self.item, self.task_id = item, task_id
+        self.image_path = os.path.join(run_dir, f"custom_meme_{item['index']}{image_extension()}")
+        self.video_path = os.path.join(run_dir, f"custom_meme_{item['index']}.mp4")
+        self.outputs = []
+        self.error = None
+        audio = ["-ss", f"{start:.3f}", "-t", f"{item['duration']:.3f}", "-i", video_file]
+        self.captioner = VideoCaptioner(self.video_path, audio, item["caption"], size[0], size[1], fps, profile,
+                                        expected_frames=int(item["duration"] * fps), budget=budget)
 
-# Extract clip + frame at timestamp
-def extract_custom_clip(video_path, timestamp, index):
-    start_sec = timestamp_to_seconds(timestamp)
-    frame_path = os.path.join(FRAMES_DIR, f"custom_{index}.jpg")
-    clip_path = os.path.join(CLIPS_DIR, f"custom_{index}.mp4")
+    def run(self):
+        still = None
+        while True:
+            frame = self.frames.get()
+            if frame is None:
+                break
+            if self.error:
+                continue  # keep taking frames so the decoder never blocks on us
+            try:
+                if still is None:
+                    still = Image.fromarray(cv2.cvtColor(frame, cv2.COLOR_BGR2RGB))
+                self.captioner.write(frame)
+            except Exception as e:
+                self.error = e
+        try:
+            if self.captioner.finish(self.task_id):
+                self.outputs.append(self.video_path)
+            if still is not None:
+                add_caption_to_image(still, self.item["caption"], self.image_path, self.task_id)
+                self.outputs.insert(0, self.image_path)
+        except Exception as e:
+            self.error = self.error or e
 
-    # Extract frame
-    subprocess.run([
-        "ffmpeg", "-y", "-ss", str(start_sec), "-i", video_path,
-        "-frames:v", "1", frame_path
-    ])
+    def close(self):
+        self.frames.put(None)
 
-    # Extract 3s clip
-    subprocess.run([
-        "ffmpeg", "-y", "-ss", str(start_sec), "-t", "3", "-i", video_path,
-        "-c", "copy", clip_path
-    ])
 
-    return frame_path, clip_path
+def _decode_run(run, size, fps, run_dir, profile, task_id, renderers, cancelled=None, budget=None):
+    """
+    Decode the run once (keyframe seek, scaled to the profile, constant fps)
+    and fan each frame out to the renderers of the items it falls in.
+    Renderers are appended to `renderers` when their item's window starts
+    and closed when it ends. The batch's CPU `budget` is split between the
+    encoders that can run at once.
+    """
+    n = threads(budget)
+    per_renderer = max(1, n // min(MAX_RENDERERS, len(run["jobs"]))) if n else None
+    width, height = size
+    frame_bytes = width * height * 3
+    cmd = [
+        "ffmpeg", "-v", "error", "-ss", repr(run["seek"]), "-i", run["video"],
+        "-t", f"{run['end'] - run['seek']:.6f}",
+        "-vf", f"scale={width}:{height}", "-r", str(fps),
+        "-f", "rawvideo", "-pix_fmt", "bgr24", *ffmpeg_args(budget), "pipe:1",
+    ]
+    decoder = subprocess.Popen(cmd, stdout=subprocess.PIPE)
+
+    pending = list(run["jobs"])  # (item, start), already in start order
+    active = []                  # (renderer, end)
+    k = 0
+    try:
+        while True:
+            if cancelled and cancelled():
+                raise CaptionCancelled()
+            buf = decoder.stdout.read(frame_bytes)
+            if len(buf) < frame_bytes:
+                break
+            t = run["seek"] + (k + 0.5) / fps  # middle of frame k
+            k += 1
+
+            for renderer, end in list(active):  # close first, so at most MAX_RENDERERS are open
+                if t >= end:
+                    renderer.close()
+                    active.remove((renderer, end))
+            while pending and pending[0][1] <= t:
+                item, start = pending.pop(0)
+                renderer = _ItemRenderer(item, run["video"], start, size, fps, run_dir, profile, task_id,
+                                         budget=per_renderer)
+                renderer.start()
+                renderers.append(renderer)
+                active.append((renderer, start + item["duration"]))
+
+            if active:
+                frame = np.frombuffer(buf, np.uint8).reshape(height, width, 3)
+                for renderer, _ in active:
+                    renderer.frames.put(frame.copy())  # captions are drawn in place
+    finally:
+        decoder.stdout.close()
+        if decoder.poll() is None:
+            decoder.kill()
+        decoder.wait()
+        for renderer, _ in active:
+            renderer.close()
+    if pending:
+        print(f"⚠ {len(pending)} caption(s) start after the end of {run['video']}, skipping")
+
+
+def render_custom_memes(video_path, items, task_id=None, profile=None, work=None, cancelled=None, budget=None):
+    """
+    Render a captioned still + clip for every parsed item (see parse_items)
+    of video_path (local file or remote URL) into a new run folder.
+    The items are cut in timestamp order from as few decodes of the source as
+    possible (see plan_runs); each item is captioned and encoded on its own
+    thread while the decode continues, at most MAX_RENDERERS at a time.
+    `budget` is the batch's CPU budget (see cpuGovernor.threads).
+    `cancelled()` is polled per frame.
+    Returns the output paths, stills first, in item order.
+    """
+    profile = profile or get_profile()
+    work = work or os.path.join(OUTPUTS_DIR, "custom_work")
+    os.makedirs(work, exist_ok=True)
+
+    sources = plan_sources(video_path, items, work, profile)
+    jobs = []
+    for item, (video_file, start) in zip(items, sources):
+        if video_file is None:
+            print(f"⚠ No source section for caption {item['index']}, skipping")
+            continue
+        jobs.append((item, video_file, start))
+
+    run_dir = create_run_dir()
+    renderers, formats = [], {}
+    try:
+        for run in plan_runs(jobs):
+            if run["video"] not in formats:
+                formats[run["video"]] = _video_format(run["video"], profile)
+            size, fps = formats[run["video"]]
+            started = len(renderers)
+            _decode_run(run, size, fps, run_dir, profile, task_id, renderers, cancelled, budget)
+            for renderer in renderers[started:]:  # this run's encoders finish before the next run's start
+                renderer.join()
+    finally:
+        for renderer in renderers:  # outputs are recorded before we return (or the caller discards them)
+            renderer.join()
+
+    errors = [r.error for r in renderers if r.error]
+    for error in errors:
+        logging.warning(f"Custom caption failed: {error}")
+    if errors and not any(r.outputs for r in renderers):
+        raise errors[0]
+
+    renderers.sort(key=lambda r: r.item["index"])
+    outputs = [path for r in renderers for path in r.outputs]
+    stills = [p for p in outputs if not p.endswith(".mp4")]
+    return stills + [p for p in outputs if p.endswith(".mp4")]
+
 
 def main():
     # Find the latest video in downloads/
@@ -49,26 +302,19 @@ def main():
     video_file = max([os.path.join(DOWNLOADS_DIR, v) for v in videos], key=os.path.getmtime)
     print(f"[INFO] Using video: {video_file}")
 
-    index = 1
+    # Collect every caption first, then render them all in one pass
+    items = []
     while True:
         ts = input("\n⏱ Enter timestamp (hh:mm:ss) or 'q' to quit: ").strip()
         if ts.lower() == "q":
             break
         caption = input("💬 Enter custom caption: ").strip()
+        items.append({"timestamp": ts, "caption": caption})
 
-        frame_path, clip_path = extract_custom_clip(video_file, ts, index)
-
-        # Apply caption
-        if os.path.exists(frame_path):
-            output_img = os.path.join(FINAL_DIR, f"custom_meme_{index}.jpg")
-            add_caption_to_image(frame_path, caption, output_img)
-
-        if os.path.exists(clip_path):
-            output_vid = os.path.join(FINAL_DIR, f"custom_meme_{index}.mp4")
-            add_caption_to_video(clip_path, caption, output_vid)
-
-        print(f"✅ Custom meme created for {ts}")
-        index += 1
+    if not items:
+        return
+    outputs = render_custom_memes(video_file, parse_items(items, max_items=len(items)))
+    print(f"✅ {len(outputs)} custom memes created in {os.path.dirname(outputs[0]) if outputs else '-'}")
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -1,11 +1,19 @@
 #frameExtractor.py
 import os
+import io
 import glob
 import json
 import subprocess
+from PIL import Image
+from keyframeIndex import ffmpeg_seek_args
+from rangeFetch import is_remote_source, fetch_sections, section_for
+from renderSettings import get_profile, scale_args, INTERMEDIATE_CRF, INTERMEDIATE_PRESET
+import progress
+from workspace import work_dir, DOWNLOADS_DIR
+from cpuGovernor import ffmpeg_args
+from animatedMeme import write_clip_source
 
-DOWNLOADS_DIR = "downloads"
-OUTPUT_DIR = "outputs"
+OUTPUT_DIR = work_dir()  # job workspace when run by app.py
 MEME_FILE = os.path.join(OUTPUT_DIR, "meme_moments.json")
 FRAMES_DIR = os.path.join(OUTPUT_DIR, "frames")
 CLIPS_DIR = os.path.join(OUTPUT_DIR, "clips")
@@ -14,53 +22,147 @@ os.makedirs(FRAMES_DIR, exist_ok=True)
 os.makedirs(CLIPS_DIR, exist_ok=True)
 
 # --- Step 1: Find latest combined summary to determine video ---
-summary_files = glob.glob(os.path.join(OUTPUT_DIR, "*_combined_summary.json"))
-summary_files += glob.glob(os.path.join(OUTPUT_DIR, ".*_combined_summary.json"))
+def load_latest_summary():
+    summary_files = glob.glob(os.path.join(OUTPUT_DIR, "*_combined_summary.json"))
+    summary_files += glob.glob(os.path.join(OUTPUT_DIR, ".*_combined_summary.json"))
 
-if not summary_files:
-    raise FileNotFoundError("❌ No combined summary JSON found in outputs/")
+    if not summary_files:
+        raise FileNotFoundError("❌ No combined summary JSON found in outputs/")
 
-latest_summary = max(summary_files, key=os.path.getmtime)
-base_name = os.path.basename(latest_summary).replace("_combined_summary.json", "")
+    latest_summary = max(summary_files, key=os.path.getmtime)
+    base_name = os.path.basename(latest_summary).replace("_combined_summary.json", "")
+    with open(latest_summary, "r", encoding="utf-8") as f:
+        summary = json.load(f)
+    return summary if isinstance(summary, dict) else {}, base_name
 
 # Step 2: Pick the corresponding video
-possible_videos = glob.glob(os.path.join(DOWNLOADS_DIR, f"{base_name}*.mp4"))
-if not possible_videos:
-    raise FileNotFoundError(f"❌ No matching video found for {base_name} in downloads/")
+def find_source_video(summary=None, base_name=None):
+    if summary is None:
+        summary, base_name = load_latest_summary()
 
-VIDEO_FILE = max(possible_videos, key=os.path.getmtime)  # latest modified matching video
-print(f"[INFO] Using video: {VIDEO_FILE}")
+    video_file = summary.get("video")
+    if not video_file or not os.path.exists(video_file):
+        # Older summaries don't record the video: match by base name
+        possible_videos = glob.glob(os.path.join(DOWNLOADS_DIR, f"{base_name}*.mp4"))
+        if not possible_videos:
+            raise FileNotFoundError(f"❌ No matching video found for {base_name} in downloads/")
+        video_file = max(possible_videos, key=os.path.getmtime)  # latest modified matching video
+
+    print(f"[INFO] Using video: {video_file}")
+    return video_file
+
+
+def plan_sources(meme_moments, profile=None):
+    """
+    Where to read each meme moment from: [(video_file, seek_seconds), ...].
+    Remote inputs processed audio-only (two-phase ingest) have no full video,
+    so only the sections around the moments are fetched now, at no more than
+    the render profile's resolution.
+    """
+    profile = profile or get_profile()
+    summary, base_name = load_latest_summary()
+    source_url = summary.get("input", "")
+    has_video = summary.get("video") and os.path.exists(summary["video"])
+
+    if has_video or not is_remote_source(source_url):
+        video_file = find_source_video(summary, base_name)
+        return [(video_file, float(m["start"])) for m in meme_moments]
+
+    spans = [(float(m["start"]), float(m["start"]) + _clip_duration(m)) for m in meme_moments]
+    manifest = fetch_sections(source_url, spans, os.path.join(OUTPUT_DIR, f"{base_name}_sections"),
+                              max_height=profile["max_height"],
+                              prior_bytes=sum((summary.get("ingest_bytes") or {}).values()))
+    sources = []
+    for start, end in spans:
+        section = section_for(manifest, start, end)
+        sources.append((section["path"], start - section["start"]) if section else (None, start))
+    return sources
 
 # --- Step 3: Load meme moments ---
-with open(MEME_FILE, "r", encoding="utf-8") as f:
-    meme_moments = json.load(f)
+def load_meme_moments(meme_file=MEME_FILE):
+    with open(meme_file, "r", encoding="utf-8") as f:
+        return json.load(f)
 
 # --- Step 4: Extract frames and clips ---
-for i, moment in enumerate(meme_moments):
-    start = float(moment["start"])
-    end = float(moment["end"])
-    duration = max(1, end - start)  # at least 1 sec
+def extract_frame(video_file, start, frame_path=None, profile=None):
+    """
+    Decode the frame at `start` straight into memory (lossless PPM over a pipe),
+    already downscaled to the render profile.
+    The frame is only written to disk when frame_path is given.
+    """
+    result = subprocess.run([
+        "ffmpeg", "-y", "-v", "error", *ffmpeg_seek_args(video_file, start),
+        *scale_args(profile or get_profile()), "-frames:v", "1", "-f", "image2pipe", "-c:v", "ppm", "pipe:1"
+    ], stdout=subprocess.PIPE)
+    if result.returncode != 0 or not result.stdout:
+        return None
+
+    frame = Image.open(io.BytesIO(result.stdout))
+    frame.load()
+    if frame_path:
+        frame.save(frame_path)
+    return frame
 
-    # Extract frame
-    frame_path = os.path.join(FRAMES_DIR, f"meme_{i+1}.jpg")
-    subprocess.run([
-        "ffmpeg", "-y", "-ss", str(start), "-i", VIDEO_FILE,
-        "-frames:v", "1", frame_path
-    ])
 
-    # Extract short clip with proper re-encoding
-    clip_path = os.path.join(CLIPS_DIR, f"meme_{i+1}.mp4")
+def extract_clip(video_file, start, duration, clip_path, profile=None):
+    # Extract short clip, scaled/fps-capped to the render profile while decoding.
+    # The renderer re-encodes it with the profile's CRF, so this pass is quick and near-lossless.
     subprocess.run([
-        "ffmpeg", "-y", 
-        "-ss", str(start),
+        "ffmpeg", "-y",
+        *ffmpeg_seek_args(video_file, start),  # keyframe seek + in-GOP trim
         "-t", str(duration),
-        "-i", VIDEO_FILE,
+        *scale_args(profile or get_profile()),
         "-c:v", "libx264",  # Re-encode video
         "-c:a", "aac",      # Re-encode audio
-        "-preset", "fast",  # Fast encoding
+        "-preset", INTERMEDIATE_PRESET, "-crf", str(INTERMEDIATE_CRF),
         "-movflags", "+faststart",  # Enable fast web playback
+        *ffmpeg_args(),     # this job's share of the cores
         clip_path
     ])
+    if not os.path.exists(clip_path):
+        return None
+    write_clip_source(clip_path, video_file, start, duration)  # GIF palette cache key
+    progress.add_bytes(bytes_out=os.path.getsize(clip_path))
+    return clip_path
+
+
+def _clip_duration(moment):
+    return max(1, float(moment["end"]) - float(moment["start"]))  # at least 1 sec
+
+
+def extract_moments(sources, meme_moments, keep_frames=True, profile=None):
+    """
+    Extract a still frame and a clip for every meme moment.
+    `sources` is plan_sources() output (or a single video path for all moments).
+    Returns [{"index": i, "frame": PIL.Image | None, "clip": path | None}, ...];
+    frames are written to FRAMES_DIR only when keep_frames is set.
+    `profile` is a renderSettings profile (default: MEME_RENDER_PROFILE).
+    """
+    profile = profile or get_profile()
+    if isinstance(sources, str):
+        sources = [(sources, float(m["start"])) for m in meme_moments]
+    progress.stage("extracting")
+
+    extracted = []
+    for i, (moment, (video_file, start)) in enumerate(zip(meme_moments, sources), start=1):
+        if video_file is None:
+            print(f"⚠ No source section for meme {i}, skipping")
+            extracted.append({"index": i, "frame": None, "clip": None})
+            continue
+        duration = _clip_duration(moment)
+
+        frame_path = os.path.join(FRAMES_DIR, f"meme_{i}.jpg") if keep_frames else None
+        frame = extract_frame(video_file, start, frame_path, profile)
+
+        clip_path = extract_clip(video_file, start, duration, os.path.join(CLIPS_DIR, f"meme_{i}.mp4"), profile)
+
+        print(f"✅ Extracted frame {frame_path or '(in memory)'} and clip {clip_path}")
+        progress.emit("extracted", index=i, total=len(meme_moments))
+        extracted.append({"index": i, "frame": frame, "clip": clip_path})
+    return extracted
 
-    print(f"✅ Extracted frame {frame_path} and clip {clip_path}")
 
+if __name__ == "__main__":
+    # Standalone run: frames are written to outputs/frames for memeOutput.py
+    moments = load_meme_moments()
+    extract_moments(plan_sources(moments), moments, keep_frames=True)
@@ -0,0 +1,133 @@
+# jobProfiler.py
+import os
+import sys
+import time
+import runpy
+import argparse
+import threading
+import subprocess
+from collections import Counter
+import progress
+
+# -----------------------------
+# Config
+# -----------------------------
+# MEMEGEN_PROFILE_RATE: fraction of jobs profiled without being asked (0 = only on request)
+# MEMEGEN_PROFILE_INTERVAL: seconds between stack samples
+PROFILE_RATE = float(os.environ.get("MEMEGEN_PROFILE_RATE", "0"))
+SAMPLE_INTERVAL = float(os.environ.get("MEMEGEN_PROFILE_INTERVAL", "0.01"))
+PROFILE_DIR_ENV = "MEMEGEN_PROFILE_DIR"  # set per job by app.py; pipeline steps write <dir>/<step>.folded
+FOLDED_EXT = ".folded"
+
+# -----------------------------
+# Wall-clock sampler
+# -----------------------------
+def _frame_label(frame):
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+def _child_program(frame):
+    """If this frame is inside subprocess waiting on a child, the child's program name."""
+    if not frame.f_code.co_filename.endswith("subprocess.py"):
+        return None
+    proc = frame.f_locals.get("self")
+    if not isinstance(proc, subprocess.Popen):
+        return None
+    args = proc.args
+    argv0 = args.split()[0] if isinstance(args, str) else str(args[0])
+    return os.path.basename(argv0)
+
+
+class WallSampler:
+    """
+    Samples the Python stacks of every thread (or just `thread_ids`) at a
+    fixed interval, whether they are running or blocked. Time spent waiting
+    on child processes shows up as an `[exec ffmpeg]`-style leaf, so ffmpeg
+    and yt-dlp wall time lands in the same flame graph as the Python code.
+    Stacks are rooted at `root` and the current pipeline stage.
+    """
+
+    def __init__(self, root="job", interval=SAMPLE_INTERVAL, thread_ids=None):
+        self.root = root
+        self.interval = interval
+        self.thread_ids = thread_ids
+        self.stacks = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="wall-sampler", daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+        return self
+
+    def _run(self):
+        me = threading.get_ident()
+        names = {}
+        while not self._stop.wait(self.interval):
+            if len(names) != threading.active_count():
+                names = {t.ident: t.name for t in threading.enumerate()}
+            stage = progress.current_stage()
+            for ident, frame in sys._current_frames().items():
+                if ident == me or (self.thread_ids is not None and ident not in self.thread_ids):
+                    continue
+                labels, child = [], None
+                while frame is not None:
+                    labels.append(_frame_label(frame))
+                    child = child or _child_program(frame)
+                    frame = frame.f_back
+                labels.reverse()
+                if child:
+                    labels.append(f"[exec {child}]")
+                prefix = [self.root] + ([f"stage:{stage}"] if stage else []) + [names.get(ident, str(ident))]
+                self.stacks[";".join(prefix + labels)] += 1
+
+    def write(self, path):
+        """Brendan Gregg's folded format: `frame;frame;frame count`, one stack per line."""
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with open(path, "w", encoding="utf-8") as f:
+            for stack, count in self.stacks.most_common():
+                f.write(f"{stack} {count}\n")
+        return path
+
+
+def merge_folded(paths):
+    """Combine several .folded files (one per pipeline step) into one profile text."""
+    stacks = Counter()
+    for path in paths:
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                stack, _, count = line.rstrip("\n").rpartition(" ")
+                if stack and count.isdigit():
+                    stacks[stack] += int(count)
+    return "".join(f"{stack} {count}\n" for stack, count in stacks.most_common())
+
+# -----------------------------
+# Run a pipeline script under the sampler
+# -----------------------------
+def run_script(script, script_args, out_path, interval=SAMPLE_INTERVAL):
+    sys.argv = [script] + script_args
+    sys.path.insert(0, os.path.dirname(os.path.abspath(script)))
+    sampler = WallSampler(root=os.path.splitext(os.path.basename(script))[0], interval=interval).start()
+    started = time.perf_counter()
+    try:
+        runpy.run_path(script, run_name="__main__")
+    finally:
+        progress.end_span()  # so the last stage is attributed before the sampler stops
+        sampler.stop().write(out_path)
+        print(f"[profile] {sum(sampler.stacks.values())} samples over "
+              f"{time.perf_counter() - started:.1f}s written to {out_path}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run a pipeline script under the wall-clock sampling profiler")
+    parser.add_argument("--out", required=True, help="Folded-stack output file")
+    parser.add_argument("--interval", type=float, default=SAMPLE_INTERVAL, help="Seconds between samples")
+    parser.add_argument("script", help="Python script to run, e.g. memeOutput.py")
+    parser.add_argument("script_args", nargs=argparse.REMAINDER, help="Arguments for the script")
+    args = parser.parse_args()
+    run_script(args.script, args.script_args, args.out, args.interval)
@@ -0,0 +1,110 @@
+# jobScheduler.py
+import os
+import time
+import logging
+import threading
+
+# -----------------------------
+# Config
+# -----------------------------
+# MEMEGEN_WORKERS: jobs that run at once (the CPU governor splits the cores between them)
+# MEMEGEN_AGING:   seconds of estimated cost forgiven per second spent waiting, so a
+#                  long job overtakes newer short ones after a while instead of starving
+# MEMEGEN_MAX_JOB_CPU: reject jobs estimated above this many CPU-seconds (0 = no limit)
+WORKERS = int(os.environ.get("MEMEGEN_WORKERS", "2"))
+AGING = float(os.environ.get("MEMEGEN_AGING", "1.0"))
+MAX_JOB_CPU = float(os.environ.get("MEMEGEN_MAX_JOB_CPU", str(4 * 3600)))
+
+
+class JobTooLarge(Exception):
+    """The job's estimated CPU time is above MEMEGEN_MAX_JOB_CPU."""
+
+    def __init__(self, estimate, limit=MAX_JOB_CPU):
+        super().__init__(f"Estimated {estimate['cpu']:.0f} CPU-seconds, the limit is {limit:.0f}. "
+                         f"Try a shorter or lower resolution video.")
+        self.estimate = estimate
+        self.limit = limit
+
+
+class _Job:
+    def __init__(self, job_id, cost, run):
+        self.id = job_id
+        self.cost = cost          # estimated wall seconds
+        self.run = run
+        self.submitted = time.time()
+        self.started = None
+
+    def score(self, now):
+        """Shortest job first, with the estimate shrinking the longer the job has waited."""
+        return self.cost - AGING * (now - self.submitted)
+
+
+class Scheduler:
+    """
+    Fixed pool of worker threads taking the queued job with the lowest aged
+    cost estimate. The queue is short, so picking is a scan rather than a heap
+    (scores change as jobs wait).
+    """
+
+    def __init__(self, workers=WORKERS):
+        self.workers = max(1, workers)
+        self._cond = threading.Condition()
+        self._queued = {}    # job_id -> _Job
+        self._running = {}   # job_id -> _Job
+        for i in range(self.workers):
+            threading.Thread(target=self._work, name=f"job-worker-{i + 1}", daemon=True).start()
+
+    def submit(self, job_id, cost, run):
+        with self._cond:
+            self._queued[job_id] = _Job(job_id, cost, run)
+            self._cond.notify()
+
+    def remove(self, job_id):
+        """Take a job out of the queue before it starts; returns its callable (None if not queued)."""
+        with self._cond:
+            job = self._queued.pop(job_id, None)
+        return job.run if job else None
+
+    def _order(self, now):
+        return sorted(self._queued.values(), key=lambda j: (j.score(now), j.submitted))
+
+    def _work(self):
+        while True:
+            with self._cond:
+                while not self._queued:
+                    self._cond.wait()
+                job = self._order(time.time())[0]
+                del self._queued[job.id]
+                job.started = time.time()
+                self._running[job.id] = job
+            try:
+                job.run()
+            except Exception as e:
+                logging.error(f"Job {job.id} crashed: {e}")
+            finally:
+                with self._cond:
+                    self._running.pop(job.id, None)
+
+    def eta(self, job_id):
+        """
+        (queue position, estimated seconds until done) for a queued or running
+        job, or (None, None). Work ahead of a queued job is the remaining time
+        of the running jobs plus every job that would be picked before it,
+        shared between the workers.
+        """
+        now = time.time()
+        with self._cond:
+            if job_id in self._running:
+                job = self._running[job_id]
+                return 0, round(max(0.0, job.cost - (now - job.started)), 1)
+            if job_id not in self._queued:
+                return None, None
+            order = self._order(now)
+            position = next(i for i, j in enumerate(order) if j.id == job_id)
+            ahead = sum(max(0.0, j.cost - (now - j.started)) for j in self._running.values())
+            ahead += sum(j.cost for j in order[:position])
+            return position + 1, round(ahead / self.workers + order[position].cost, 1)
+
+    def stats(self):
+        with self._cond:
+            return {"workers": self.workers, "queued": len(self._queued), "running": len(self._running)}
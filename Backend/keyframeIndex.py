@@ -0,0 +1,193 @@
+# keyframeIndex.py
+import os
+import json
+import bisect
+import logging
+import subprocess
+import progress
+
+# -----------------------------
+# Logging
+# -----------------------------
+logging.basicConfig(level=logging.INFO, format="%(levelname)s: %(message)s")
+
+# -----------------------------
+# Config
+# -----------------------------
+INDEX_SUFFIX = ".keyframes.json"
+INDEX_VERSION = 1
+
+# In-process cache so repeated seeks in one run don't re-read the JSON
+_index_cache = {}
+
+# -----------------------------
+# Helpers
+# -----------------------------
+def index_path_for(video_path):
+    """Keyframe index lives next to the download: downloads/foo.mp4 -> downloads/foo.keyframes.json"""
+    return os.path.splitext(video_path)[0] + INDEX_SUFFIX
+
+
+def _source_signature(video_path):
+    st = os.stat(video_path)
+    return {"size": st.st_size, "mtime_ns": st.st_mtime_ns}
+
+
+def _probe_stream_info(video_path):
+    cmd = [
+        "ffprobe", "-v", "error", "-select_streams", "v:0",
+        "-show_entries", "stream=avg_frame_rate,r_frame_rate,start_time,duration,nb_frames",
+        "-of", "json", video_path
+    ]
+    result = subprocess.run(cmd, capture_output=True, text=True, check=True)
+    streams = json.loads(result.stdout).get("streams") or [{}]
+    stream = streams[0]
+
+    fps = 0.0
+    for key in ("avg_frame_rate", "r_frame_rate"):
+        num, _, den = str(stream.get(key, "0/0")).partition("/")
+        try:
+            fps = float(num) / float(den or 1)
+        except (ValueError, ZeroDivisionError):
+            fps = 0.0
+        if fps > 0:
+            break
+
+    def _float(value, default=0.0):
+        try:
+            return float(value)
+        except (TypeError, ValueError):
+            return default
+
+    return {
+        "fps": fps or 25.0,
+        "start_time": _float(stream.get("start_time")),
+        "duration": _float(stream.get("duration")),
+    }
+
+
+def _probe_keyframes(video_path, start_time=0.0):
+    """
+    Read the packet list of the first video stream (demux only, no decoding)
+    and keep the timestamps of packets flagged as keyframes.
+    """
+    cmd = [
+        "ffprobe", "-v", "error", "-select_streams", "v:0",
+        "-show_entries", "packet=pts_time,flags",
+        "-of", "csv=p=0", video_path
+    ]
+    result = subprocess.run(cmd, capture_output=True, text=True, check=True)
+
+    keyframes = []
+    for line in result.stdout.splitlines():
+        parts = line.strip().split(",")
+        if len(parts) < 2 or "K" not in parts[1]:
+            continue
+        try:
+            keyframes.append(round(float(parts[0]) - start_time, 6))
+        except ValueError:
+            continue  # pts_time can be N/A
+
+    keyframes = sorted(set(keyframes))
+    if not keyframes or keyframes[0] > 0:
+        keyframes.insert(0, 0.0)
+    return keyframes
+
+# -----------------------------
+# Build / load index
+# -----------------------------
+def build_keyframe_index(video_path):
+    info = _probe_stream_info(video_path)
+    keyframes = _probe_keyframes(video_path, info["start_time"])
+    index = {
+        "version": INDEX_VERSION,
+        "video": os.path.basename(video_path),
+        "source": _source_signature(video_path),
+        "fps": info["fps"],
+        "duration": info["duration"],
+        "keyframes": keyframes,
+    }
+    with open(index_path_for(video_path), "w", encoding="utf-8") as f:
+        json.dump(index, f)
+    logging.info(f"Built keyframe index for {video_path}: {len(keyframes)} keyframes")
+    return index
+
+
+def load_keyframe_index(video_path):
+    """
+    Return the keyframe index for a video, building it with ffprobe on first use.
+    The cached file is reused as long as the source size/mtime are unchanged.
+    """
+    signature = _source_signature(video_path)
+    cached = _index_cache.get(video_path)
+    if cached and cached["source"] == signature:
+        return cached
+
+    index = None
+    path = index_path_for(video_path)
+    if os.path.exists(path):
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                index = json.load(f)
+        except (OSError, json.JSONDecodeError):
+            index = None
+        if index and (index.get("version") != INDEX_VERSION or index.get("source") != signature):
+            index = None
+
+    progress.cache("keyframes", index is not None)
+    if index is None:
+        index = build_keyframe_index(video_path)
+
+    _index_cache[video_path] = index
+    return index
+
+# -----------------------------
+# Seeking
+# -----------------------------
+def seek_point(index, t):
+    """Latest keyframe time at or before t (seconds from the start of the video)."""
+    keyframes = index["keyframes"]
+    i = bisect.bisect_right(keyframes, t + 1e-6) - 1
+    return keyframes[i] if i >= 0 else 0.0
+
+
+def keyframe_frame_number(index, frame_number):
+    """Frame number of the latest keyframe at or before frame_number."""
+    fps = index["fps"]
+    return int(round(seek_point(index, frame_number / fps) * fps))
+
+
+def ffmpeg_seek_args(video_path, t):
+    """
+    ffmpeg args that open video_path positioned exactly at t.
+
+    The input-side -ss jumps straight to the nearest prior keyframe, and the
+    output-side -ss discards only the frames of that GOP up to t, so ffmpeg
+    never decodes more than one GOP to reach the requested timestamp.
+    """
+    t = max(0.0, float(t))
+    try:
+        kf = seek_point(load_keyframe_index(video_path), t)
+    except (OSError, subprocess.CalledProcessError, ValueError) as e:
+        logging.warning(f"Keyframe index unavailable for {video_path} ({e}); using plain seek")
+        return ["-ss", str(t), "-i", video_path]
+
+    args = ["-ss", repr(kf), "-i", video_path]
+    if t - kf > 1e-6:
+        args += ["-ss", f"{t - kf:.6f}"]
+    return args
+
+# -----------------------------
+# CLI for testing
+# -----------------------------
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description="Build or inspect the keyframe index of a video")
+    parser.add_argument("--input", type=str, required=True, help="Local video file path")
+    parser.add_argument("--at", type=float, default=None, help="Optional: print the seek point for this timestamp")
+    args = parser.parse_args()
+
+    idx = load_keyframe_index(args.input)
+    logging.info(f"{len(idx['keyframes'])} keyframes, fps={idx['fps']:.3f}, duration={idx['duration']:.2f}s")
+    if args.at is not None:
+        logging.info(f"Seek for {args.at}s -> keyframe {seek_point(idx, args.at)}s")
@@ -0,0 +1,103 @@
+# mediaDelivery.py
+import os
+import mimetypes
+from flask import make_response, send_file, abort
+from werkzeug.security import safe_join
+from retention import touch
+
+# -----------------------------
+# Config
+# -----------------------------
+# MEDIA_OFFLOAD=nginx    -> X-Accel-Redirect to MEDIA_ACCEL_PREFIX/<path> (nginx "internal" location)
+# MEDIA_OFFLOAD=sendfile -> X-Sendfile with the absolute path (Apache mod_xsendfile, lighttpd)
+# unset                  -> Flask streams the file itself
+MEDIA_OFFLOAD = os.environ.get("MEDIA_OFFLOAD", "").lower()
+MEDIA_ACCEL_PREFIX = os.environ.get("MEDIA_ACCEL_PREFIX", "/protected-media").rstrip("/")
+
+IMMUTABLE_MAX_AGE = 365 * 24 * 3600   # content-hashed URLs never change
+MUTABLE_CACHE_CONTROL = "no-cache"     # legacy /outputs URLs: revalidate with ETag
+URL_HASH_LENGTH = 16
+
+# -----------------------------
+# Helpers
+# -----------------------------
+def media_path(rel_path, digest=None):
+    """
+    Public URL path for an output. With a content digest the URL is immutable
+    (/media/<hash>/<path>); without one it's the legacy /outputs/<path>.
+    """
+    if digest:
+        return f"/media/{digest[:URL_HASH_LENGTH]}/{rel_path}"
+    return f"/outputs/{rel_path}"
+
+
+def _offloaded(rel_path, full_path, etag, cache_control):
+    response = make_response("")
+    if MEDIA_OFFLOAD == "nginx":
+        response.headers["X-Accel-Redirect"] = f"{MEDIA_ACCEL_PREFIX}/{rel_path}"
+    else:
+        response.headers["X-Sendfile"] = full_path
+    response.headers["Content-Type"] = mimetypes.guess_type(full_path)[0] or "application/octet-stream"
+    response.headers["Cache-Control"] = cache_control
+    if etag:
+        response.set_etag(etag)
+    return response
+
+
+def send_media(root, rel_path, digest=None):
+    """
+    Serve root/rel_path with caching headers and byte-range support.
+
+    Range/If-Range/If-None-Match are handled by send_file(conditional=True),
+    so MP4 seeking gets 206 Partial Content instead of a full re-download.
+    With MEDIA_OFFLOAD set, only headers are produced and the front proxy
+    sends the bytes.
+    """
+    full_path = safe_join(root, rel_path)
+    if full_path is None or not os.path.isfile(full_path):
+        abort(404)
+    touch(full_path)  # served outputs stay warm for the retention LRU
+
+    if digest:
+        etag = digest[:URL_HASH_LENGTH]
+        cache_control = f"public, max-age={IMMUTABLE_MAX_AGE}, immutable"
+    else:
+        etag = None  # send_file derives one from mtime/size
+        cache_control = MUTABLE_CACHE_CONTROL
+
+    if MEDIA_OFFLOAD in ("nginx", "sendfile"):
+        return _offloaded(rel_path, full_path, etag, cache_control)
+
+    response = send_file(full_path, conditional=True, etag=etag or True,
+                         max_age=IMMUTABLE_MAX_AGE if digest else None)
+    response.headers["Cache-Control"] = cache_control
+    response.headers["Accept-Ranges"] = "bytes"
+    return response
+
+# -----------------------------
+# Range check (for deployment smoke tests)
+# -----------------------------
+def verify_range_support(url, length=1024):
+    """
+    Fetch the first `length` bytes of url with a Range request and check the
+    server answers 206 with a matching Content-Range. Returns (ok, details).
+    """
+    import urllib.request
+    req = urllib.request.Request(url, headers={"Range": f"bytes=0-{length - 1}"})
+    with urllib.request.urlopen(req, timeout=10) as resp:
+        body = resp.read()
+        content_range = resp.headers.get("Content-Range", "")
+        ok = resp.status == 206 and content_range.startswith(f"bytes 0-{length - 1}/") and len(body) == length
+        return ok, {"status": resp.status, "content_range": content_range, "bytes": len(body),
+                    "cache_control": resp.headers.get("Cache-Control"), "etag": resp.headers.get("ETag")}
+
+
+if __name__ == "__main__":
+    import argparse
+    import json
+    parser = argparse.ArgumentParser(description="Check that a media URL supports byte-range requests")
+    parser.add_argument("--url", required=True, help="e.g. http://127.0.0.1:5000/media/<hash>/final_outputs/run_x/final_meme_1.mp4")
+    args = parser.parse_args()
+    ok, details = verify_range_support(args.url)
+    print(json.dumps(details, indent=2))
+    print("✅ Range requests supported" if ok else "❌ Range requests NOT supported")
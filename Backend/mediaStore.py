@@ -0,0 +1,150 @@
+# mediaStore.py
+import os
+import uuid
+import shutil
+import hashlib
+import logging
+from contentHash import CHUNK_SIZE, file_sha256, remember_sha256
+from retention import touch
+from workspace import DOWNLOADS_DIR
+
+# -----------------------------
+# Logging
+# -----------------------------
+logging.basicConfig(level=logging.INFO, format="%(levelname)s: %(message)s")
+
+# -----------------------------
+# Folders
+# -----------------------------
+# Content-addressed store: downloads/store/<sha[:2]>/<sha><ext>
+DOWNLOAD_FOLDER = DOWNLOADS_DIR
+STORE_DIR = os.path.join(DOWNLOAD_FOLDER, "store")
+SPOOL_DIR = os.path.join(STORE_DIR, "tmp")
+os.makedirs(SPOOL_DIR, exist_ok=True)
+
+# -----------------------------
+# Helpers
+# -----------------------------
+def _extension(filename):
+    ext = os.path.splitext(filename or "")[1].lower()
+    return ext if ext.isascii() and ext[1:].isalnum() else ""
+
+
+def stored_path(digest, filename):
+    return os.path.abspath(os.path.join(STORE_DIR, digest[:2], f"{digest}{_extension(filename)}"))
+
+
+def find_stored(digest):
+    """Path of already stored content with this sha256, or None."""
+    folder = os.path.join(STORE_DIR, digest[:2])
+    if len(digest) == 64 and os.path.isdir(folder):
+        for name in os.listdir(folder):
+            if name.split(".", 1)[0] == digest and not name.endswith(".json"):
+                path = os.path.abspath(os.path.join(folder, name))
+                touch(path)
+                return path
+    return None
+
+
+def is_stored(path):
+    store = os.path.abspath(STORE_DIR) + os.sep
+    return os.path.abspath(path).startswith(store)
+
+
+def commit_file(tmp_path, digest, filename):
+    """Move a fully written temp file into the store; drop it if the content is already there."""
+    final_path = stored_path(digest, filename)
+    if os.path.exists(final_path):
+        os.remove(tmp_path)
+        logging.info(f"Duplicate content {digest[:12]}..., reusing {final_path}")
+        return final_path, digest, True
+
+    os.makedirs(os.path.dirname(final_path), exist_ok=True)
+    os.replace(tmp_path, final_path)
+    remember_sha256(final_path, digest)
+    logging.info(f"Stored new content {digest[:12]}... at {final_path}")
+    return final_path, digest, False
+
+# -----------------------------
+# Streaming ingest
+# -----------------------------
+class HashingSpool:
+    """
+    Writable temp file that hashes everything written to it. Used as the
+    Werkzeug stream factory so multipart uploads go straight from the socket
+    to disk (in the parser's chunk size) without a second copy.
+    """
+
+    def __init__(self, spool_dir=SPOOL_DIR):
+        self.path = os.path.join(spool_dir, f"{uuid.uuid4().hex}.part")
+        self._file = open(self.path, "w+b")
+        self._hash = hashlib.sha256()
+        self.committed = False
+
+    def write(self, data):
+        self._hash.update(data)
+        return self._file.write(data)
+
+    def hexdigest(self):
+        return self._hash.hexdigest()
+
+    def __getattr__(self, name):
+        # read/seek/tell/flush/close etc. come from the underlying file. Only
+        # reached for missing attributes: without the guard a spool whose
+        # open() failed would recurse looking up _file
+        if name.startswith("_"):
+            raise AttributeError(name)
+        return getattr(self._file, name)
+
+    def commit(self, filename):
+        """Close the spool and file it in the store. Returns (path, sha256, was_duplicate)."""
+        self._file.close()
+        self.committed = True
+        return commit_file(self.path, self.hexdigest(), filename)
+
+    def discard(self):
+        """Drop the spool file unless it was committed (safe to call more than once)."""
+        self._file.close()
+        if not self.committed and os.path.exists(self.path):
+            os.remove(self.path)
+
+
+def ingest_stream(stream, filename, chunk_size=CHUNK_SIZE):
+    """Copy a readable stream into the store in chunks, hashing on the way."""
+    spool = HashingSpool()
+    try:
+        for chunk in iter(lambda: stream.read(chunk_size), b""):
+            spool.write(chunk)
+    except Exception:
+        spool.discard()
+        raise
+    return spool.commit(filename)
+
+
+def ingest_upload(file_storage):
+    """Store a Werkzeug FileStorage, reusing its spool when it was written by HashingSpool."""
+    if isinstance(file_storage.stream, HashingSpool):
+        return file_storage.stream.commit(file_storage.filename)
+    return ingest_stream(file_storage.stream, file_storage.filename)
+
+
+def ingest_file(path):
+    """
+    Put an existing local file into the store without copying its bytes:
+    a hardlink when the store is on the same filesystem, a copy otherwise.
+    """
+    if is_stored(path):
+        return os.path.abspath(path), file_sha256(path), True
+
+    digest = file_sha256(path)
+    final_path = stored_path(digest, path)
+    if os.path.exists(final_path):
+        return final_path, digest, True
+
+    os.makedirs(os.path.dirname(final_path), exist_ok=True)
+    try:
+        os.link(path, final_path)
+    except OSError:
+        shutil.copyfile(path, final_path)
+    remember_sha256(final_path, digest)
+    return final_path, digest, False
@@ -0,0 +1,241 @@
+# memeCatalog.py
+import os
+import time
+import sqlite3
+import logging
+import threading
+import progress
+from contentHash import sha256_stream
+from workspace import OUTPUTS_DIR
+
+# -----------------------------
+# Logging
+# -----------------------------
+logging.basicConfig(level=logging.INFO, format="%(levelname)s: %(message)s")
+
+# -----------------------------
+# Paths
+# -----------------------------
+CATALOG_DB = os.path.join(OUTPUTS_DIR, "catalog.sqlite3")
+os.makedirs(OUTPUTS_DIR, exist_ok=True)
+
+IMAGE_EXTS = ('.png', '.jpg', '.jpeg', '.gif', '.webp')
+VIDEO_EXTS = ('.mp4', '.webm')
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS memes (
+    id        INTEGER PRIMARY KEY AUTOINCREMENT,
+    path      TEXT UNIQUE NOT NULL,   -- relative to outputs/
+    type      TEXT NOT NULL,          -- image | video
+    width     INTEGER,
+    height    INTEGER,
+    duration  REAL,
+    size      INTEGER,
+    task_id   TEXT,
+    created   REAL NOT NULL,
+    sha256    TEXT,                   -- content hash, used for immutable media URLs
+    thumbnail TEXT,                   -- small WebP, relative to outputs/
+    poster    TEXT                    -- video poster frame (WebP), relative to outputs/
+);
+CREATE INDEX IF NOT EXISTS idx_memes_task ON memes(task_id);
+"""
+
+# -----------------------------
+# Helpers
+# -----------------------------
+def media_type(path):
+    ext = os.path.splitext(path)[1].lower()
+    if ext in IMAGE_EXTS:
+        return "image"
+    if ext in VIDEO_EXTS:
+        return "video"
+    return None
+
+
+def _connect():
+    conn = sqlite3.connect(CATALOG_DB, timeout=30, check_same_thread=False)
+    conn.row_factory = sqlite3.Row
+    conn.execute("PRAGMA journal_mode=WAL")  # renderers write while the web app reads
+    conn.executescript(SCHEMA)
+    # Columns added after the first release; older catalogs gain them on open
+    columns = {row[1] for row in conn.execute("PRAGMA table_info(memes)")}
+    for column in ("sha256", "thumbnail", "poster"):
+        if column not in columns:
+            conn.execute(f"ALTER TABLE memes ADD COLUMN {column} TEXT")
+    return conn
+
+
+def _probe_media(path, kind):
+    """Best-effort (width, height, duration) for files recorded without metadata."""
+    try:
+        if kind == "image":
+            from PIL import Image
+            with Image.open(path) as img:
+                return img.width, img.height, None
+        import cv2
+        cap = cv2.VideoCapture(path)
+        try:
+            fps = cap.get(cv2.CAP_PROP_FPS) or 0
+            frames = cap.get(cv2.CAP_PROP_FRAME_COUNT) or 0
+            return (int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)), int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT)),
+                    round(frames / fps, 3) if fps else None)
+        finally:
+            cap.release()
+    except Exception:
+        return None, None, None
+
+# -----------------------------
+# Writers (called by renderers, any process)
+# -----------------------------
+def _rel(path):
+    return os.path.relpath(os.path.abspath(path), OUTPUTS_DIR).replace(os.sep, "/") if path else None
+
+
+def record_output(path, task_id=None, width=None, height=None, duration=None, created=None,
+                  thumbnail=None, poster=None):
+    """Add (or refresh) a rendered meme (plus its thumbnail/poster derivatives) in the catalog."""
+    kind = media_type(path)
+    if kind is None or not os.path.exists(path):
+        return
+    if width is None or height is None:
+        width, height, probed_duration = _probe_media(path, kind)
+        duration = duration if duration is not None else probed_duration
+
+    rel_path = _rel(path)
+    with open(path, "rb") as f:
+        digest = sha256_stream(f.read)
+    row = (rel_path, kind, width, height, duration, os.path.getsize(path), task_id,
+           created if created is not None else time.time(), digest, _rel(thumbnail), _rel(poster))
+    try:
+        conn = _connect()
+        with conn:
+            # REPLACE gives a re-rendered file a new id so it sorts as newest
+            conn.execute("INSERT OR REPLACE INTO memes "
+                         "(path, type, width, height, duration, size, task_id, created, sha256, thumbnail, poster) "
+                         "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", row)
+        conn.close()
+    except sqlite3.Error as e:
+        logging.warning(f"Could not record {rel_path} in meme catalog: {e}")
+        return
+    progress.add_bytes(bytes_out=row[5])
+    progress.emit("meme", path=rel_path, type=kind, task_id=task_id, sha256=digest)
+
+
+def task_outputs(task_id):
+    """Absolute paths of every output recorded for a task."""
+    conn = _connect()
+    rows = conn.execute("SELECT path FROM memes WHERE task_id = ?", (task_id,)).fetchall()
+    conn.close()
+    return [os.path.join(OUTPUTS_DIR, r[0]) for r in rows]
+
+
+def remove_output(rel_path):
+    conn = _connect()
+    with conn:
+        conn.execute("DELETE FROM memes WHERE path = ?", (rel_path,))
+    conn.close()
+
+
+def backfill(outputs_dir=OUTPUTS_DIR):
+    """One-time import of memes rendered before the catalog existed."""
+    folders = [outputs_dir, os.path.join(outputs_dir, "photo_memes")]
+    final_dir = os.path.join(outputs_dir, "final_outputs")
+    if os.path.isdir(final_dir):
+        folders += [os.path.join(final_dir, f) for f in os.listdir(final_dir) if f.startswith("run_")]
+
+    found = []
+    for folder in folders:
+        if not os.path.isdir(folder):
+            continue
+        for name in os.listdir(folder):
+            path = os.path.join(folder, name)
+            if os.path.isfile(path) and media_type(name) and not name.endswith("_temp.mp4"):
+                found.append(path)
+
+    for path in sorted(found, key=os.path.getmtime):
+        record_output(path, created=os.path.getmtime(path))
+    if found:
+        logging.info(f"Backfilled {len(found)} existing memes into the catalog")
+
+# -----------------------------
+# In-memory index (web app process)
+# -----------------------------
+class MemeIndex:
+    """
+    All catalog rows kept in memory, newest first. SQLite's data_version tells
+    us when another process (a renderer) committed, and only rows newer than
+    the last seen id are read back; deletions trigger a full reload.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._conn = _connect()
+        self._rows = []          # newest first
+        self._by_path = {}
+        self._max_id = 0
+        self._data_version = None
+        self.version = None      # catalog state (see _refresh), used for ETags
+
+        if self._conn.execute("SELECT COUNT(*) FROM memes").fetchone()[0] == 0:
+            backfill()
+
+    def _refresh(self):
+        data_version = self._conn.execute("PRAGMA data_version").fetchone()[0]
+        if data_version == self._data_version:
+            return
+        self._data_version = data_version
+
+        max_id, count, newest = self._conn.execute(
+            "SELECT COALESCE(MAX(id), 0), COUNT(*), COALESCE(MAX(created), 0) FROM memes").fetchone()
+        # Derived from the database itself (ids never repeat with AUTOINCREMENT),
+        # so it stays the same across restarts and between worker processes
+        self.version = f"{max_id}.{count}.{int(newest * 1000)}"
+        new_rows = [dict(r) for r in self._conn.execute(
+            "SELECT * FROM memes WHERE id > ? ORDER BY id DESC", (self._max_id,))]
+        if len(self._rows) + len(new_rows) != count:
+            # Something was deleted or replaced: rebuild from scratch
+            new_rows = [dict(r) for r in self._conn.execute("SELECT * FROM memes ORDER BY id DESC")]
+            self._rows = []
+        if new_rows or not count:
+            self._rows = new_rows + self._rows
+            self._max_id = self._rows[0]["id"] if self._rows else 0
+            # Derivatives resolve to their parent row so they share its immutable URL hash
+            self._by_path = {}
+            for r in self._rows:
+                for key in ("thumbnail", "poster", "path"):
+                    if r.get(key):
+                        self._by_path[r[key]] = r
+
+    def get(self, rel_path):
+        """Current catalog row for an output (or one of its derivatives) path, or None."""
+        with self._lock:
+            self._refresh()
+            return self._by_path.get(rel_path)
+
+    def query(self, limit=None, cursor=None, kind=None, task_id=None):
+        """
+        Returns (rows, next_cursor, version). `cursor` is the id of the last row
+        of the previous page; rows are newest first.
+        """
+        with self._lock:
+            self._refresh()
+            rows = self._rows
+            version = self.version
+
+        selected = []
+        for row in rows:
+            if cursor is not None and row["id"] >= cursor:
+                continue
+            if kind and row["type"] != kind:
+                continue
+            if task_id and row["task_id"] != task_id:
+                continue
+            selected.append(row)
+            if limit and len(selected) > limit:
+                break
+
+        next_cursor = None
+        if limit and len(selected) > limit:
+            selected = selected[:limit]
+            next_cursor = selected[-1]["id"]
+        return selected, next_cursor, version
@@ -4,9 +4,15 @@ import glob
 import openai
 import re
 from APIKEY import openrouter_api_key
+import progress
+from workspace import work_dir
 
-OUTPUT_DIR = "outputs"
+OUTPUT_DIR = work_dir()  # job workspace when run by app.py
 OUTPUT_FILE = os.path.join(OUTPUT_DIR, "meme_moments.json")
+# Overridable so benchmarks can point at a local stand-in (bench/fakeOpenRouter.py)
+OPENROUTER_BASE_URL = os.environ.get("OPENROUTER_BASE_URL", "https://openrouter.ai/api/v1")
+
+progress.stage("detecting")
 
 # --- Step 1: Find latest *_combined_summary.json ---
 summary_files = glob.glob(os.path.join(OUTPUT_DIR, "*_combined_summary.json"))
@@ -40,11 +46,30 @@ elif isinstance(combined, list):
 if not verbal_data:
     raise ValueError("❌ No 'verbal' transcript found in JSON")
 
+# --- Extract visual scene captions (optional) ---
+visual_data = []
+if isinstance(combined, dict) and isinstance(combined.get("visual"), dict):
+    visual_data = combined["visual"].get("data", [])
+
 # --- Step 3: Build transcript text for model ---
 transcript_text = ""
 for entry in verbal_data:
     transcript_text += f"[{entry['start_time']} - {entry['end_time']}] {entry['text']}\n"
 
+# Scene summaries use hh:mm:ss.mmm timecodes; the prompt gives every time in seconds
+def _seconds(timecode):
+    if isinstance(timecode, (int, float)):
+        return round(float(timecode), 2)
+    seconds = 0.0
+    for part in str(timecode).split(":"):
+        seconds = seconds * 60 + float(part)
+    return round(seconds, 2)
+
+
+scenes_text = ""
+for entry in visual_data:
+    scenes_text += f"[{_seconds(entry['start_time'])} - {_seconds(entry['end_time'])}] {entry['caption']}\n"
+
 # --- Step 4: Prompt for OpenRouter GPT ---
 prompt = f"""
 ONLY return JSON array, no explanations or markdown.
@@ -63,10 +88,15 @@ Return JSON strictly in this format:
 Transcript:
 {transcript_text}
 """
+if scenes_text:
+    prompt += f"""
+Visual scenes (what is on screen, for context only; timestamps are in seconds like the transcript):
+{scenes_text}
+"""
 
 # --- Step 5: Run OpenAI (OpenRouter) model ---
 client = openai.OpenAI(
-    base_url="https://openrouter.ai/api/v1",
+    base_url=OPENROUTER_BASE_URL,
     api_key=openrouter_api_key
 )
 
@@ -78,6 +108,7 @@ response = client.chat.completions.create(
 )
 
 raw_output = response.choices[0].message.content.strip()
+progress.add_bytes(bytes_out=len(prompt.encode("utf-8")), bytes_in=len(raw_output.encode("utf-8")))
 
 # --- Step 6: Extract JSON safely ---
 match = re.search(r"\[\s*{.*}\s*\]", raw_output, re.DOTALL)
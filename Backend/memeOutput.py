@@ -1,35 +1,52 @@
 #memeOutput
 import os
 import json
+import argparse
 import cv2
 from PIL import Image, ImageDraw, ImageFont
 import textwrap
 import subprocess
 import datetime
+from memeCatalog import record_output, task_outputs
+from retention import discard_output
+from renderSettings import (save_image, save_derivatives, image_extension, get_profile,
+                            ANIMATED_FORMATS, RENDER_PROFILES)
+from animatedMeme import AnimationFrames, write_animations
+import progress
+from workspace import work_dir, OUTPUTS_DIR
+from cpuGovernor import ffmpeg_args
 
 # Paths
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
-OUTPUTS_DIR = os.path.join(BASE_DIR, "outputs")
-FRAMES_DIR = os.path.join(OUTPUTS_DIR, "frames")
-CLIPS_DIR = os.path.join(OUTPUTS_DIR, "clips")
+WORK_DIR = work_dir()  # job workspace (intermediates) when run by app.py
+FRAMES_DIR = os.path.join(WORK_DIR, "frames")
+CLIPS_DIR = os.path.join(WORK_DIR, "clips")
 FINAL_DIR = os.path.join(OUTPUTS_DIR, "final_outputs")
-MEME_JSON = os.path.join(OUTPUTS_DIR, "meme_moments.json")
+MEME_JSON = os.path.join(WORK_DIR, "meme_moments.json")
+RENDERED_JSON = os.path.join(WORK_DIR, "rendered.json")
 FONT_PATH = os.path.join(BASE_DIR, "fonts", "impact.ttf")  # lowercase name for safety
 
 # Make unique folder for this run
-timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
-RUN_DIR = os.path.join(FINAL_DIR, f"run_{timestamp}")
-os.makedirs(RUN_DIR, exist_ok=True)
-
-# Load memes
-with open(MEME_JSON, "r", encoding="utf-8") as f:
-    meme_moments = json.load(f)
+def create_run_dir():
+    timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
+    run_dir, n = os.path.join(FINAL_DIR, f"run_{timestamp}"), 1
+    while True:
+        try:
+            os.makedirs(run_dir)  # concurrent jobs finishing in the same second get their own folder
+            return run_dir
+        except FileExistsError:
+            n += 1
+            run_dir = os.path.join(FINAL_DIR, f"run_{timestamp}_{n}")
 
 # ==============================
 # Add caption to images
 # ==============================
-def add_caption_to_image(image_path, caption, output_path):
-    img = Image.open(image_path).convert("RGB")
+def add_caption_to_image(image, caption, output_path, task_id=None):
+    """`image` is a file path or an in-memory PIL image (drawn on in place)."""
+    if isinstance(image, Image.Image):
+        img = image if image.mode == "RGB" else image.convert("RGB")
+    else:
+        img = Image.open(image).convert("RGB")
     draw = ImageDraw.Draw(img)
     W, H = img.size
 
@@ -59,13 +76,128 @@ def add_caption_to_image(image_path, caption, output_path):
         draw.text((x, y), line, font=font, fill="white", stroke_width=8, stroke_fill="black")
         y += h + 5
 
-    img.save(output_path)
+    save_image(img, output_path)
+    derivatives = save_derivatives(img, output_path)
+    record_output(output_path, task_id, width=W, height=H, thumbnail=derivatives["thumbnail"])
     print(f"[✔] Saved image meme: {output_path}")
 
 # ==============================
 # Add caption to video
 # ==============================
-def add_caption_to_video(video_path, caption, output_path):
+def _open_encoder(output_path, audio_input, width, height, fps, profile, budget=None):
+    """
+    ffmpeg reading raw BGR frames on stdin and muxing the audio of audio_input
+    (ffmpeg input args, e.g. ["-i", clip]), encoding H.264 with the profile's
+    CRF/preset in a single pass. `budget` overrides the CPU budget (see cpuGovernor.threads).
+    """
+    cmd = [
+        "ffmpeg", "-y", "-v", "error",
+        "-f", "rawvideo", "-pix_fmt", "bgr24", "-s", f"{width}x{height}", "-r", str(fps), "-i", "pipe:0",
+        *audio_input,
+        "-map", "0:v:0", "-map", "1:a:0?",
+        "-c:v", "libx264", "-preset", profile["preset"], "-crf", str(profile["crf"]),
+        "-pix_fmt", "yuv420p",
+    ]
+    if width % 2 or height % 2:
+        cmd += ["-vf", "crop=trunc(iw/2)*2:trunc(ih/2)*2"]  # yuv420p needs even dimensions
+    cmd += ["-c:a", "aac", "-b:a", profile["audio_bitrate"], "-shortest", "-movflags", "+faststart",
+            *ffmpeg_args(budget), output_path]
+    return subprocess.Popen(cmd, stdin=subprocess.PIPE)
+
+
+class VideoCaptioner:
+    """
+    Draws a caption on BGR frames and pipes them to the encoder.
+    add_caption_to_video feeds it from a decoded clip; customCaption.py feeds
+    it frames cut from one shared decode of the source video.
+    `expected_frames` picks the poster frame (the middle one); `budget`
+    caps the encoder's threads (see cpuGovernor.threads).
+    """
+
+    def __init__(self, output_path, audio_input, caption, width, height, fps, profile,
+                 animated=(), expected_frames=0, clip_path=None, budget=None):
+        self.output_path = output_path
+        self.width, self.height, self.fps = width, height, fps
+        self.animated = animated
+        self.clip_path = clip_path  # palette source for GIFs
+        self.encoder = _open_encoder(output_path, audio_input, width, height, fps, profile, budget)
+
+        self.font = cv2.FONT_HERSHEY_SIMPLEX
+        self.thickness = max(2, int(width / 400))
+
+        max_chars_per_line = width // 25
+        wrapped = textwrap.fill(caption.upper(), width=max_chars_per_line)
+        self.lines = wrapped.split("\n")
+
+        longest_line = max(self.lines, key=len)
+        for fs in reversed(range(1, 500)):
+            (text_w, text_h), _ = cv2.getTextSize(longest_line, self.font, fs / 100, self.thickness)
+            if text_w <= width - 20:
+                self.font_scale = fs / 100
+                break
+
+        # Poster frame: the captioned middle frame, grabbed while we render anyway
+        self.poster_at = max(1, int(expected_frames) // 2)
+        self.poster = None
+        self.collected = AnimationFrames(fps) if animated else None
+        self.frame_count = 0
+
+    def write(self, frame):
+        """Caption one frame (in place) and send it to the encoder; False once the encoder is gone."""
+        self.frame_count += 1
+
+        y = 50
+        for line in self.lines:
+            (text_w, text_h), _ = cv2.getTextSize(line, self.font, self.font_scale, self.thickness)
+            x = (self.width - text_w) // 2
+            cv2.putText(frame, line, (x, y), self.font, self.font_scale, (0,0,0), self.thickness + 4, cv2.LINE_AA)
+            cv2.putText(frame, line, (x, y), self.font, self.font_scale, (255,255,255), self.thickness, cv2.LINE_AA)
+            y += text_h + 15
+
+        if self.frame_count == self.poster_at:
+            self.poster = Image.fromarray(cv2.cvtColor(frame, cv2.COLOR_BGR2RGB))
+        if self.collected and self.collected.wants(self.frame_count - 1):
+            self.collected.add(self.frame_count - 1, cv2.cvtColor(frame, cv2.COLOR_BGR2RGB))
+        try:
+            self.encoder.stdin.write(frame.tobytes())
+            return True
+        except BrokenPipeError:
+            return False  # encoder died; reported by finish()
+
+    def finish(self, task_id=None):
+        """Wait for the encoder, then write derivatives/animations and record the outputs. False on failure."""
+        try:
+            self.encoder.stdin.close()
+        except BrokenPipeError:
+            pass
+        if self.encoder.wait() != 0 or not self.frame_count:
+            print(f"[❌] ffmpeg failed to encode {self.output_path}")
+            return False
+
+        output_path, fps = self.output_path, self.fps
+        derivatives = save_derivatives(self.poster, output_path, poster=True) if self.poster else {}
+        record_output(output_path, task_id, width=self.width, height=self.height,
+                      duration=round(self.frame_count / fps, 3),
+                      thumbnail=derivatives.get("thumbnail"), poster=derivatives.get("poster"))
+        print(f"[✔] Saved video meme with audio: {output_path}")
+
+        collected = self.collected
+        if collected:
+            for fmt, (path, (w, h)) in write_animations(collected, output_path, self.animated,
+                                                        self.clip_path).items():
+                thumb = save_derivatives(collected.frames[0], path)
+                record_output(path, task_id, width=w, height=h,
+                              duration=round(len(collected.frames) / collected.fps, 3), thumbnail=thumb["thumbnail"])
+                print(f"[✔] Saved animated {fmt} meme: {path}")
+        return True
+
+
+def add_caption_to_video(video_path, caption, output_path, task_id=None, animated=(), profile=None):
+    """
+    `animated` lists extra looping formats ("gif", "webp") built from the same decoded frames.
+    The clip is expected to be scaled to the profile already (frameExtractor does it while decoding).
+    """
+    profile = profile or get_profile()
     cap = cv2.VideoCapture(video_path)
     if not cap.isOpened():
         print(f"[❌] Could not open video: {video_path}")
@@ -74,73 +206,95 @@ def add_caption_to_video(video_path, caption, output_path):
     fps = cap.get(cv2.CAP_PROP_FPS) or 25
     width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
     height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
-    fourcc = cv2.VideoWriter_fourcc(*'mp4v')
 
-    temp_output = os.path.join(RUN_DIR, "temp_video.mp4")
-    out = cv2.VideoWriter(temp_output, fourcc, fps, (width, height))
+    captioner = VideoCaptioner(output_path, ["-i", video_path], caption, width, height, fps, profile,
+                               animated, int(cap.get(cv2.CAP_PROP_FRAME_COUNT) or 0), clip_path=video_path)
+    while True:
+        ret, frame = cap.read()
+        if not ret or not captioner.write(frame):
+            break
 
-    font = cv2.FONT_HERSHEY_SIMPLEX
-    thickness = max(2, int(width / 400))
+    cap.release()
+    captioner.finish(task_id)
 
-    max_chars_per_line = width // 25
-    wrapped = textwrap.fill(caption.upper(), width=max_chars_per_line)
-    lines = wrapped.split("\n")
+# ==============================
+# Process all memes
+# ==============================
+def render_memes(meme_moments, run_dir, frames=None, task_id=None, animated=None, profile=None):
+    """
+    Render every meme moment into run_dir.
+    `frames` maps meme index -> in-memory PIL frame; without it the frames
+    written by frameExtractor.py to FRAMES_DIR are used.
+    `animated` overrides MEME_ANIMATED_FORMATS for the looping GIF/WebP outputs.
+    `profile` is a renderSettings profile (default: MEME_RENDER_PROFILE).
+    Returns the paths of the rendered memes.
+    """
+    profile = profile or get_profile()
+    animated = ANIMATED_FORMATS if animated is None else animated
+    progress.stage("rendering")
+    outputs = []
+    for i, moment in enumerate(meme_moments, start=1):
+        caption = moment["suggested_caption"]
 
-    longest_line = max(lines, key=len)
-    for fs in reversed(range(1, 500)):
-        (text_w, text_h), _ = cv2.getTextSize(longest_line, font, fs / 100, thickness)
-        if text_w <= width - 20:
-            font_scale = fs / 100
-            break
+        # Image
+        if frames is not None:
+            frame = frames.get(i)
+        else:
+            frame_file = os.path.join(FRAMES_DIR, f"meme_{i}.jpg")
+            frame = frame_file if os.path.exists(frame_file) else None
+        if frame is not None:
+            output_img = os.path.join(run_dir, f"final_meme_{i}{image_extension()}")
+            add_caption_to_image(frame, caption, output_img, task_id)
+            outputs.append(output_img)
 
-    while True:
-        ret, frame = cap.read()
-        if not ret:
-            break
+        # Video
+        clip_file = os.path.join(CLIPS_DIR, f"meme_{i}.mp4")
+        if os.path.exists(clip_file):
+            output_vid = os.path.join(run_dir, f"final_meme_{i}.mp4")
+            add_caption_to_video(clip_file, caption, output_vid, task_id, animated, profile)
+            outputs.append(output_vid)
+    return [path for path in outputs if os.path.exists(path)]
 
-        y = 50
-        for line in lines:
-            (text_w, text_h), _ = cv2.getTextSize(line, font, font_scale, thickness)
-            x = (width - text_w) // 2
-            cv2.putText(frame, line, (x, y), font, font_scale, (0,0,0), thickness + 4, cv2.LINE_AA)
-            cv2.putText(frame, line, (x, y), font, font_scale, (255,255,255), thickness, cv2.LINE_AA)
-            y += text_h + 15
 
-        out.write(frame)
+def main():
+    parser = argparse.ArgumentParser(description="Render captions onto extracted frames and clips")
+    parser.add_argument("--in-process", action="store_true",
+                        help="Extract frames/clips here and hand frames to the renderer in memory")
+    parser.add_argument("--task-id", default=None, help="Task id recorded with the outputs in the meme catalog")
+    parser.add_argument("--debug-frames", action="store_true",
+                        help="With --in-process, also write intermediate frames to outputs/frames")
+    parser.add_argument("--animated", default=None,
+                        help="Comma separated looping formats to render from each clip (gif,webp); "
+                             "defaults to MEME_ANIMATED_FORMATS")
+    parser.add_argument("--profile", choices=list(RENDER_PROFILES), default=None,
+                        help="Render profile (resolution/quality/speed); defaults to MEME_RENDER_PROFILE")
+    args = parser.parse_args()
+    profile = get_profile(args.profile)
 
-    cap.release()
-    out.release()
+    # Load memes
+    with open(MEME_JSON, "r", encoding="utf-8") as f:
+        meme_moments = json.load(f)
 
-    # Add original audio using ffmpeg
-    cmd = [
-        "ffmpeg", "-y",
-        "-i", temp_output,
-        "-i", video_path,
-        "-c:v", "copy",
-        "-c:a", "aac",
-        "-map", "0:v:0",
-        "-map", "1:a:0",
-        output_path
-    ]
-    subprocess.run(cmd, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
-    os.remove(temp_output)
+    frames = None
+    if args.in_process:
+        from frameExtractor import plan_sources, extract_moments
+        extracted = extract_moments(plan_sources(meme_moments, profile), meme_moments,
+                                    keep_frames=args.debug_frames, profile=profile)
+        frames = {item["index"]: item["frame"] for item in extracted}
 
-    print(f"[✔] Saved video meme with audio: {output_path}")
+    animated = None if args.animated is None else [f for f in args.animated.lower().split(",") if f]
+    if args.task_id:
+        # A retried/resumed render replaces whatever an interrupted attempt left behind
+        for path in task_outputs(args.task_id):
+            discard_output(path)
 
-# ==============================
-# Process all memes
-# ==============================
-for i, moment in enumerate(meme_moments, start=1):
-    caption = moment["suggested_caption"]
-
-    # Image
-    frame_file = os.path.join(FRAMES_DIR, f"meme_{i}.jpg")
-    if os.path.exists(frame_file):
-        output_img = os.path.join(RUN_DIR, f"final_meme_{i}.jpg")
-        add_caption_to_image(frame_file, caption, output_img)
-
-    # Video
-    clip_file = os.path.join(CLIPS_DIR, f"meme_{i}.mp4")
-    if os.path.exists(clip_file):
-        output_vid = os.path.join(RUN_DIR, f"final_meme_{i}.mp4")
-        add_caption_to_video(clip_file, caption, output_vid)
+    run_dir = create_run_dir()
+    outputs = render_memes(meme_moments, run_dir, frames, args.task_id, animated, profile)
+
+    # Listed in the render step's completion manifest (see allfour.py)
+    with open(RENDERED_JSON, "w", encoding="utf-8") as f:
+        json.dump({"run_dir": run_dir, "outputs": outputs}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,129 @@
+# metrics.py
+import threading
+
+# -----------------------------
+# Config
+# -----------------------------
+# Pipeline stages run from a fraction of a second (detection on a cached
+# transcript) to tens of minutes (Whisper on a long video).
+DURATION_BUCKETS = (0.1, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600, 1800, 3600)
+
+# -----------------------------
+# Metric types (Prometheus text exposition format)
+# -----------------------------
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _label_str(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in sorted(labels.items())) + "}"
+
+
+class Counter:
+    def __init__(self, name, help_text):
+        self.name, self.help = name, help_text
+        self._lock = threading.Lock()
+        self._values = {}
+
+    def inc(self, amount=1, **labels):
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_label_str(dict(key))} {value}")
+        return lines
+
+
+class Gauge:
+    """Value computed at scrape time by `read()` (e.g. queue depth)."""
+
+    def __init__(self, name, help_text, read):
+        self.name, self.help, self.read = name, help_text, read
+
+    def render(self):
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} gauge", f"{self.name} {self.read()}"]
+
+
+class Histogram:
+    def __init__(self, name, help_text, buckets=DURATION_BUCKETS):
+        self.name, self.help, self.buckets = name, help_text, tuple(buckets)
+        self._lock = threading.Lock()
+        self._series = {}  # labels -> [bucket counts..., sum, count]
+
+    def observe(self, value, **labels):
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            series = self._series.setdefault(key, [0] * len(self.buckets) + [0.0, 0])
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[i] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for key, series in sorted(self._series.items()):
+                labels = dict(key)
+                for bound, count in zip(self.buckets, series):
+                    lines.append(f"{self.name}_bucket{_label_str(dict(labels, le=bound))} {count}")
+                lines.append(f"{self.name}_bucket{_label_str(dict(labels, le='+Inf'))} {series[-1]}")
+                lines.append(f"{self.name}_sum{_label_str(labels)} {round(series[-2], 6)}")
+                lines.append(f"{self.name}_count{_label_str(labels)} {series[-1]}")
+        return lines
+
+# -----------------------------
+# Pipeline metrics
+# -----------------------------
+STAGE_SECONDS = Histogram("memegen_stage_duration_seconds", "Wall time per pipeline stage")
+STEP_SECONDS = Histogram("memegen_step_duration_seconds", "Wall time per pipeline step process")
+TASK_SECONDS = Histogram("memegen_task_duration_seconds", "Wall time per task, upload to done/error")
+STAGE_CPU = Counter("memegen_stage_cpu_seconds_total", "CPU time per stage, including ffmpeg/yt-dlp children")
+STAGE_BYTES = Counter("memegen_stage_bytes_total", "Bytes read (in) / written (out) per stage")
+CACHE_LOOKUPS = Counter("memegen_cache_lookups_total", "Cache lookups by cache and result (hit|miss)")
+TASKS = Counter("memegen_tasks_total", "Finished tasks by input type and outcome")
+FAILURES = Counter("memegen_failures_total", "Failed tasks by the stage they failed in")
+RECLAIMED_BYTES = Counter("memegen_reclaimed_bytes_total", "Disk space freed by retention, per directory class")
+COALESCED = Counter("memegen_coalesced_tasks_total", "Submissions that joined an identical running job")
+WORK_AVOIDED = Counter("memegen_work_avoided_cpu_seconds_total",
+                       "CPU-seconds not spent because followers reused a running job's results")
+EVICTIONS = Counter("memegen_evictions_total", "Files/folders deleted by retention, per directory class")
+
+
+def record_span(span):
+    """Aggregate one `span` progress event from a pipeline child."""
+    stage = span.get("stage", "unknown")
+    STAGE_SECONDS.observe(span.get("duration") or 0, stage=stage)
+    if span.get("cpu") is not None:
+        STAGE_CPU.inc(span["cpu"], stage=stage)
+    if span.get("bytes_in"):
+        STAGE_BYTES.inc(span["bytes_in"], stage=stage, direction="in")
+    if span.get("bytes_out"):
+        STAGE_BYTES.inc(span["bytes_out"], stage=stage, direction="out")
+
+
+def record_cache(name, hit):
+    CACHE_LOOKUPS.inc(cache=name, result="hit" if hit else "miss")
+
+
+def record_reclaimed(report):
+    """Aggregate a retention report ({class: {"reclaimed", "evicted"}})."""
+    for name, r in report.items():
+        if r.get("evicted"):
+            RECLAIMED_BYTES.inc(r["reclaimed"], **{"class": name})
+            EVICTIONS.inc(r["evicted"], **{"class": name})
+
+
+def render(*extra):
+    """Prometheus text exposition of every pipeline metric plus `extra` (e.g. gauges)."""
+    lines = []
+    for metric in (STAGE_SECONDS, STEP_SECONDS, TASK_SECONDS, STAGE_CPU, STAGE_BYTES,
+                   CACHE_LOOKUPS, TASKS, FAILURES, COALESCED, WORK_AVOIDED, RECLAIMED_BYTES, EVICTIONS) + extra:
+        lines += metric.render()
+    return "\n".join(lines) + "\n"
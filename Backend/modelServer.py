@@ -0,0 +1,166 @@
+# modelServer.py
+import os
+import time
+import queue
+import logging
+import argparse
+import threading
+from multiprocessing import AuthenticationError
+from multiprocessing.connection import Listener
+import models
+
+# -----------------------------
+# Logging
+# -----------------------------
+logging.basicConfig(level=logging.INFO, format="%(levelname)s: %(message)s")
+
+# -----------------------------
+# Config
+# -----------------------------
+MAX_BATCH = int(os.environ.get("MEMEGEN_MAX_BATCH", "16"))               # images per BLIP forward pass
+BATCH_WINDOW = float(os.environ.get("MEMEGEN_BATCH_WINDOW_MS", "20")) / 1000  # wait this long to fill a batch
+
+# -----------------------------
+# Caption batching
+# -----------------------------
+class _Pending:
+    def __init__(self, images, max_new_tokens):
+        self.images = images
+        self.max_new_tokens = max_new_tokens
+        self.result = None
+        self.error = None
+        self.done = threading.Event()
+
+
+class CaptionBatcher:
+    """
+    Collects caption requests from all connections and runs them through BLIP
+    together: the first request opens a batch, which closes after BATCH_WINDOW
+    or once MAX_BATCH images are waiting. Requests with a different
+    max_new_tokens wait for the next batch.
+    """
+
+    def __init__(self, max_batch=MAX_BATCH, window=BATCH_WINDOW):
+        self.max_batch = max_batch
+        self.window = window
+        self.queue = queue.Queue()
+        self.batches = 0
+        self.images = 0
+        threading.Thread(target=self._run, name="caption-batcher", daemon=True).start()
+
+    def caption(self, images, max_new_tokens):
+        pending = _Pending(images, max_new_tokens)
+        self.queue.put(pending)
+        pending.done.wait()
+        if pending.error:
+            raise pending.error
+        return pending.result
+
+    def _collect(self):
+        batch = [self.queue.get()]
+        size = len(batch[0].images)
+        deadline = time.monotonic() + self.window
+        held = []
+        while size < self.max_batch:
+            try:
+                item = self.queue.get(timeout=max(0, deadline - time.monotonic()))
+            except queue.Empty:
+                break
+            if item.max_new_tokens != batch[0].max_new_tokens:
+                held.append(item)
+                continue
+            batch.append(item)
+            size += len(item.images)
+        for item in held:
+            self.queue.put(item)
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            images = [img for item in batch for img in item.images]
+            try:
+                captions = models.caption_local(images, batch[0].max_new_tokens, batch_size=self.max_batch)
+            except Exception as e:
+                for item in batch:
+                    item.error = e
+                    item.done.set()
+                continue
+            self.batches += 1
+            self.images += len(images)
+            offset = 0
+            for item in batch:
+                item.result = captions[offset:offset + len(item.images)]
+                offset += len(item.images)
+                item.done.set()
+
+# -----------------------------
+# Server
+# -----------------------------
+class ModelServer:
+    def __init__(self, address, preload=True):
+        self.address = address
+        self.batcher = CaptionBatcher()
+        self.whisper_lock = threading.Lock()  # Whisper runs one file at a time
+        if preload:
+            models.blip()
+            models.whisper_model()
+
+    def handle(self, request):
+        op = request.get("op")
+        if op == "caption":
+            return self.batcher.caption(request["images"], request.get("max_new_tokens", 20))
+        if op == "transcribe":
+            with self.whisper_lock:
+                return models.transcribe_local(request["path"], request.get("model_size", models.WHISPER_MODEL_SIZE),
+                                               request.get("fp16", False))
+        if op == "stats":
+            return {"batches": self.batcher.batches, "images": self.batcher.images}
+        raise ValueError(f"unknown op: {op}")
+
+    def _serve_connection(self, conn):
+        with conn:
+            while True:
+                try:
+                    request = conn.recv()
+                except (EOFError, OSError):
+                    return
+                try:
+                    reply = {"ok": True, "result": self.handle(request)}
+                except Exception as e:
+                    logging.error(f"Model server: {request.get('op')} failed: {e}")
+                    reply = {"ok": False, "error": str(e)}
+                conn.send(reply)
+
+    def serve_forever(self):
+        # Messages are pickles: only clients holding the key may connect, and
+        # the default socket sits in a folder only this user can enter
+        key = models.authkey(create=True)
+        if os.path.dirname(os.path.abspath(self.address)) == models.RUN_DIR:
+            os.makedirs(models.RUN_DIR, mode=0o700, exist_ok=True)
+            os.chmod(models.RUN_DIR, 0o700)
+        if os.path.exists(self.address):
+            os.remove(self.address)  # stale socket from a previous run
+        old_umask = os.umask(0o077)  # socket usable by this user only
+        try:
+            listener = Listener(self.address, family="AF_UNIX", authkey=key)
+        finally:
+            os.umask(old_umask)
+        logging.info(f"🧠 Model server listening on {self.address} (key: {models.key_file()})")
+        with listener:
+            while True:
+                try:
+                    conn = listener.accept()
+                except (AuthenticationError, EOFError, OSError) as e:
+                    logging.warning(f"Model server: rejected a connection ({e})")
+                    continue
+                threading.Thread(target=self._serve_connection, args=(conn,), daemon=True).start()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve BLIP and Whisper to all workers over a Unix socket")
+    parser.add_argument("--socket", default=os.environ.get(models.MODEL_SOCKET_ENV) or models.DEFAULT_SOCKET,
+                        help="Socket path; point workers at it with MEMEGEN_MODEL_SOCKET")
+    parser.add_argument("--lazy", action="store_true", help="Load models on first request instead of at startup")
+    args = parser.parse_args()
+    ModelServer(args.socket, preload=not args.lazy).serve_forever()
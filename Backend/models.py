@@ -0,0 +1,162 @@
+# models.py
+import os
+import secrets
+import logging
+import threading
+from multiprocessing import AuthenticationError
+from multiprocessing.connection import Client
+import cpuGovernor
+from workspace import DATA_DIR
+
+# -----------------------------
+# Logging
+# -----------------------------
+logging.basicConfig(level=logging.INFO, format="%(levelname)s: %(message)s")
+
+# -----------------------------
+# Config
+# -----------------------------
+# MEMEGEN_MODEL_SOCKET: Unix socket of a running modelServer.py. When set, BLIP
+# captioning and Whisper transcription are sent there, so web workers and
+# pipeline processes don't each load their own copy of the weights. When unset
+# (or the server can't be reached) models are loaded in-process on first use.
+# MEMEGEN_MODEL_KEY_FILE: shared secret both sides authenticate with before any
+# message is unpickled (default <data dir>/run/model.key, created 0600 by
+# modelServer.py). The default socket lives in the same private (0700) folder.
+MODEL_SOCKET_ENV = "MEMEGEN_MODEL_SOCKET"
+MODEL_KEY_FILE_ENV = "MEMEGEN_MODEL_KEY_FILE"
+RUN_DIR = os.path.join(DATA_DIR, "run")
+DEFAULT_SOCKET = os.path.join(RUN_DIR, "models.sock")
+BLIP_MODEL_ID = "Salesforce/blip-image-captioning-base"
+WHISPER_MODEL_SIZE = "base"
+CAPTION_BATCH_SIZE = 8
+
+# -----------------------------
+# In-process models (loaded lazily)
+# -----------------------------
+_load_lock = threading.Lock()
+_blip = None
+_whisper = {}
+
+
+def _device():
+    import torch
+    return "cuda" if torch.cuda.is_available() else "cpu"
+
+
+def blip():
+    """(processor, model, device), loaded once per process."""
+    global _blip
+    with _load_lock:
+        if _blip is None:
+            from transformers import BlipProcessor, BlipForConditionalGeneration
+            device = _device()
+            logging.info(f"Loading BLIP ({BLIP_MODEL_ID}) on {device}...")
+            processor = BlipProcessor.from_pretrained(BLIP_MODEL_ID)
+            model = BlipForConditionalGeneration.from_pretrained(BLIP_MODEL_ID).to(device)
+            _blip = (processor, model, device)
+    return _blip
+
+
+def whisper_model(size=WHISPER_MODEL_SIZE):
+    with _load_lock:
+        if size not in _whisper:
+            import whisper
+            logging.info(f"Loading Whisper model ({size})...")
+            _whisper[size] = whisper.load_model(size)
+    return _whisper[size]
+
+
+def caption_local(images, max_new_tokens=20, batch_size=CAPTION_BATCH_SIZE):
+    import torch
+    processor, model, device = blip()
+    cpuGovernor.apply_torch()
+    captions = []
+    for i in range(0, len(images), batch_size):
+        batch = images[i:i + batch_size]
+        inputs = processor(images=batch, return_tensors="pt")
+        inputs = {k: v.to(device) for k, v in inputs.items()}
+        with torch.no_grad():
+            out = model.generate(**inputs, max_new_tokens=max_new_tokens)
+        captions.extend(processor.batch_decode(out, skip_special_tokens=True))
+    return captions
+
+
+def transcribe_local(file_path, model_size=WHISPER_MODEL_SIZE, fp16=False):
+    model = whisper_model(model_size)
+    cpuGovernor.apply_torch()
+    return model.transcribe(file_path, fp16=fp16)["segments"]
+
+# -----------------------------
+# Model server client
+# -----------------------------
+class ModelServerError(RuntimeError):
+    """The model server ran the request and it failed."""
+
+
+def key_file():
+    return os.environ.get(MODEL_KEY_FILE_ENV) or os.path.join(RUN_DIR, "model.key")
+
+
+def authkey(create=False):
+    """The model server's shared secret; `create` writes a new one if there is none yet."""
+    path = key_file()
+    if create and not os.path.exists(path):
+        os.makedirs(os.path.dirname(path), mode=0o700, exist_ok=True)
+        fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+        with os.fdopen(fd, "w") as f:
+            f.write(secrets.token_hex(32))
+    if os.stat(path).st_mode & 0o077:
+        raise OSError(f"{path} must only be readable by its owner (chmod 600)")
+    with open(path, "rb") as f:
+        key = f.read().strip()
+    if not key:
+        raise OSError(f"{path} is empty")
+    return key
+
+
+_conn = threading.local()
+
+
+def _server_call(request):
+    """Send one request over this thread's connection (reconnecting once if it dropped)."""
+    address = os.environ.get(MODEL_SOCKET_ENV)
+    for attempt in (1, 2):
+        conn = getattr(_conn, "conn", None)
+        try:
+            if conn is None or _conn.address != address:
+                conn = _conn.conn = Client(address, family="AF_UNIX", authkey=authkey())
+                _conn.address = address
+            conn.send(request)
+            reply = conn.recv()
+            break
+        except (OSError, EOFError):
+            _conn.conn = None
+            if attempt == 2:
+                raise
+    if not reply.get("ok"):
+        raise ModelServerError(reply.get("error", "model server error"))
+    return reply["result"]
+
+
+def _remote(request, local, *args):
+    if os.environ.get(MODEL_SOCKET_ENV):
+        try:
+            return _server_call(request)
+        except (OSError, EOFError, AuthenticationError) as e:
+            logging.warning(f"Model server unreachable ({e}), running {request['op']} in-process")
+    return local(*args)
+
+
+def caption_images(images, max_new_tokens=20, batch_size=CAPTION_BATCH_SIZE):
+    """BLIP captions for a list of PIL images, in order."""
+    if not images:
+        return []
+    request = {"op": "caption", "images": list(images), "max_new_tokens": max_new_tokens}
+    return _remote(request, caption_local, images, max_new_tokens, batch_size)
+
+
+def transcribe(file_path, model_size=WHISPER_MODEL_SIZE, fp16=False):
+    """Whisper segments for an audio/video file. The server reads the file itself (same host)."""
+    request = {"op": "transcribe", "path": os.path.abspath(file_path), "model_size": model_size, "fp16": fp16}
+    return _remote(request, transcribe_local, file_path, model_size, fp16)
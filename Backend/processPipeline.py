@@ -2,9 +2,11 @@ import os
 import re
 import json
 import logging
-import shutil
-# from visualProcess import process_visual   # ❌ disable visual import
 from verbalProcess import process_verbal
+from rangeFetch import is_remote_source, download_proxy
+from mediaStore import ingest_file
+import progress
+from workspace import work_dir, DOWNLOADS_DIR
 
 # -----------------------------
 # Logging
@@ -14,9 +16,8 @@ logging.basicConfig(level=logging.INFO, format="%(levelname)s: %(message)s")
 # -----------------------------
 # Folders
 # -----------------------------
-OUTPUT_FOLDER = "outputs"
-DOWNLOAD_FOLDER = "downloads"
-os.makedirs(OUTPUT_FOLDER, exist_ok=True)
+OUTPUT_FOLDER = work_dir()  # job workspace when run by app.py
+DOWNLOAD_FOLDER = DOWNLOADS_DIR
 os.makedirs(DOWNLOAD_FOLDER, exist_ok=True)
 
 # -----------------------------
@@ -24,36 +25,56 @@ os.makedirs(DOWNLOAD_FOLDER, exist_ok=True)
 # -----------------------------
 def get_base_name(input_source):
     """Sanitize base name for local file or YouTube URL."""
-    if re.match(r'https?://(www\.)?youtu', input_source):
+    if is_remote_source(input_source):
         return re.sub(r'[<>:"/\\|?*]', '_', input_source.split("youtu")[-1])
     return os.path.splitext(os.path.basename(input_source))[0]
 
 # -----------------------------
 # Main pipeline
 # -----------------------------
-def process_pipeline(input_source, fp16=False):
+def process_pipeline(input_source, fp16=False, visual=True, max_scenes=None, full_download=False):
+    """
+    Remote inputs use a two-phase ingest by default: only audio is downloaded
+    here (plus a low-res proxy when visual analysis is on), and frameExtractor
+    later fetches just the video sections around the detected moments.
+    full_download=True restores the old bestvideo+bestaudio download.
+    """
     logging.info(f"Processing input: {input_source}")
+    remote = is_remote_source(input_source)
 
     # -----------------------------
-    # Handle local copy once
+    # Local files live once in the content-addressed store
     # -----------------------------
-    if not re.match(r'https?://(www\.)?youtu', input_source):
+    if not remote:
         if not os.path.exists(input_source):
             raise FileNotFoundError(f"File not found: {input_source}")
-        base_name = os.path.basename(input_source)
-        video_path = os.path.join(DOWNLOAD_FOLDER, base_name)
-        if not os.path.exists(video_path):
-            shutil.copy(input_source, video_path)
-            logging.info(f"Copied local file to {video_path}")
-        input_source = video_path  # downstream uses this path
+        # Uploads are already stored; other paths are hardlinked in (copied only across filesystems)
+        input_source, _, _ = ingest_file(input_source)  # downstream uses this path
 
     # -----------------------------
-    # Only run verbal
+    # Verbal, then visual on the same local file
     # -----------------------------
-    verbal_data = process_verbal(input_source, fp16=fp16)
+    verbal_data = process_verbal(input_source, fp16=fp16, keep_video=full_download or not remote)
+    # Audio-only downloads are deleted after transcription; only a full download is kept
+    video_path = verbal_data["audio"] if os.path.exists(verbal_data["audio"]) else None
+
+    visual_data = None
+    proxy_bytes = 0
+    if visual:
+        # Imported lazily so --no-visual runs never load BLIP
+        from visualProcess import process_visual
+        progress.stage("analyzing")
+        try:
+            visual_source = video_path or download_proxy(
+                input_source, os.path.join(OUTPUT_FOLDER, f"{get_base_name(input_source)}_proxy"))
+            if not video_path:
+                proxy_bytes = os.path.getsize(visual_source)
+            visual_data = process_visual(visual_source, max_scenes=max_scenes)
+        except Exception as e:
+            logging.warning(f"Visual processing failed, continuing verbal-only: {e}")
 
     # -----------------------------
-    # Save combined JSON (verbal only)
+    # Save combined JSON
     # -----------------------------
     base_name = get_base_name(input_source)
     combined_json_file = os.path.join(OUTPUT_FOLDER, f"{base_name}_combined_summary.json")
@@ -64,14 +85,24 @@ def process_pipeline(input_source, fp16=False):
         )
         counter += 1
 
-    combined_result = verbal_data  # ✅ just copy verbal summary
+    # "input"/"video" tell frameExtractor whether to cut from a local file
+    # or fetch sections of the remote source
+    combined_result = {
+        "input": input_source,
+        "video": video_path,
+        "verbal": verbal_data,
+        "visual": visual_data,
+        # Bytes fetched before the video sections (phase-1 audio, scene-analysis proxy)
+        "ingest_bytes": {"audio": verbal_data.get("bytes_downloaded", 0), "proxy": proxy_bytes},
+    }
 
     with open(combined_json_file, "w", encoding="utf-8") as f:
         json.dump(combined_result, f, indent=4, ensure_ascii=False)
 
     logging.info(
-        f"✅ Combined (verbal-only) summary saved to {combined_json_file} | "
-        f"Verbal segments: {len(verbal_data['data'])}"
+        f"✅ Combined summary saved to {combined_json_file} | "
+        f"Verbal segments: {len(verbal_data['data'])} | "
+        f"Visual scenes: {len(visual_data['data']) if visual_data else 0}"
     )
     return combined_result
 
@@ -80,9 +111,14 @@ def process_pipeline(input_source, fp16=False):
 # -----------------------------
 if __name__ == "__main__":
     import argparse
-    parser = argparse.ArgumentParser(description="Run verbal-only processing pipeline")
+    parser = argparse.ArgumentParser(description="Run verbal + visual processing pipeline")
     parser.add_argument("--input", type=str, required=True, help="Local file path or YouTube URL")
     parser.add_argument("--fp16", action="store_true", help="Use fp16 for Whisper transcription")
+    parser.add_argument("--no-visual", action="store_true", help="Skip scene detection + BLIP captions")
+    parser.add_argument("--max_scenes", type=int, default=None, help="Optional: max scenes to caption")
+    parser.add_argument("--full-download", action="store_true",
+                        help="Download the whole remote video up front instead of audio + sections")
     args = parser.parse_args()
 
-    process_pipeline(args.input, fp16=args.fp16)
+    process_pipeline(args.input, fp16=args.fp16, visual=not args.no_visual,
+                     max_scenes=args.max_scenes, full_download=args.full_download)
@@ -0,0 +1,113 @@
+# progress.py
+import os
+import sys
+import json
+import time
+import atexit
+try:
+    import resource  # Unix only; CPU/RSS are simply left out elsewhere
+except ImportError:
+    resource = None
+
+# -----------------------------
+# Config
+# -----------------------------
+# Pipeline steps run as child processes of app.py; they report progress as
+# single prefixed JSON lines on stdout, which app.py reads and turns into
+# task events. Outside the web app (plain CLI runs) nothing is printed.
+PROGRESS_PREFIX = "@@progress "
+PROGRESS_ENV = "MEMEGEN_PROGRESS"
+
+# -----------------------------
+# Emit (child side)
+# -----------------------------
+def enabled():
+    return os.environ.get(PROGRESS_ENV) == "1"
+
+
+def emit(event, **data):
+    if not enabled():
+        return
+    sys.stdout.write(PROGRESS_PREFIX + json.dumps({"event": event, "data": data}) + "\n")
+    sys.stdout.flush()
+
+
+def stage(name):
+    """
+    Stage transition: downloading, transcribing, analyzing, detecting, extracting, rendering.
+    Also closes the previous stage's span and opens one for this stage.
+    """
+    end_span()
+    emit("stage", stage=name)
+    _open_span(name)
+
+
+def cache(name, hit):
+    """Cache lookup outcome, counted in /metrics (visual, keyframes, sections, palette, ...)."""
+    emit("cache", cache=name, hit=bool(hit))
+
+# -----------------------------
+# Stage spans (child side)
+# -----------------------------
+# A span runs from one stage() call to the next (or to process exit) and
+# records wall time, CPU time of this process plus its finished children
+# (ffmpeg, yt-dlp), peak RSS and bytes read/written by the stage.
+_span = None
+
+
+def usage():
+    """(cpu_seconds, peak_rss_bytes) for this process and its reaped children."""
+    if resource is None:
+        return None, None
+    me, children = resource.getrusage(resource.RUSAGE_SELF), resource.getrusage(resource.RUSAGE_CHILDREN)
+    cpu = me.ru_utime + me.ru_stime + children.ru_utime + children.ru_stime
+    rss_unit = 1 if sys.platform == "darwin" else 1024  # ru_maxrss is KiB on Linux, bytes on macOS
+    return cpu, max(me.ru_maxrss, children.ru_maxrss) * rss_unit
+
+
+def _open_span(name):
+    global _span
+    if not enabled():
+        return
+    _span = {"stage": name, "start": time.time(), "t0": time.perf_counter(),
+             "cpu0": usage()[0], "bytes_in": 0, "bytes_out": 0}
+
+
+def current_stage():
+    """Name of the stage this process is in (None outside the web app's pipeline runs)."""
+    return _span["stage"] if _span is not None else None
+
+
+def add_bytes(bytes_in=0, bytes_out=0):
+    """Attribute bytes read (downloads, API responses) / written (outputs) to the current stage."""
+    if _span is not None:
+        _span["bytes_in"] += bytes_in or 0
+        _span["bytes_out"] += bytes_out or 0
+
+
+def end_span():
+    global _span
+    if _span is None:
+        return
+    span, _span = _span, None
+    cpu, peak_rss = usage()
+    emit("span", stage=span["stage"], start=span["start"],
+         duration=round(time.perf_counter() - span["t0"], 3),
+         cpu=round(cpu - span["cpu0"], 3) if cpu is not None else None,
+         peak_rss=peak_rss, bytes_in=span["bytes_in"], bytes_out=span["bytes_out"])
+
+
+atexit.register(end_span)
+
+# -----------------------------
+# Parse (app side)
+# -----------------------------
+def parse(line):
+    """Return (event, data) for a progress line, or None for ordinary output."""
+    if not line.startswith(PROGRESS_PREFIX):
+        return None
+    try:
+        payload = json.loads(line[len(PROGRESS_PREFIX):])
+        return payload["event"], payload.get("data", {})
+    except (ValueError, KeyError):
+        return None
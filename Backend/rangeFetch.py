@@ -0,0 +1,230 @@
+# rangeFetch.py
+import os
+import re
+import json
+import logging
+import urllib.request
+from urllib.parse import urlparse, parse_qs
+import yt_dlp
+from yt_dlp.utils import download_range_func
+import progress
+
+# -----------------------------
+# Logging
+# -----------------------------
+logging.basicConfig(level=logging.INFO, format="%(levelname)s: %(message)s")
+
+# -----------------------------
+# Config
+# -----------------------------
+REMOTE_SOURCE_RE = re.compile(r'https?://', re.IGNORECASE)
+# MEMEGEN_ALLOW_ANY_URL=1 lets yt-dlp fetch any http(s) URL, not just YouTube
+# (bench/loadTest.py serves its "YouTube" videos from a local HTTP server)
+ALLOW_ANY_URL = os.environ.get("MEMEGEN_ALLOW_ANY_URL", "0").lower() in ("1", "true", "yes", "on")
+FULL_FORMAT = 'bestvideo+bestaudio/best'  # what a full download would fetch
+MAX_SECTION_HEIGHT = 720                  # sections are only used for phone-sized memes
+PROXY_HEIGHT = 240                        # low-res video-only copy for scene analysis
+SECTION_PADDING = 1.0                     # seconds added around each moment
+MANIFEST_NAME = "sections.json"
+
+# -----------------------------
+# Helpers
+# -----------------------------
+_YOUTUBE_ID = re.compile(r"^[A-Za-z0-9_-]{11}$")
+
+
+def youtube_id(url):
+    """The 11-character video id of any common YouTube URL form, or None."""
+    parsed = urlparse(url.strip() if "://" in url else "https://" + url.strip())
+    host = (parsed.hostname or "").lower()
+    if host.startswith("www.") or host.startswith("m."):
+        host = host.split(".", 1)[1]
+    candidate = None
+    if host == "youtu.be":
+        candidate = parsed.path.lstrip("/").split("/")[0]
+    elif host in ("youtube.com", "music.youtube.com", "youtube-nocookie.com"):
+        if parsed.path == "/watch":
+            candidate = (parse_qs(parsed.query).get("v") or [None])[0]
+        else:
+            parts = parsed.path.strip("/").split("/")
+            if len(parts) >= 2 and parts[0] in ("shorts", "embed", "live", "v"):
+                candidate = parts[1]
+    return candidate if candidate and _YOUTUBE_ID.match(candidate) else None
+
+
+def is_remote_source(input_source):
+    """
+    Something yt-dlp should fetch: a YouTube URL, or any http(s) URL when
+    MEMEGEN_ALLOW_ANY_URL is set. Never arbitrary hosts by default, since
+    clients choose the URL.
+    """
+    if not REMOTE_SOURCE_RE.match(input_source):
+        return False
+    return ALLOW_ANY_URL or youtube_id(input_source) is not None
+
+
+def merge_ranges(ranges, padding=SECTION_PADDING):
+    """Pad (start, end) ranges, then merge overlapping ones so nothing is fetched twice."""
+    padded = sorted((max(0.0, float(s) - padding), float(e) + padding) for s, e in ranges)
+    merged = []
+    for start, end in padded:
+        if merged and start <= merged[-1][1]:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+        else:
+            merged.append((start, end))
+    return merged
+
+
+def _section_format(max_height):
+    if not max_height:
+        return 'bestvideo+bestaudio/best'
+    # `<=?` keeps formats whose height is unknown (e.g. a plain .mp4 over HTTP)
+    return f'bestvideo[height<=?{max_height}]+bestaudio/best[height<=?{max_height}]/best'
+
+
+def _content_length(url, headers=None):
+    try:
+        req = urllib.request.Request(url, method="HEAD", headers=headers or {})
+        with urllib.request.urlopen(req, timeout=10) as resp:
+            return int(resp.headers.get("Content-Length") or 0)
+    except Exception:
+        return 0
+
+
+def estimate_full_size(url):
+    """Bytes a full `bestvideo+bestaudio` download of url would transfer (0 if unknown)."""
+    with yt_dlp.YoutubeDL({'format': FULL_FORMAT, 'quiet': True, 'noplaylist': True}) as ydl:
+        info = ydl.extract_info(url, download=False)
+
+    total = 0
+    for fmt in info.get('requested_formats') or [info]:
+        size = fmt.get('filesize') or fmt.get('filesize_approx')
+        if not size and fmt.get('url'):
+            size = _content_length(fmt['url'], fmt.get('http_headers'))
+        total += int(size or 0)
+    return total
+
+# -----------------------------
+# Section download
+# -----------------------------
+def fetch_sections(url, ranges, out_dir, max_height=MAX_SECTION_HEIGHT, padding=SECTION_PADDING, prior_bytes=0):
+    """
+    Download only the given (start, end) time ranges of url at <= max_height,
+    one file per merged range, using yt-dlp's section download.
+    `prior_bytes` is what the ingest already fetched (phase-1 audio, proxy);
+    it is part of bytes_fetched so the comparison with a full download is fair.
+
+    Returns {"sections": [{"start", "end", "path", "bytes"}], "bytes_sections",
+    "bytes_fetched", "bytes_full_estimate"}; the same dict is written to
+    out_dir/sections.json and reused when the same URL/ranges are requested again.
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    merged = merge_ranges(ranges, padding)
+    manifest_path = os.path.join(out_dir, MANIFEST_NAME)
+
+    if os.path.exists(manifest_path):
+        with open(manifest_path, "r", encoding="utf-8") as f:
+            manifest = json.load(f)
+        same_request = (manifest.get("url") == url and manifest.get("max_height") == max_height
+                        and [tuple(r) for r in manifest.get("ranges", [])] == merged)
+        if same_request and all(os.path.exists(s["path"]) for s in manifest["sections"]):
+            logging.info(f"Reusing {len(manifest['sections'])} cached sections from {out_dir}")
+            progress.cache("sections", True)
+            return manifest
+    progress.cache("sections", False)
+
+    sections = []
+    for i, (start, end) in enumerate(merged, start=1):
+        path = os.path.join(out_dir, f"section_{i}.mp4")
+        ydl_opts = {
+            'format': _section_format(max_height),
+            'merge_output_format': 'mp4',
+            'outtmpl': path,
+            'download_ranges': download_range_func(None, [(start, end)]),
+            'force_keyframes_at_cuts': True,  # section starts exactly at `start`
+            'overwrites': True,
+            'quiet': True,
+            'noplaylist': True
+        }
+        with yt_dlp.YoutubeDL(ydl_opts) as ydl:
+            ydl.download([url])
+        size = os.path.getsize(path) if os.path.exists(path) else 0
+        sections.append({"start": start, "end": end, "path": path, "bytes": size})
+
+    bytes_sections = sum(s["bytes"] for s in sections)
+    bytes_fetched = bytes_sections + prior_bytes
+    try:
+        bytes_full = estimate_full_size(url)
+    except Exception as e:
+        logging.warning(f"Could not estimate full download size: {e}")
+        bytes_full = 0
+
+    manifest = {
+        "url": url,
+        "max_height": max_height,
+        "ranges": merged,
+        "sections": sections,
+        "bytes_sections": bytes_sections,
+        "bytes_fetched": bytes_fetched,
+        "bytes_full_estimate": bytes_full,
+    }
+    with open(manifest_path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=4)
+
+    if bytes_full:
+        logging.info(f"Fetched {len(sections)} sections: {bytes_sections / 1e6:.1f} MB, "
+                     f"{bytes_fetched / 1e6:.1f} MB with audio/proxy "
+                     f"vs ~{bytes_full / 1e6:.1f} MB for a full download "
+                     f"({100 * bytes_fetched / bytes_full:.1f}%)")
+    else:
+        logging.info(f"Fetched {len(sections)} sections: {bytes_sections / 1e6:.1f} MB, "
+                     f"{bytes_fetched / 1e6:.1f} MB with audio/proxy")
+    return manifest
+
+
+def section_for(manifest, start, end):
+    """The fetched section covering [start, end], or None."""
+    for section in manifest["sections"]:
+        if section["start"] <= start and end <= section["end"]:
+            return section
+    return None
+
+# -----------------------------
+# Low-res proxy for visual analysis
+# -----------------------------
+def download_proxy(url, out_dir, max_height=PROXY_HEIGHT):
+    """Video-only, low-resolution copy used for scene detection + BLIP."""
+    os.makedirs(out_dir, exist_ok=True)
+    path = os.path.join(out_dir, "proxy.mp4")
+    if os.path.exists(path):
+        return path
+
+    ydl_opts = {
+        'format': f'bestvideo[height<=?{max_height}][ext=mp4]/bestvideo[height<=?{max_height}]/worst',
+        'merge_output_format': 'mp4',
+        'outtmpl': path,
+        'quiet': True,
+        'noplaylist': True
+    }
+    with yt_dlp.YoutubeDL(ydl_opts) as ydl:
+        ydl.download([url])
+    logging.info(f"Downloaded {max_height}p proxy to {path}")
+    return path
+
+# -----------------------------
+# CLI for testing
+# -----------------------------
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(
+        description="Fetch only selected time ranges of a remote video "
+                    "(works with YouTube or e.g. `python -m http.server` serving a sample .mp4)")
+    parser.add_argument("--url", type=str, required=True, help="Video URL")
+    parser.add_argument("--sections", type=str, required=True, help="Comma separated ranges, e.g. 10-15,42.5-47")
+    parser.add_argument("--out", type=str, default=os.path.join("downloads", "range_test"), help="Output folder")
+    parser.add_argument("--max-height", type=int, default=MAX_SECTION_HEIGHT, help="Resolution cap")
+    args = parser.parse_args()
+
+    wanted = [tuple(float(x) for x in part.split("-", 1)) for part in args.sections.split(",")]
+    result = fetch_sections(args.url, wanted, args.out, max_height=args.max_height)
+    print(json.dumps({k: result[k] for k in ("bytes_fetched", "bytes_full_estimate")}, indent=2))
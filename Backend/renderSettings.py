@@ -0,0 +1,120 @@
+# renderSettings.py
+import os
+from PIL import Image
+
+# -----------------------------
+# Full-size image output
+# -----------------------------
+# MEME_IMAGE_FORMAT: jpeg | webp | png   (png is lossless and much larger)
+# MEME_IMAGE_QUALITY: 1-100 for jpeg/webp
+IMAGE_FORMAT = os.environ.get("MEME_IMAGE_FORMAT", "jpeg").lower()
+IMAGE_QUALITY = int(os.environ.get("MEME_IMAGE_QUALITY", "90"))
+
+_EXTENSIONS = {"jpeg": ".jpg", "jpg": ".jpg", "webp": ".webp", "png": ".png"}
+
+# -----------------------------
+# Derivatives for the results gallery
+# -----------------------------
+THUMBS_DIRNAME = "thumbs"
+THUMB_MAX_SIDE = 320
+POSTER_MAX_SIDE = 720
+DERIVATIVE_QUALITY = 70
+
+# -----------------------------
+# Animated GIF/WebP output (opt-in)
+# -----------------------------
+# MEME_ANIMATED_FORMATS: comma separated subset of "gif,webp" rendered next to each MP4
+ANIMATED_FORMATS = [f for f in os.environ.get("MEME_ANIMATED_FORMATS", "").lower().split(",") if f]
+ANIM_MAX_FPS = 12
+ANIM_MAX_SIDE = 480
+ANIM_MIN_SIDE = 160
+ANIM_MAX_SECONDS = 10
+ANIM_MAX_BYTES = int(os.environ.get("MEME_ANIMATED_MAX_BYTES", str(8 * 1024 * 1024)))
+ANIM_WEBP_QUALITY = 60
+
+# -----------------------------
+# Render profiles (clips + final MP4)
+# -----------------------------
+# max_height bounds the shorter side (720 -> 1280x720 landscape, 720x1280 portrait);
+# None keeps the source resolution / frame rate.
+RENDER_PROFILES = {
+    "preview": {"max_height": 360, "crf": 32, "preset": "veryfast", "max_fps": 15, "audio_bitrate": "64k"},
+    "social":  {"max_height": 720, "crf": 26, "preset": "fast", "max_fps": 30, "audio_bitrate": "128k"},
+    "archive": {"max_height": None, "crf": 20, "preset": "medium", "max_fps": None, "audio_bitrate": "192k"},
+}
+DEFAULT_PROFILE = os.environ.get("MEME_RENDER_PROFILE", "social")
+
+# Intermediate clips are re-encoded by the renderer, so they favour speed and keep quality high
+INTERMEDIATE_CRF = 18
+INTERMEDIATE_PRESET = "veryfast"
+
+# -----------------------------
+# Helpers
+# -----------------------------
+def get_profile(name=None):
+    """Profile settings by name (default: MEME_RENDER_PROFILE); raises ValueError for unknown names."""
+    name = name or DEFAULT_PROFILE
+    if name not in RENDER_PROFILES:
+        raise ValueError(f"Unknown render profile '{name}' (choose from {', '.join(RENDER_PROFILES)})")
+    return dict(RENDER_PROFILES[name], name=name)
+
+
+def scale_args(profile):
+    """
+    ffmpeg output options that downscale (never upscale) and cap the frame rate.
+    The scale filter is the first thing after the decoder, so nothing downstream
+    ever touches full-resolution frames.
+    """
+    args = []
+    h = profile.get("max_height")
+    if h:
+        # Bound the shorter side; -2 keeps the aspect ratio with an even dimension
+        args += ["-vf", f"scale=w='if(lt(iw,ih),min(iw,{h}),-2)':h='if(lt(iw,ih),-2,min(ih,{h}))'"]
+    if profile.get("max_fps"):
+        args += ["-fpsmax", str(profile["max_fps"])]
+    return args
+
+
+def image_extension(fmt=None):
+    return _EXTENSIONS.get((fmt or IMAGE_FORMAT).lower(), ".jpg")
+
+
+def save_image(img, path, fmt=None, quality=None):
+    """Save a full-size meme image with the configured codec/quality."""
+    fmt = (fmt or IMAGE_FORMAT).lower()
+    quality = quality or IMAGE_QUALITY
+    if fmt in ("jpeg", "jpg"):
+        img.convert("RGB").save(path, "JPEG", quality=quality, optimize=True, progressive=True)
+    elif fmt == "webp":
+        img.save(path, "WEBP", quality=quality, method=4)
+    else:
+        img.save(path, "PNG", optimize=True)
+    return path
+
+
+def _downscaled(img, max_side):
+    copy = img.copy()
+    copy.thumbnail((max_side, max_side), Image.Resampling.LANCZOS)
+    return copy
+
+
+def derivative_path(output_path, kind):
+    """outputs/.../final_meme_1.mp4 -> outputs/.../thumbs/final_meme_1.mp4.<kind>.webp"""
+    folder, name = os.path.split(output_path)
+    # Keep the extension: final_meme_1.jpg and final_meme_1.mp4 live side by side
+    return os.path.join(folder, THUMBS_DIRNAME, f"{name}.{kind}.webp")
+
+
+def save_derivatives(img, output_path, poster=False):
+    """
+    Write a small WebP thumbnail (and, for video memes, a larger poster frame)
+    from an image that is already in memory. Returns {"thumbnail": path, "poster": path|None}.
+    """
+    os.makedirs(os.path.join(os.path.dirname(output_path), THUMBS_DIRNAME), exist_ok=True)
+
+    paths = {"thumbnail": derivative_path(output_path, "thumb"), "poster": None}
+    _downscaled(img, THUMB_MAX_SIDE).save(paths["thumbnail"], "WEBP", quality=DERIVATIVE_QUALITY, method=4)
+    if poster:
+        paths["poster"] = derivative_path(output_path, "poster")
+        _downscaled(img, POSTER_MAX_SIDE).save(paths["poster"], "WEBP", quality=DERIVATIVE_QUALITY + 10, method=4)
+    return paths
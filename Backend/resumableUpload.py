@@ -0,0 +1,182 @@
+# resumableUpload.py
+import os
+import json
+import time
+import uuid
+import hashlib
+import logging
+import threading
+from contextlib import contextmanager
+from contentHash import CHUNK_SIZE, file_sha256
+from mediaStore import DOWNLOAD_FOLDER, commit_file
+
+# -----------------------------
+# Logging
+# -----------------------------
+logging.basicConfig(level=logging.INFO, format="%(levelname)s: %(message)s")
+
+# -----------------------------
+# Folders / limits
+# -----------------------------
+PARTIAL_DIR = os.path.join(DOWNLOAD_FOLDER, "partial")
+os.makedirs(PARTIAL_DIR, exist_ok=True)
+
+MAX_UPLOAD_SIZE = 20 * 1024 ** 3        # 20 GiB
+RECOMMENDED_CHUNK_SIZE = 8 * 1024 ** 2  # what clients are told to send per request
+
+# One lock per upload so concurrent appends to the same upload can't interleave
+_locks = {}
+_locks_guard = threading.Lock()
+
+
+class UploadError(Exception):
+    """Raised for protocol errors; `status` is the HTTP status to answer with."""
+
+    def __init__(self, message, status=400, offset=None):
+        super().__init__(message)
+        self.status = status
+        self.offset = offset
+
+# -----------------------------
+# Helpers
+# -----------------------------
+@contextmanager
+def _locked(upload_id):
+    """
+    Hold the upload's lock. Unknown ids are rejected before a lock is created,
+    and the lock is dropped once the upload is gone (finalized, aborted).
+    """
+    meta_path, _ = _paths(upload_id)
+    if not os.path.exists(meta_path):
+        with _locks_guard:
+            _locks.pop(upload_id, None)  # e.g. expired by retention since its last request
+        raise UploadError("Unknown upload id", status=404)
+    with _locks_guard:
+        lock = _locks.setdefault(upload_id, threading.Lock())
+    try:
+        with lock:
+            yield
+    finally:
+        if not os.path.exists(meta_path):
+            with _locks_guard:
+                _locks.pop(upload_id, None)
+
+
+def _paths(upload_id):
+    # Upload ids are uuid4 hex; anything else can't map to a file of ours
+    if len(upload_id) != 32 or not all(c in "0123456789abcdef" for c in upload_id):
+        raise UploadError("Unknown upload id", status=404)
+    base = os.path.join(PARTIAL_DIR, upload_id)
+    return base + ".json", base + ".part"
+
+
+def _load(upload_id):
+    meta_path, part_path = _paths(upload_id)
+    if not os.path.exists(meta_path):
+        raise UploadError("Unknown upload id", status=404)
+    with open(meta_path, "r", encoding="utf-8") as f:
+        state = json.load(f)
+    # The bytes on disk are the source of truth for the offset
+    state["offset"] = os.path.getsize(part_path) if os.path.exists(part_path) else 0
+    return state
+
+
+def _save(state):
+    meta_path, _ = _paths(state["id"])
+    tmp_path = meta_path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(state, f)
+    os.replace(tmp_path, meta_path)
+
+# -----------------------------
+# Protocol: create / query / append / finalize / abort
+# -----------------------------
+def create_upload(filename, size, upload_type, sha256=None):
+    if upload_type not in ("video", "photo"):
+        raise UploadError("type must be 'video' or 'photo'")
+    if not isinstance(size, int) or size <= 0:
+        raise UploadError("size must be a positive integer")
+    if size > MAX_UPLOAD_SIZE:
+        raise UploadError(f"File too large (max {MAX_UPLOAD_SIZE} bytes)", status=413)
+
+    state = {
+        "id": uuid.uuid4().hex,
+        "filename": os.path.basename(filename or "upload"),
+        "size": size,
+        "type": upload_type,
+        "sha256": sha256.lower() if sha256 else None,
+        "created": time.time(),
+    }
+    _save(state)
+    open(_paths(state["id"])[1], "wb").close()
+    state["offset"] = 0
+    logging.info(f"Created resumable upload {state['id']} ({size} bytes)")
+    return state
+
+
+def get_upload(upload_id):
+    return _load(upload_id)
+
+
+def append_chunk(upload_id, offset, stream, chunk_sha256=None, chunk_size=CHUNK_SIZE):
+    """
+    Append the bytes read from `stream` at `offset`. The offset must equal the
+    current size (409 otherwise, with the current offset so the client can resume).
+    With chunk_sha256 the chunk is verified and rolled back on mismatch.
+    Memory use is one read buffer regardless of chunk or file size.
+    """
+    with _locked(upload_id):
+        state = _load(upload_id)
+        if offset != state["offset"]:
+            raise UploadError("Offset mismatch", status=409, offset=state["offset"])
+
+        _, part_path = _paths(upload_id)
+        digest = hashlib.sha256()
+        written = 0
+        with open(part_path, "r+b") as f:
+            f.seek(offset)
+            try:
+                for block in iter(lambda: stream.read(chunk_size), b""):
+                    if offset + written + len(block) > state["size"]:
+                        raise UploadError("Chunk exceeds declared upload size", status=413)
+                    digest.update(block)
+                    f.write(block)
+                    written += len(block)
+                if chunk_sha256 and digest.hexdigest() != chunk_sha256.lower():
+                    raise UploadError("Chunk checksum mismatch", status=422)
+            except Exception:
+                # Drop the partial chunk; the client retries from the old offset
+                f.truncate(offset)
+                raise
+
+        return offset + written
+
+
+def finalize_upload(upload_id):
+    """
+    Check the upload is complete (and matches the declared sha256, if any) and
+    move it into the content-addressed store. Returns (stored_path, upload_type).
+    """
+    with _locked(upload_id):
+        state = _load(upload_id)
+        if state["offset"] != state["size"]:
+            raise UploadError("Upload incomplete", status=409, offset=state["offset"])
+
+        meta_path, part_path = _paths(upload_id)
+        digest = file_sha256(part_path)  # streamed, flat memory
+        if state["sha256"] and digest != state["sha256"]:
+            raise UploadError("File checksum mismatch", status=422)
+
+        stored, _, _ = commit_file(part_path, digest, state["filename"])
+        for leftover in (meta_path, part_path + ".sha256.json"):
+            if os.path.exists(leftover):
+                os.remove(leftover)
+    return stored, state["type"]
+
+
+def abort_upload(upload_id):
+    with _locked(upload_id):
+        meta_path, part_path = _paths(upload_id)
+        for path in (meta_path, part_path, part_path + ".sha256.json"):
+            if os.path.exists(path):
+                os.remove(path)
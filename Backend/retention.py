@@ -0,0 +1,288 @@
+# retention.py
+import os
+import time
+import shutil
+import fnmatch
+import logging
+import threading
+from workspace import OUTPUTS_DIR, DOWNLOADS_DIR, JOBS_DIR, job_dir
+
+# -----------------------------
+# Logging
+# -----------------------------
+logging.basicConfig(level=logging.INFO, format="%(levelname)s: %(message)s")
+
+# -----------------------------
+# Config
+# -----------------------------
+GiB = 1024 ** 3
+HOUR = 3600
+DAY = 24 * HOUR
+PHOTO_MEMES_DIR = os.path.join(OUTPUTS_DIR, "photo_memes")
+
+# Every directory class has a size quota (bytes, None = unlimited) and a TTL
+# (seconds since last access, None = forever). Override per class with
+# MEMEGEN_QUOTA_<CLASS> (GiB) and MEMEGEN_TTL_<CLASS> (hours), e.g.
+# MEMEGEN_QUOTA_OUTPUTS=100 or MEMEGEN_TTL_JOBS=6.
+#   dirs:    folders whose entries are evicted
+#   depth:   1 = direct children are the units, 2 = grandchildren (sharded layouts)
+#   match:   only entries whose name matches one of these patterns
+#   exclude: entry names never touched (other classes / live state)
+RETENTION_CLASSES = {
+    "jobs": {  # per-job workspaces left behind by failed/interrupted jobs (kept for retries)
+        "dirs": [JOBS_DIR], "depth": 1, "quota": 10 * GiB, "ttl": 2 * DAY},
+    "intermediates": {  # frames/clips/summaries of CLI runs and of jobs from before per-job workspaces
+        "dirs": [os.path.join(OUTPUTS_DIR, d) for d in ("frames", "clips", "custom_frames", "custom_clips")]
+                + [OUTPUTS_DIR],
+        "depth": 1, "match": ["meme_*.jpg", "meme_*.mp4", "custom_*", "*_summary*.json", "meme_moments.json", "rendered.json"],
+        "quota": 5 * GiB, "ttl": 1 * DAY},
+    "downloads": {  # YouTube downloads, legacy section/proxy folders
+        "dirs": [DOWNLOADS_DIR], "depth": 1, "exclude": ["store", "partial"], "quota": 20 * GiB, "ttl": 3 * DAY},
+    "store": {  # uploaded media, content addressed (store/<sha[:2]>/<sha>.<ext>)
+        "dirs": [os.path.join(DOWNLOADS_DIR, "store")], "depth": 2, "exclude": ["tmp"],
+        "quota": 30 * GiB, "ttl": 14 * DAY},
+    "spools": {  # multipart upload spools a crashed/killed server never committed or discarded
+        "dirs": [os.path.join(DOWNLOADS_DIR, "store", "tmp")], "depth": 1, "quota": None, "ttl": 6 * HOUR},
+    "partial": {  # abandoned resumable uploads
+        "dirs": [os.path.join(DOWNLOADS_DIR, "partial")], "depth": 1, "quota": None, "ttl": 1 * DAY},
+    "cache": {  # visual scene captions, GIF palettes
+        "dirs": [os.path.join(OUTPUTS_DIR, "cache")], "depth": 2, "quota": 5 * GiB, "ttl": 30 * DAY},
+    "profiles": {
+        "dirs": [os.path.join(OUTPUTS_DIR, "profiles")], "depth": 1, "quota": 1 * GiB, "ttl": 7 * DAY},
+    "outputs": {  # final memes (final_outputs/run_*/); evicting one also drops its thumbnails and catalog row
+        "dirs": [os.path.join(OUTPUTS_DIR, "final_outputs")],
+        "depth": 2, "exclude": ["thumbs"], "quota": 50 * GiB, "ttl": 30 * DAY},
+    "photo_outputs": {  # photo memes, flat in photo_memes/; same cleanup as outputs
+        "dirs": [PHOTO_MEMES_DIR], "depth": 1, "exclude": ["thumbs"], "quota": 10 * GiB, "ttl": 30 * DAY},
+}
+
+# Classes whose units are catalogued memes with thumbnails/posters
+OUTPUT_CLASSES = ("outputs", "photo_outputs")
+
+# Files that belong to another file and go with it (hash / keyframe / clip source sidecars)
+COMPANION_SUFFIXES = (".sha256.json", ".keyframes.json", ".source.json")
+
+GC_INTERVAL = int(os.environ.get("MEMEGEN_GC_INTERVAL", "600"))  # seconds between sweeps
+LOW_WATERMARK = 0.9          # an over-quota class is trimmed to 90% of its quota
+TOUCH_GRANULARITY = HOUR     # access times are only rewritten when older than this
+
+
+def _configured(name, spec):
+    spec = dict(spec)
+    quota = os.environ.get(f"MEMEGEN_QUOTA_{name.upper()}")
+    ttl = os.environ.get(f"MEMEGEN_TTL_{name.upper()}")
+    if quota is not None:
+        spec["quota"] = float(quota) * GiB if float(quota) > 0 else None
+    if ttl is not None:
+        spec["ttl"] = float(ttl) * HOUR if float(ttl) > 0 else None
+    return spec
+
+# -----------------------------
+# Access tracking
+# -----------------------------
+def touch(path):
+    """
+    Record a read of `path` for LRU eviction. Most filesystems are mounted
+    relatime/noatime, so the access time is set explicitly (at most hourly).
+    """
+    try:
+        st = os.stat(path)
+        now = time.time()
+        if now - st.st_atime > TOUCH_GRANULARITY:
+            os.utime(path, (now, st.st_mtime))
+    except OSError:
+        pass
+
+# -----------------------------
+# Units (what gets evicted together)
+# -----------------------------
+def _usage(path):
+    """(bytes, last_access) of a file or a whole folder."""
+    if not os.path.isdir(path):
+        st = os.stat(path)
+        return st.st_size, max(st.st_atime, st.st_mtime)
+    size, last = 0, os.stat(path).st_mtime
+    for root, _, files in os.walk(path):
+        for name in files:
+            try:
+                st = os.stat(os.path.join(root, name))
+            except OSError:
+                continue
+            size += st.st_size
+            last = max(last, st.st_atime, st.st_mtime)
+    return size, last
+
+
+def _units(spec):
+    for folder in spec["dirs"]:
+        parents = [folder]
+        for _ in range(spec.get("depth", 1) - 1):
+            parents = [os.path.join(p, d) for p in parents if os.path.isdir(p)
+                       for d in os.listdir(p) if d not in spec.get("exclude", ())
+                       and os.path.isdir(os.path.join(p, d))]
+        for parent in parents:
+            if not os.path.isdir(parent):
+                continue
+            for name in os.listdir(parent):
+                if name in spec.get("exclude", ()) or name.endswith(COMPANION_SUFFIXES):
+                    continue
+                path = os.path.join(parent, name)
+                if "match" in spec:
+                    if not os.path.isfile(path) or not any(fnmatch.fnmatch(name, p) for p in spec["match"]):
+                        continue
+                elif parent == OUTPUTS_DIR:
+                    continue
+                try:
+                    size, last = _usage(path)
+                except OSError:
+                    continue
+                yield path, size, last
+
+
+def _delete(path, class_name):
+    """Remove a unit plus its companions; final memes also leave the catalog. Returns bytes freed."""
+    freed = 0
+    targets = [path] + [path + suffix for suffix in COMPANION_SUFFIXES]
+    if class_name in OUTPUT_CLASSES:
+        from renderSettings import derivative_path
+        targets += [derivative_path(path, kind) for kind in ("thumb", "poster")]
+        try:
+            import memeCatalog
+            memeCatalog.remove_output(os.path.relpath(path, OUTPUTS_DIR).replace(os.sep, "/"))
+        except Exception as e:
+            logging.warning(f"Could not drop {path} from the meme catalog: {e}")
+
+    for target in targets:
+        if not os.path.lexists(target):
+            continue
+        try:
+            size, _ = _usage(target)
+            if os.path.isdir(target) and not os.path.islink(target):
+                shutil.rmtree(target)
+            else:
+                os.remove(target)
+            freed += size
+        except OSError as e:
+            logging.warning(f"Could not delete {target}: {e}")
+
+    parent = os.path.dirname(path)
+    if class_name in ("outputs", "store") and os.path.isdir(parent) and not os.listdir(parent):
+        os.rmdir(parent)  # empty run_* / shard folder
+    return freed
+
+# -----------------------------
+# Sweeps
+# -----------------------------
+def sweep(protected=(), now=None):
+    """
+    One pass over every class: drop units past their TTL, then the least
+    recently used units of classes over quota. `protected` paths (inputs and
+    workspaces of running jobs) are never touched.
+    Returns {class: {"bytes", "units", "reclaimed", "evicted"}}.
+    """
+    now = now or time.time()
+    protected = {os.path.abspath(p) for p in protected if p}
+    report = {}
+    for name, spec in RETENTION_CLASSES.items():
+        spec = _configured(name, spec)
+        units = sorted(_units(spec), key=lambda u: u[2])  # least recently used first
+        total = sum(s for _, s, _ in units)
+        reclaimed, evicted = 0, 0
+        target = spec["quota"] * LOW_WATERMARK if spec.get("quota") else None
+        for path, size, last_access in units:
+            if os.path.abspath(path) in protected:
+                continue
+            expired = spec.get("ttl") is not None and now - last_access > spec["ttl"]
+            over_quota = target is not None and total > spec["quota"] and total - reclaimed > target
+            if not (expired or over_quota):
+                continue
+            freed = _delete(path, name)
+            reclaimed += freed
+            evicted += 1
+        report[name] = {"bytes": total - reclaimed, "units": len(units) - evicted,
+                        "reclaimed": reclaimed, "evicted": evicted}
+        if evicted:
+            logging.info(f"🧹 Retention [{name}]: evicted {evicted} item(s), reclaimed {reclaimed / 1024 ** 2:.1f} MiB")
+    return report
+
+
+def discard_output(path):
+    """Delete one final meme with its derivatives and catalog row. Returns bytes freed."""
+    if not os.path.exists(path):
+        return 0
+    in_photos = os.path.dirname(os.path.abspath(path)) == os.path.abspath(PHOTO_MEMES_DIR)
+    return _delete(path, "photo_outputs" if in_photos else "outputs")
+
+
+def discard_workspace(task_id):
+    """Delete a finished job's intermediates right away. Returns bytes freed."""
+    path = job_dir(task_id)
+    if not os.path.isdir(path):
+        return 0
+    return _delete(path, "jobs")
+
+
+class RetentionManager:
+    """
+    Runs sweep() every GC_INTERVAL seconds on a daemon thread, so request
+    handling never waits on disk cleanup. `protected()` returns paths that
+    must survive the sweep (running jobs' inputs and workspaces);
+    `on_sweep()` runs on every pass as well, for in-memory cleanup.
+    """
+
+    def __init__(self, protected=lambda: (), interval=GC_INTERVAL, on_report=None, on_sweep=None):
+        self.protected = protected
+        self.interval = interval
+        self.on_report = on_report
+        self.on_sweep = on_sweep
+        self.last_report = {}
+        self.last_sweep = None
+        self.reclaimed_total = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="retention", daemon=True)
+
+    def start(self):
+        if self.interval > 0:
+            self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+
+    def record(self, class_name, reclaimed):
+        """Account for bytes freed outside a sweep (e.g. discard_workspace)."""
+        self.reclaimed_total += reclaimed
+        if self.on_report:
+            self.on_report({class_name: {"reclaimed": reclaimed, "evicted": 1 if reclaimed else 0}})
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            if self.on_sweep:
+                try:
+                    self.on_sweep()
+                except Exception as e:
+                    logging.warning(f"Retention cleanup failed: {e}")
+            try:
+                report = sweep(self.protected())
+            except Exception as e:
+                logging.warning(f"Retention sweep failed: {e}")
+                continue
+            self.last_report, self.last_sweep = report, time.time()
+            self.reclaimed_total += sum(r["reclaimed"] for r in report.values())
+            if self.on_report:
+                self.on_report(report)
+
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description="Run one retention sweep over downloads/ and outputs/")
+    parser.add_argument("--dry-run", action="store_true", help="Only report usage per class")
+    args = parser.parse_args()
+    if args.dry_run:
+        for class_name, class_spec in RETENTION_CLASSES.items():
+            found = list(_units(_configured(class_name, class_spec)))
+            print(f"{class_name:<14} {len(found):>6} items {sum(s for _, s, _ in found) / 1024 ** 2:>10.1f} MiB")
+    else:
+        for class_name, r in sweep().items():
+            print(f"{class_name:<14} evicted {r['evicted']:>5}  reclaimed {r['reclaimed'] / 1024 ** 2:>9.1f} MiB  "
+                  f"now {r['bytes'] / 1024 ** 2:>9.1f} MiB")
@@ -0,0 +1,106 @@
+# singleFlight.py
+import os
+import time
+import threading
+import mediaStore
+from rangeFetch import youtube_id
+
+# -----------------------------
+# Config
+# -----------------------------
+ALIAS_TTL = 24 * 3600  # seconds a finished job's followers still resolve to it
+
+# -----------------------------
+# Job keys
+# -----------------------------
+def job_key(input_path, input_type, profile=None):
+    """
+    Jobs with the same key produce the same memes: same video (normalized
+    YouTube id or upload content hash), same input type, same render profile.
+    """
+    if input_type == "youtube":
+        source = f"yt:{youtube_id(input_path) or input_path.strip()}"
+    elif mediaStore.is_stored(input_path):
+        source = f"sha:{os.path.basename(input_path).split('.', 1)[0]}"  # store files are named by sha256
+    else:
+        source = f"path:{os.path.abspath(input_path)}"
+    return f"{input_type}|{source}|{profile or ''}"
+
+# -----------------------------
+# Registry
+# -----------------------------
+class SingleFlight:
+    """
+    At most one running job per key. A later submission of the same key gets
+    its own task id as a follower of the running job (the leader) and
+    resolves to the leader's progress and results.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._leaders = {}    # key -> leader task id (only while the job runs)
+        self._followers = {}  # leader task id -> [follower task ids]
+        self._alias = {}      # follower task id -> leader task id (kept ALIAS_TTL after the job ends)
+        self._finished = {}   # leader task id -> (end time, its followers) for alias expiry
+
+    def join(self, key, task_id):
+        """Register task_id under key. Returns the leader it now follows, or None if it leads."""
+        with self._lock:
+            self._expire()
+            leader = self._leaders.get(key)
+            if leader is None:
+                self._leaders[key] = task_id
+                self._followers[task_id] = []
+                return None
+            self._followers[leader].append(task_id)
+            self._alias[task_id] = leader
+            return leader
+
+    def lead(self, key, task_id):
+        """
+        Register task_id as the running job of key unless another job already
+        is (then it runs unshared). Used for resumed/retried tasks, which keep
+        their own id and workspace instead of following. Returns True if it leads.
+        """
+        with self._lock:
+            if self._leaders.get(key) not in (None, task_id):
+                return False
+            self._leaders[key] = task_id
+            self._followers.setdefault(task_id, [])
+            return True
+
+    def done(self, leader):
+        """The leader's job ended; new submissions of its key start a fresh job."""
+        with self._lock:
+            for key, task_id in list(self._leaders.items()):
+                if task_id == leader:
+                    del self._leaders[key]
+            followers = self._followers.pop(leader, None)
+            if followers is not None:  # it led a key (never registered: nothing to expire)
+                self._finished[leader] = (time.time(), followers)
+            self._expire()
+
+    def _expire(self, now=None):
+        """Forget the followers of jobs that ended more than ALIAS_TTL ago."""
+        cutoff = (now or time.time()) - ALIAS_TTL
+        for leader, (ended, followers) in list(self._finished.items()):
+            if ended > cutoff:
+                continue
+            del self._finished[leader]
+            for task_id in followers:
+                if self._alias.get(task_id) == leader:
+                    del self._alias[task_id]
+
+    def detach(self, task_id):
+        """A follower stops following (cancelled it)."""
+        with self._lock:
+            leader = self._alias.pop(task_id, None)
+            if leader and task_id in self._followers.get(leader, []):
+                self._followers[leader].remove(task_id)
+
+    def leader(self, task_id):
+        return self._alias.get(task_id, task_id)
+
+    def followers(self, leader):
+        with self._lock:
+            return list(self._followers.get(leader, []))
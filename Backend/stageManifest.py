@@ -0,0 +1,112 @@
+# stageManifest.py
+import os
+import json
+import time
+import hashlib
+
+# -----------------------------
+# Config
+# -----------------------------
+# After a pipeline step succeeds, allfour.py writes <workdir>/manifests/<step>.json:
+# what went in (command line, source file fingerprint, upstream outputs) and the
+# files that came out (size + mtime). A retried or resumed job skips every step
+# whose manifest still matches, so a failed render does not redo the download
+# and Whisper.
+MANIFEST_DIR = "manifests"
+IGNORED_NAMES = {MANIFEST_DIR, "cpu_budget", "cpu_budget.tmp", "task.json"}
+
+
+def _slug(step):
+    return "".join(c if c.isalnum() else "_" for c in step.lower()).strip("_")
+
+
+def manifest_path(workdir, step):
+    return os.path.join(workdir, MANIFEST_DIR, f"{_slug(step)}.json")
+
+# -----------------------------
+# Fingerprints
+# -----------------------------
+def file_fingerprint(path):
+    st = os.stat(path)
+    return [st.st_size, st.st_mtime_ns]
+
+
+def source_fingerprint(source):
+    """Local input files by size/mtime; anything else (YouTube URL) by value."""
+    if os.path.isfile(source):
+        return {"path": os.path.abspath(source), "file": file_fingerprint(source)}
+    return {"url": source}
+
+
+def snapshot(folder, recursive=True):
+    """{path: [size, mtime_ns]} of the files in folder (manifests and governor files excluded)."""
+    files = {}
+    if not os.path.isdir(folder):
+        return files
+    for root, dirs, names in os.walk(folder):
+        dirs[:] = [d for d in dirs if d not in IGNORED_NAMES] if recursive else []
+        for name in names:
+            if name in IGNORED_NAMES:
+                continue
+            path = os.path.join(root, name)
+            try:
+                files[path] = file_fingerprint(path)
+            except OSError:
+                continue
+    return files
+
+
+def changed(before, after):
+    """Files that are new or were rewritten between two snapshots."""
+    return {path: fp for path, fp in after.items() if before.get(path) != fp}
+
+
+def digest(outputs):
+    """Short hash of a step's outputs, used as the next step's upstream input."""
+    return hashlib.sha256(json.dumps(outputs, sort_keys=True).encode("utf-8")).hexdigest()[:16]
+
+# -----------------------------
+# Manifests
+# -----------------------------
+def load(workdir, step):
+    try:
+        with open(manifest_path(workdir, step), "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def is_valid(manifest, inputs):
+    """The step ran with these inputs and every file it produced is still there, unchanged."""
+    if not manifest or manifest.get("inputs") != json.loads(json.dumps(inputs)):
+        return False
+    for path, fp in manifest.get("outputs", {}).items():
+        try:
+            if file_fingerprint(path) != fp:
+                return False
+        except OSError:
+            return False
+    return True
+
+
+def write(workdir, step, inputs, outputs, duration=None):
+    path = manifest_path(workdir, step)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    manifest = {"step": step, "inputs": inputs, "outputs": outputs,
+                "completed": time.time(), "duration": duration}
+    tmp = f"{path}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(tmp, path)
+    return manifest
+
+
+def invalidate_from(workdir, steps, first):
+    """Drop the manifests of `first` and every step after it (forces them to re-run)."""
+    if first not in steps:
+        return
+    for step in steps[steps.index(first):]:
+        try:
+            os.remove(manifest_path(workdir, step))
+        except OSError:
+            pass
@@ -0,0 +1,83 @@
+# taskControl.py
+import os
+import time
+import signal
+import logging
+import threading
+
+# -----------------------------
+# Config
+# -----------------------------
+# MEMEGEN_CANCEL_GRACE:     seconds between SIGTERM and SIGKILL when cancelling a job
+# MEMEGEN_ABANDON_TIMEOUT:  cancel a running job nobody has polled (/status, /results,
+#                           an open /events stream) for this many seconds; 0 = never
+CANCEL_GRACE = float(os.environ.get("MEMEGEN_CANCEL_GRACE", "5"))
+ABANDON_TIMEOUT = float(os.environ.get("MEMEGEN_ABANDON_TIMEOUT", "300"))
+WATCHDOG_INTERVAL = 15  # seconds between abandoned-job checks
+
+
+class TaskCancelled(Exception):
+    """Raised inside a job once it has been cancelled."""
+
+# -----------------------------
+# Process trees
+# -----------------------------
+def popen_kwargs():
+    """
+    Start the pipeline in its own session, so the job's process group holds
+    allfour.py, every step, and the ffmpeg/yt-dlp children they spawn.
+    """
+    return {"start_new_session": True} if hasattr(os, "killpg") else {}
+
+
+def kill_tree(proc, grace=CANCEL_GRACE):
+    """SIGTERM the whole process group of `proc`, then SIGKILL whatever is left after `grace` seconds."""
+    if proc.poll() is not None:
+        return
+    if not hasattr(os, "killpg"):
+        proc.terminate()
+        return
+    try:
+        os.killpg(proc.pid, signal.SIGTERM)  # ffmpeg finishes the current packet and exits cleanly
+    except ProcessLookupError:
+        return
+
+    def force():
+        try:
+            os.killpg(proc.pid, signal.SIGKILL)
+        except ProcessLookupError:
+            pass
+
+    timer = threading.Timer(grace, force)
+    timer.daemon = True
+    timer.start()
+
+# -----------------------------
+# Abandoned jobs
+# -----------------------------
+class AbandonWatchdog:
+    """
+    Cancels running jobs whose last client poll is older than `timeout`.
+    `running()` yields (task_id, last_seen) pairs; `cancel(task_id)` stops one.
+    """
+
+    def __init__(self, running, cancel, timeout=ABANDON_TIMEOUT, interval=WATCHDOG_INTERVAL):
+        self.running = running
+        self.cancel = cancel
+        self.timeout = timeout
+        self.interval = interval
+        self._thread = threading.Thread(target=self._run, name="abandon-watchdog", daemon=True)
+
+    def start(self):
+        if self.timeout > 0:
+            self._thread.start()
+        return self
+
+    def _run(self):
+        while True:
+            time.sleep(self.interval)
+            now = time.time()
+            for task_id, last_seen in list(self.running()):
+                if now - last_seen > self.timeout:
+                    logging.info(f"Task {task_id} not polled for {now - last_seen:.0f}s, cancelling")
+                    self.cancel(task_id, "abandoned")
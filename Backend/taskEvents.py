@@ -0,0 +1,76 @@
+# taskEvents.py
+import time
+import threading
+
+# -----------------------------
+# Per-task event log
+# -----------------------------
+TERMINAL_EVENTS = ("done", "error")
+
+
+class TaskEvents:
+    """
+    Append-only event list per task plus a condition variable, so any number
+    of SSE streams can block until something new happens. Event ids count up
+    per task, which makes Last-Event-ID resumes trivial. A retried task starts
+    a new attempt: earlier events are dropped and ids carry on from there, so
+    streams only ever see the current attempt.
+    """
+
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._events = {}  # { task_id: [ {"id", "event", "data", "time"} ] } (current attempt)
+        self._base = {}    # { task_id: id of the last event of earlier attempts }
+
+    def new_attempt(self, task_id):
+        """Forget the task's earlier events (a retry or resume is starting)."""
+        with self._cond:
+            self._base[task_id] = self._last_id(task_id)
+            self._events[task_id] = []
+
+    def forget(self, task_id):
+        """Drop everything about a task (its state expired)."""
+        with self._cond:
+            self._events.pop(task_id, None)
+            self._base.pop(task_id, None)
+
+    def last_time(self, task_id):
+        with self._cond:
+            events = self._events.get(task_id)
+            return events[-1]["time"] if events else None
+
+    def _last_id(self, task_id):
+        events = self._events.get(task_id)
+        return events[-1]["id"] if events else self._base.get(task_id, 0)
+
+    def _after(self, task_id, after):
+        return list(self._events.get(task_id, [])[max(0, after - self._base.get(task_id, 0)):])
+
+    def publish(self, task_id, event, **data):
+        with self._cond:
+            event_id = self._last_id(task_id) + 1
+            self._events.setdefault(task_id, []).append(
+                {"id": event_id, "event": event, "data": data, "time": time.time()})
+            self._cond.notify_all()
+
+    def since(self, task_id, after=0):
+        with self._cond:
+            return self._after(task_id, after)
+
+    def wait(self, task_id, after=0, timeout=15.0):
+        """Events with id > after, waiting up to timeout seconds for at least one."""
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            while self._last_id(task_id) <= after:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return []
+                self._cond.wait(remaining)
+            return self._after(task_id, after)
+
+    def current_stage(self, task_id):
+        with self._cond:
+            for e in reversed(self._events.get(task_id, [])):
+                if e["event"] == "stage":
+                    return e["data"].get("stage")
+        return None
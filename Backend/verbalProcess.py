@@ -2,10 +2,14 @@
 import os
 import re
 import json
-import glob
-import whisper
+import shutil
+import tempfile
 import yt_dlp
 import logging
+from rangeFetch import is_remote_source
+import progress
+import models
+from workspace import work_dir, DOWNLOADS_DIR
 
 # -----------------------------
 # Logging
@@ -15,17 +19,15 @@ logging.basicConfig(level=logging.INFO, format="%(levelname)s: %(message)s")
 # -----------------------------
 # Folders
 # -----------------------------
-OUTPUT_FOLDER = "outputs"
-DOWNLOAD_FOLDER = "downloads"
+OUTPUT_FOLDER = work_dir()  # job workspace when run by app.py
+DOWNLOAD_FOLDER = DOWNLOADS_DIR
 os.makedirs(OUTPUT_FOLDER, exist_ok=True)
 os.makedirs(DOWNLOAD_FOLDER, exist_ok=True)
 
 # -----------------------------
-# Global Whisper model
+# Whisper model: loaded on first use, or served by modelServer.py (see models.py)
 # -----------------------------
-GLOBAL_MODEL_SIZE = "base"
-logging.info(f"Loading default Whisper model ({GLOBAL_MODEL_SIZE})...")
-global_model = whisper.load_model(GLOBAL_MODEL_SIZE)
+GLOBAL_MODEL_SIZE = models.WHISPER_MODEL_SIZE
 
 # -----------------------------
 # Helper: Download full video (like visualProcess)
@@ -51,28 +53,16 @@ def download_video(url, download_folder=DOWNLOAD_FOLDER):
     return filename
 
 # -----------------------------
-# Helper: Download audio OR reuse existing video
+# Helper: Download audio only (phase 1 of the two-phase ingest)
 # -----------------------------
-def download_audio_or_get_existing(url, download_folder=DOWNLOAD_FOLDER):
+def download_audio(url, folder=None):
     """
-    If an existing full video exists, reuse it. Otherwise download audio-only.
-    Returns path and boolean: True if downloaded audio-only temp file, False otherwise.
+    Audio-only download into a fresh folder of this job's workspace, so no
+    other job can pick it up (or delete it) and it goes away with the job.
+    The caller removes the folder once the audio is transcribed.
     """
     base_name = re.sub(r'[<>:"/\\|?*]', '_', url.split("youtu")[-1])
-    # Check for existing mp4 (video or audio)
-    pattern = os.path.join(download_folder, f"{base_name}*.mp4")
-    existing = glob.glob(pattern)
-    if existing:
-        chosen = max(existing, key=os.path.getmtime)
-        logging.info(f"Found existing downloaded file, reusing: {chosen}")
-        return chosen, False
-
-    # No existing file: download audio-only
-    filename = os.path.join(download_folder, f"{base_name}.mp4")
-    counter = 1
-    while os.path.exists(filename):
-        filename = os.path.join(download_folder, f"{base_name}({counter}).mp4")
-        counter += 1
+    filename = os.path.join(tempfile.mkdtemp(prefix="audio_", dir=folder or work_dir()), f"{base_name}.mp4")
 
     ydl_opts = {
         'format': 'bestaudio/best',
@@ -83,16 +73,14 @@ def download_audio_or_get_existing(url, download_folder=DOWNLOAD_FOLDER):
     with yt_dlp.YoutubeDL(ydl_opts) as ydl:
         ydl.download([url])
     logging.info(f"Downloaded audio-only to {filename}")
-    return filename, True
+    return filename
 
 # -----------------------------
 # Helper: Transcribe audio
 # -----------------------------
 def transcribe_audio(file_path, model_size="base", fp16=False):
     logging.info(f"Transcribing {file_path} using Whisper ({model_size})...")
-    model = global_model if model_size == GLOBAL_MODEL_SIZE else whisper.load_model(model_size)
-    result = model.transcribe(file_path, fp16=fp16)
-    segments = result["segments"]
+    segments = models.transcribe(file_path, model_size=model_size, fp16=fp16)
     logging.info(f"Transcription done. {len(segments)} segments detected.")
     return segments
 
@@ -132,30 +120,37 @@ def process_verbal(input_source, model_size="base", fp16=False, keep_video=True)
     Returns transcription result and ensures video is saved if requested.
     """
     downloaded_temp = False
+    bytes_downloaded = 0
 
-    if re.match(r'https?://(www\.)?youtu', input_source):
+    if is_remote_source(input_source):
+        progress.stage("downloading")
         if keep_video:
             # Download full video and reuse it for transcription
             file_path = download_video(input_source)
             source_type = "youtube"
         else:
-            # Use original audio-only method
-            file_path, downloaded_temp = download_audio_or_get_existing(input_source)
+            # Audio-only (phase 1 of the two-phase ingest; video sections are fetched later)
+            file_path = download_audio(input_source)
+            downloaded_temp = True
             source_type = "youtube"
+        if os.path.exists(file_path):
+            progress.add_bytes(bytes_in=os.path.getsize(file_path))
+            if downloaded_temp:
+                bytes_downloaded = os.path.getsize(file_path)
     else:
         file_path = input_source  # local file
         source_type = "local"
 
-    segments = transcribe_audio(file_path, model_size=model_size, fp16=fp16)
-    result = save_transcript_json(file_path, segments, source_type)
-
-    # Delete temporary audio-only file if needed
-    if downloaded_temp:
-        try:
-            os.remove(file_path)
+    progress.stage("transcribing")
+    try:
+        segments = transcribe_audio(file_path, model_size=model_size, fp16=fp16)
+    finally:
+        # Delete the job's temporary audio-only download (also when Whisper failed)
+        if downloaded_temp:
+            shutil.rmtree(os.path.dirname(file_path), ignore_errors=True)
             logging.info(f"Deleted temporary audio file: {file_path}")
-        except Exception as e:
-            logging.warning(f"Could not delete temporary file {file_path}: {e}")
+    result = save_transcript_json(file_path, segments, source_type)
+    result["bytes_downloaded"] = bytes_downloaded  # phase-1 audio, counted in the section fetch savings
 
     return result
 
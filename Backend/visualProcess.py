@@ -3,12 +3,15 @@ import os
 import re
 import json
 import cv2
-import torch
 from PIL import Image
-from transformers import BlipProcessor, BlipForConditionalGeneration
-from scenedetect import ContentDetector, SceneManager, open_video
 import yt_dlp
+import hashlib
 import logging
+from contentHash import file_sha256
+import progress
+import models
+from workspace import work_dir, OUTPUTS_DIR, DOWNLOADS_DIR
+from retention import touch
 
 # -----------------------------
 # Logging
@@ -18,17 +21,16 @@ logging.basicConfig(level=logging.INFO, format='%(levelname)s: %(message)s')
 # -----------------------------
 # Folders
 # -----------------------------
-OUTPUT_FOLDER = "outputs"
-os.makedirs(OUTPUT_FOLDER, exist_ok=True)
-DOWNLOAD_FOLDER = "downloads"
+OUTPUT_FOLDER = work_dir()  # job workspace when run by app.py
+DOWNLOAD_FOLDER = DOWNLOADS_DIR
 os.makedirs(DOWNLOAD_FOLDER, exist_ok=True)
+VISUAL_CACHE_DIR = os.path.join(OUTPUTS_DIR, "cache", "visual")  # shared across jobs
+os.makedirs(VISUAL_CACHE_DIR, exist_ok=True)
 
 # -----------------------------
-# Global BLIP model
+# BLIP model: loaded on first caption, or served by modelServer.py (see models.py)
 # -----------------------------
-device = "cuda" if torch.cuda.is_available() else "cpu"
-processor = BlipProcessor.from_pretrained("Salesforce/blip-image-captioning-base")
-model = BlipForConditionalGeneration.from_pretrained("Salesforce/blip-image-captioning-base").to(device)
+BLIP_MODEL_ID = models.BLIP_MODEL_ID
 
 # -----------------------------
 # Helper: Download YouTube video (video + audio, merged to mp4)
@@ -55,48 +57,219 @@ def download_video(url, download_folder=DOWNLOAD_FOLDER):
     logging.info(f"Downloaded video (with audio) to {filename}")
     return filename
 
+# -----------------------------
+# Helper: Single-pass scene detection
+# -----------------------------
+ANALYSIS_WIDTH = 320      # frames are downscaled to this width for cut detection
+CAPTION_MAX_SIDE = 640    # midpoint candidates kept at this size for BLIP (it resizes to 384 anyway)
+MIN_SCENE_LEN = 15        # frames, same default as PySceneDetect's ContentDetector
+SAMPLES_PER_SCENE = 32    # bounded midpoint candidate buffer per scene
+CAPTION_BATCH_SIZE = 8
+
+
+class _MidpointSampler:
+    """
+    Keeps a bounded, evenly spaced subset of a scene's frames while it is being
+    decoded. Whenever the buffer fills up every other sample is dropped and the
+    sampling stride doubles, so the middle sample always sits within one stride
+    of the true midpoint without knowing the scene length in advance.
+    """
+
+    def __init__(self, start_frame, capacity=SAMPLES_PER_SCENE):
+        self.start_frame = start_frame
+        self.capacity = capacity
+        self.stride = 1
+        self.samples = []
+
+    def wants(self, frame_no):
+        return (frame_no - self.start_frame) % self.stride == 0
+
+    def add(self, image):
+        self.samples.append(image)
+        if len(self.samples) > self.capacity:
+            self.samples = self.samples[::2]
+            self.stride *= 2
+
+    def middle(self):
+        return self.samples[len(self.samples) // 2] if self.samples else None
+
+
+def _resize_to_width(frame, width):
+    h, w = frame.shape[:2]
+    if w <= width:
+        return frame
+    return cv2.resize(frame, (width, int(h * width / w)), interpolation=cv2.INTER_AREA)
+
+
+def _caption_image(frame):
+    h, w = frame.shape[:2]
+    scale = min(1.0, CAPTION_MAX_SIDE / max(h, w))
+    if scale < 1.0:
+        frame = cv2.resize(frame, (int(w * scale), int(h * scale)), interpolation=cv2.INTER_AREA)
+    return Image.fromarray(cv2.cvtColor(frame, cv2.COLOR_BGR2RGB))
+
+
+def _timecode(frame_no, fps):
+    seconds = frame_no / fps
+    h, rem = divmod(seconds, 3600)
+    m, s = divmod(rem, 60)
+    return f"{int(h):02d}:{int(m):02d}:{s:06.3f}"
+
+
+def detect_scenes(video_path, on_scenes, threshold=30.0, max_scenes=None, frame_skip=0, start_frame=0,
+                  batch_size=CAPTION_BATCH_SIZE):
+    """
+    Decode the video once, sequentially, and in the same loop:
+      * detect content cuts on a downscaled HSV frame (ContentDetector-style score)
+      * keep a bounded set of candidate frames for each scene's midpoint
+    Closed scenes are handed to on_scenes(scenes, fps) batch_size at a time, as
+    [(start_frame, end_frame, PIL midpoint image)], so only one batch of
+    midpoint images is held at once. Returns (scene count, fps, complete);
+    complete is False when decoding stopped early because max_scenes scenes were closed.
+    start_frame resumes detection at a previously found cut.
+    """
+    cap = cv2.VideoCapture(video_path)
+    if not cap.isOpened():
+        raise RuntimeError(f"Could not open video: {video_path}")
+    fps = cap.get(cv2.CAP_PROP_FPS) or 25
+    if start_frame:
+        cap.set(cv2.CAP_PROP_POS_FRAMES, start_frame)
+
+    pending = []
+    found = 0
+    complete = True
+    prev_hsv = None
+    scene_start = start_frame
+    sampler = _MidpointSampler(start_frame)
+    frame_no = start_frame - 1
+
+    try:
+        while True:
+            if not cap.grab():
+                break
+            frame_no += 1
+            analyse = frame_skip == 0 or frame_no % (frame_skip + 1) == 0
+            if not analyse and not sampler.wants(frame_no):
+                continue
+
+            ret, frame = cap.retrieve()
+            if not ret:
+                break
+
+            if analyse:
+                small = _resize_to_width(frame, ANALYSIS_WIDTH)
+                hsv = cv2.cvtColor(small, cv2.COLOR_BGR2HSV).astype("int16")
+                if prev_hsv is not None:
+                    # Mean absolute change of hue, saturation and value, averaged
+                    score = float(abs(hsv - prev_hsv).mean())
+                    if score >= threshold and frame_no - scene_start >= MIN_SCENE_LEN:
+                        pending.append((scene_start, frame_no, sampler.middle()))
+                        found += 1
+                        if max_scenes is not None and found >= max_scenes:
+                            complete = False
+                            break
+                        if len(pending) >= batch_size:
+                            on_scenes(pending, fps)
+                            pending = []
+                        scene_start = frame_no
+                        sampler = _MidpointSampler(frame_no)
+                prev_hsv = hsv
+
+            if sampler.wants(frame_no):
+                sampler.add(_caption_image(frame))
+    finally:
+        cap.release()
+
+    # Close the final scene (or the whole video when no cut was found)
+    if frame_no >= scene_start and (max_scenes is None or found < max_scenes):
+        middle = sampler.middle()
+        if middle is not None:
+            pending.append((scene_start, frame_no + 1, middle))
+            found += 1
+    if pending:
+        on_scenes(pending, fps)
+
+    logging.info(f"Detected {found} scenes in a single pass over {frame_no + 1 - start_frame} frames")
+    return found, fps, complete
+
+# -----------------------------
+# Helper: Batched BLIP captioning
+# -----------------------------
+def caption_images(images, max_new_tokens=20, batch_size=CAPTION_BATCH_SIZE):
+    return models.caption_images(images, max_new_tokens=max_new_tokens, batch_size=batch_size)
+
+# -----------------------------
+# Helper: Scene/caption cache
+# -----------------------------
+def _cache_path(video_path, threshold, max_new_tokens):
+    """Cache entries are keyed by video content, detector threshold and captioning model."""
+    key = f"{file_sha256(video_path)}|{threshold}|{BLIP_MODEL_ID}|{max_new_tokens}"
+    return os.path.join(VISUAL_CACHE_DIR, hashlib.sha256(key.encode()).hexdigest()[:32] + ".json")
+
+
+def _load_cache(cache_file):
+    if os.path.exists(cache_file):
+        try:
+            with open(cache_file, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            logging.warning(f"Ignoring unreadable visual cache {cache_file}")
+    return {"fps": None, "complete": False, "scenes": []}
+
+
+def _save_cache(cache_file, cached):
+    tmp_file = cache_file + ".tmp"
+    with open(tmp_file, "w", encoding="utf-8") as f:
+        json.dump(cached, f)
+    os.replace(tmp_file, cache_file)
+
 # -----------------------------
 # Helper: Generate captions
 # -----------------------------
 def generate_captions(video_path, threshold=30.0, max_new_tokens=20, max_scenes=None):
-    video = open_video(video_path)
-    scene_manager = SceneManager()
-    scene_manager.add_detector(ContentDetector(threshold=threshold))
-    scene_manager.detect_scenes(video)
-    scene_list = scene_manager.get_scene_list()
-    logging.info(f"Detected {len(scene_list)} scenes")
+    cache_file = _cache_path(video_path, threshold, max_new_tokens)
+    cached = _load_cache(cache_file)
+    scenes = cached["scenes"]
 
-    cap = cv2.VideoCapture(video_path)
-    captions = []
+    hit = cached["complete"] or (max_scenes is not None and len(scenes) >= max_scenes)
+    progress.cache("visual", hit)
+    if hit:
+        touch(cache_file)
+        logging.info(f"Visual cache hit: reusing {len(scenes)} cached scenes from {cache_file}")
+    else:
+        # Resume detection at the last cached cut and only caption the new scenes
+        resume_frame = scenes[-1]["end"] if scenes else 0
+        remaining = None if max_scenes is None else max_scenes - len(scenes)
+        if scenes:
+            logging.info(f"Visual cache: reusing {len(scenes)} scenes, resuming at frame {resume_frame}")
 
-    scenes_to_process = scene_list if max_scenes is None else scene_list[:max_scenes]
-    for i, (start, end) in enumerate(scenes_to_process):
-        middle_frame = int((start.get_frames() + end.get_frames()) / 2)
-        cap.set(cv2.CAP_PROP_POS_FRAMES, middle_frame)
-        ret, frame = cap.read()
-        if not ret:
-            continue
+        def caption_batch(batch, fps):
+            # Caption and persist each batch as it closes: a crash mid-video
+            # keeps the scenes done so far for the resume above
+            texts = caption_images([middle for _, _, middle in batch], max_new_tokens)
+            scenes.extend({"start": start, "end": end, "caption": caption}
+                          for (start, end, _), caption in zip(batch, texts))
+            cached.update(fps=fps, scenes=scenes)
+            _save_cache(cache_file, cached)
 
-        image = Image.fromarray(cv2.cvtColor(frame, cv2.COLOR_BGR2RGB))
-        inputs = processor(images=image, return_tensors="pt")
-        inputs = {k: v.to(device) for k, v in inputs.items()}
-        out = model.generate(**inputs, max_new_tokens=max_new_tokens)
-        caption = processor.decode(out[0], skip_special_tokens=True)
+        _, fps, complete = detect_scenes(video_path, caption_batch, threshold, remaining, start_frame=resume_frame)
+        cached.update(fps=fps, complete=complete, scenes=scenes)
+        _save_cache(cache_file, cached)
 
+    fps = cached["fps"] or 25
+    selected = scenes if max_scenes is None else scenes[:max_scenes]
+    captions = []
+    for i, scene in enumerate(selected):
         captions.append({
             "id": i + 1,
-            "start_time": str(start),
-            "end_time": str(end),
-            "caption": caption
+            "start_time": _timecode(scene["start"], fps),
+            "end_time": _timecode(scene["end"], fps),
+            "caption": scene["caption"]
         })
-    cap.release()
 
+    # One summary per video, overwritten on re-runs instead of piling up (n) copies
     base_name = os.path.splitext(os.path.basename(video_path))[0]
     json_file = os.path.join(OUTPUT_FOLDER, f"{base_name}_visual_summary.json")
-    counter = 1
-    while os.path.exists(json_file):
-        json_file = os.path.join(OUTPUT_FOLDER, f"{base_name}_visual_summary({counter}).json")
-        counter += 1
 
     output = {
         "video": video_path,
@@ -0,0 +1,30 @@
+# workspace.py
+import os
+
+# -----------------------------
+# Paths
+# -----------------------------
+# Jobs started by app.py get a private workspace (outputs/jobs/<task_id>) for
+# their intermediates: summaries, meme_moments.json, frames, clips, fetched
+# sections. The pipeline steps find it in MEMEGEN_WORKDIR; plain CLI runs
+# keep using outputs/ as before.
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+# MEMEGEN_DATA_DIR moves outputs/ and downloads/ (catalog, memes, media store)
+# elsewhere; benchmarks and load tests point it at a throwaway folder
+DATA_DIR_ENV = "MEMEGEN_DATA_DIR"
+DATA_DIR = os.path.abspath(os.environ.get(DATA_DIR_ENV) or BASE_DIR)
+OUTPUTS_DIR = os.path.join(DATA_DIR, "outputs")
+DOWNLOADS_DIR = os.path.join(DATA_DIR, "downloads")
+JOBS_DIR = os.path.join(OUTPUTS_DIR, "jobs")
+WORKDIR_ENV = "MEMEGEN_WORKDIR"
+
+
+def job_dir(task_id):
+    return os.path.join(JOBS_DIR, task_id)
+
+
+def work_dir():
+    """Intermediates folder for this process (created on first use)."""
+    path = os.environ.get(WORKDIR_ENV) or OUTPUTS_DIR
+    os.makedirs(path, exist_ok=True)
+    return path
@@ -8,14 +8,72 @@ document.addEventListener('DOMContentLoaded', () => {
     const loading = document.getElementById('loading');
     const resultsGrid = document.getElementById('resultsGrid');
     
-    // If task_id is provided, poll for status
+    // If task_id is provided, follow the task (push events, polling as fallback)
     if (taskId) {
-        pollTaskStatus(taskId);
+        if (window.EventSource) {
+            followTaskEvents(taskId);
+        } else {
+            pollTaskStatus(taskId);
+        }
     } else {
         // Otherwise fetch all recent memes
         fetchAllMemes();
     }
     
+    const STAGE_LABELS = {
+        queued: 'Waiting in queue...',
+        downloading: 'Downloading video...',
+        transcribing: 'Transcribing audio...',
+        analyzing: 'Analyzing scenes...',
+        detecting: 'Finding meme-worthy moments...',
+        extracting: 'Extracting frames and clips...',
+        rendering: 'Rendering your memes...'
+    };
+
+    function setLoadingText(text) {
+        const label = loading.querySelector('.loading-text');
+        if (label) label.textContent = text;
+    }
+
+    // Server-Sent Events: stage changes and finished memes are pushed to us
+    function followTaskEvents(taskId) {
+        const source = new EventSource(`http://127.0.0.1:5000/events/${taskId}`);
+        let finished = false;
+        let rendered = 0;
+
+        source.addEventListener('stage', e => {
+            const { stage } = JSON.parse(e.data);
+            if (STAGE_LABELS[stage]) setLoadingText(STAGE_LABELS[stage]);
+        });
+        source.addEventListener('meme', () => {
+            // Count finished memes while the rest are still rendering
+            rendered += 1;
+            setLoadingText(`Rendering your memes... (${rendered} ready)`);
+        });
+        source.addEventListener('done', e => {
+            finished = true;
+            source.close();
+            loading.style.display = 'none';
+            displayMemes(JSON.parse(e.data).memes);
+        });
+        source.addEventListener('error', e => {
+            // Either a task error event (has data) or a broken connection
+            if (e.data) {
+                finished = true;
+                source.close();
+                loading.style.display = 'none';
+                resultsGrid.innerHTML = `
+                    <div class="no-results">
+                        <h3>Error</h3>
+                        <p>${JSON.parse(e.data).error || 'An error occurred while generating memes'}</p>
+                    </div>
+                `;
+            } else if (!finished && source.readyState === EventSource.CLOSED) {
+                pollTaskStatus(taskId);
+            }
+        });
+    }
+
     // Poll the server for task status
     function pollTaskStatus(taskId) {
         fetch(`http://127.0.0.1:5000/status/${taskId}`)
@@ -54,13 +112,29 @@ document.addEventListener('DOMContentLoaded', () => {
             });
     }
     
-    // Fetch all available memes
-    function fetchAllMemes() {
-        fetch('http://127.0.0.1:5000/get_all_memes')
+    // Fetch all available memes, one page at a time
+    let allMemes = [];
+    function fetchAllMemes(cursor) {
+        const query = cursor ? `?cursor=${cursor}` : '';
+        fetch(`http://127.0.0.1:5000/get_all_memes${query}`)
             .then(res => res.json())
             .then(data => {
                 loading.style.display = 'none';
-                displayMemes(data.memes);
+                // Items carry thumbnail/poster URLs; keep images-first like data.memes
+                const page = data.items || data.memes;
+                const isImage = m => (m.type || 'image') === 'image';
+                allMemes = allMemes.concat(page.filter(isImage), page.filter(m => !isImage(m)));
+                displayMemes(allMemes);
+                if (data.next_cursor) {
+                    const more = document.createElement('button');
+                    more.className = 'load-more-btn';
+                    more.textContent = 'Load more';
+                    more.onclick = () => {
+                        more.disabled = true;
+                        fetchAllMemes(data.next_cursor);
+                    };
+                    resultsGrid.appendChild(more);
+                }
             })
             .catch(error => {
                 loading.style.display = 'none';
@@ -74,7 +148,7 @@ document.addEventListener('DOMContentLoaded', () => {
             });
     }
     
-    // Display the memes in the grid
+    // Display the memes in the grid (plain URLs, or catalog items with thumbnails)
     function displayMemes(memes) {
         if (!memes || memes.length === 0) {
             resultsGrid.innerHTML = `
@@ -86,17 +160,24 @@ document.addEventListener('DOMContentLoaded', () => {
             return;
         }
         
-        resultsGrid.innerHTML = memes.map((url, index) => {
+        resultsGrid.innerHTML = memes.map((meme, index) => {
+            const item = typeof meme === 'string' ? { url: meme } : meme;
+            const url = item.url;
             const isVideo = url.match(/\.(mp4|webm)$/i);
             return `
                 <div class="meme-card">
-                    ${isVideo 
+                    ${isVideo && item.poster
+                        ? `<div class="video-poster">
+                             <img src="${item.poster}" alt="Video meme ${index + 1}" loading="lazy">
+                             <i class="fas fa-video"></i>
+                           </div>`
+                        : isVideo
                         ? `<div class="video-download-box">
                              <i class="fas fa-video"></i>
                              <p>Video Meme Ready!</p>
                              <p>Click below to download</p>
                            </div>` 
-                        : `<img src="${url}" alt="Meme ${index + 1}" loading="lazy">`
+                        : `<img src="${item.thumbnail || url}" alt="Meme ${index + 1}" loading="lazy" decoding="async">`
                     }
                     <div class="meme-actions">
                         ${!isVideo ? `
@@ -347,6 +347,59 @@ document.addEventListener('DOMContentLoaded', () => {
         .catch(() => showStatus("Error connecting to server."));
     }
 
+    // Large videos go through the resumable chunked upload API so a dropped
+    // connection only costs the current chunk, not the whole file
+    const RESUMABLE_THRESHOLD = 64 * 1024 * 1024;
+
+    async function sha256Hex(buffer) {
+        const hash = await crypto.subtle.digest('SHA-256', buffer);
+        return Array.from(new Uint8Array(hash)).map(b => b.toString(16).padStart(2, '0')).join('');
+    }
+
+    async function uploadResumable(file, type) {
+        const api = 'http://127.0.0.1:5000/uploads';
+        const created = await fetch(api, {
+            method: 'POST',
+            headers: { 'Content-Type': 'application/json' },
+            body: JSON.stringify({ filename: file.name, size: file.size, type: type })
+        }).then(res => res.json());
+        if (!created.success) throw new Error(created.error || 'Could not start upload');
+
+        const uploadUrl = `${api}/${created.upload_id}`;
+        const chunkSize = created.chunk_size;
+        let offset = 0;
+        let failures = 0;
+
+        while (offset < file.size) {
+            const chunk = await file.slice(offset, offset + chunkSize).arrayBuffer();
+            try {
+                const res = await fetch(uploadUrl, {
+                    method: 'PATCH',
+                    headers: {
+                        'Content-Type': 'application/octet-stream',
+                        'Upload-Offset': String(offset),
+                        'X-Chunk-SHA256': crypto.subtle ? await sha256Hex(chunk) : ''
+                    },
+                    body: chunk
+                });
+                const data = await res.json();
+                if (!res.ok && data.offset === undefined) throw new Error(data.error);
+                offset = data.offset;
+                failures = 0;
+            } catch (err) {
+                // Connection dropped: wait, ask the server where we are, and carry on
+                if (++failures > 5) throw err;
+                await new Promise(resolve => setTimeout(resolve, 1000 * failures));
+                const status = await fetch(uploadUrl).then(res => res.json()).catch(() => null);
+                if (status && status.success) offset = status.offset;
+            }
+        }
+
+        const done = await fetch(`${uploadUrl}/finalize`, { method: 'POST' }).then(res => res.json());
+        if (!done.success) throw new Error(done.error || 'Could not finalize upload');
+        return done.task_id;
+    }
+
     function uploadVideo() {
         const fileInput = document.getElementById('videoFile');
         if (!fileInput.files.length) {
@@ -354,6 +407,15 @@ document.addEventListener('DOMContentLoaded', () => {
             return;
         }
         showLoading(true);
+        if (fileInput.files[0].size > RESUMABLE_THRESHOLD) {
+            uploadResumable(fileInput.files[0], 'video')
+                .then(taskId => pollTaskStatus(taskId, 'video'))
+                .catch(err => {
+                    showLoading(false);
+                    showStatus("Error: " + (err.message || "Upload failed"));
+                });
+            return;
+        }
         const formData = new FormData();
         formData.append('videoFile', fileInput.files[0]);
         fetch('http://127.0.0.1:5000/upload', {